@@ -1,7 +1,14 @@
+from typing import Optional
+from bson import ObjectId
 from fastapi import APIRouter, HTTPException, Query
-from ..domain.models import OrderCreate, OrderOut
-from ..infra.orders_repo import insert_order
-from app.infra.orders_repo import get_last_10_orders_from_previous_month
+from pydantic import ValidationError
+from ..core.config import settings
+from ..core.responses import FastJSONResponse
+from ..domain.models import (
+    OrderCreate, OrderOut, BulkOrdersRequest, BulkOrdersResponse, BulkRealTimesRequest, BulkRealTimesResponse
+)
+from ..infra.orders_repo import insert_order, insert_orders, bulk_update_real_times
+from app.infra.orders_repo import get_last_10_orders_from_previous_month, get_previous_month_item_times
 
 from datetime import datetime
 
@@ -15,16 +22,95 @@ async def create_order(order: OrderCreate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'order'}: {err['msg']}" for err in e.errors()
+    )
+
+@router.post("/batch", response_model=BulkOrdersResponse)
+async def create_orders_batch(body: BulkOrdersRequest):
+    """
+    Crea muchos pedidos en una sola petición (sincronizaciones del ERP). Cada pedido se valida
+    por separado y los válidos se insertan con un único insert_many no ordenado.
+    Devuelve el resultado por pedido, en el mismo orden: CREATED (con id), INVALID o ERROR.
+    """
+    if len(body.orders) > settings.orders_batch_max:
+        raise HTTPException(
+            status_code=413, detail=f"Máximo {settings.orders_batch_max} pedidos por lote (llegaron {len(body.orders)})"
+        )
+
+    results = []
+    valid_orders = []
+    valid_indexes = []
+    for index, raw_order in enumerate(body.orders):
+        try:
+            order = OrderCreate.model_validate(raw_order)
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "erp_order_id": raw_order.get("erp_order_id"),
+                "status": "INVALID",
+                "error": _validation_message(e),
+            })
+            continue
+        results.append({"index": index, "erp_order_id": order.erp_order_id, "status": "CREATED"})
+        valid_orders.append(order)
+        valid_indexes.append(index)
+
+    try:
+        inserted = await insert_orders(valid_orders)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for index, outcome in zip(valid_indexes, inserted):
+        if "error" in outcome:
+            results[index].update(status="ERROR", error=outcome["error"])
+        else:
+            results[index].update(id=outcome["id"], created_at=outcome["created_at"])
+
+    created = sum(1 for result in results if result["status"] == "CREATED")
+    # Respuesta directa: con miles de pedidos se evita revalidarla contra el response_model
+    return FastJSONResponse({"created": created, "failed": len(results) - created, "results": results})
+
 @router.get("/last-10-previous-month")
 async def last_10_previous_month(
     month: str = Query(..., description="Mes en formato YYYY-MM (ej: 2025-11)")
 ):
     try:
         orders = await get_last_10_orders_from_previous_month(month)
-        return {
+        # Respuesta directa: se serializa con orjson sin pasar por jsonable_encoder
+        return FastJSONResponse({
             "status": "success",
             "orders": orders,
             "count": len(orders),
-        }
+        })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/previous-month/item-times")
+async def previous_month_item_times(
+    month: str = Query(..., description="Mes en formato YYYY-MM (ej: 2025-11)"),
+    after_id: Optional[str] = Query(None, description="Cursor devuelto por el lote anterior"),
+    limit: int = Query(5000, gt=0, le=20000, description="Pedidos por lote"),
+):
+    """
+    Tiempos estimados y reales de todos los items del mes anterior, por lotes y en formato columnar.
+    """
+    if after_id is not None and not ObjectId.is_valid(after_id):
+        raise HTTPException(status_code=400, detail=f"Cursor after_id inválido: {after_id}")
+    try:
+        batch = await get_previous_month_item_times(month, after_id=after_id, limit=limit)
+        return FastJSONResponse({"status": "success", **batch})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/real-times", response_model=BulkRealTimesResponse)
+async def bulk_real_times(body: BulkRealTimesRequest):
+    """
+    Guarda los tiempos reales de pick de varios pedidos en una sola operación.
+    """
+    try:
+        result = await bulk_update_real_times([o.model_dump() for o in body.orders])
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
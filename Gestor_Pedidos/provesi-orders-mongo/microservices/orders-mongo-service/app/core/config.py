@@ -4,5 +4,9 @@ from pydantic import BaseModel
 class Settings(BaseModel):
     mongo_uri: str = os.getenv("MONGO_URI")
     mongo_db: str = os.getenv("MONGO_DB", "ruta_optima")
+    # Máximo de pedidos por POST /orders/batch
+    orders_batch_max: int = int(os.getenv("ORDERS_BATCH_MAX", 5000))
+    # Respuestas de al menos este tamaño (bytes) se comprimen si el cliente acepta gzip/br
+    compression_min_size: int = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
 
 settings = Settings()
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class OrderItem(BaseModel):
@@ -17,6 +17,45 @@ class OrderOut(BaseModel):
     erp_order_id: str
     created_at: datetime
 
+class BulkOrdersRequest(BaseModel):
+    # Cada pedido se valida por separado (como OrderCreate): uno inválido no rechaza el lote
+    orders: List[Dict[str, Any]]
+
+class OrderCreateResult(BaseModel):
+    index: int
+    erp_order_id: Optional[str] = None
+    status: str  # CREATED | INVALID | ERROR
+    id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+class BulkOrdersResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[OrderCreateResult]
+
+class ItemRealTime(BaseModel):
+    sku: str
+    tiempo_real_pick: float = Field(ge=0)
+
+class OrderRealTimes(BaseModel):
+    erp_order_id: str
+    items: List[ItemRealTime]
+    tiempo_total_real: Optional[float] = None
+
+class BulkRealTimesRequest(BaseModel):
+    orders: List[OrderRealTimes]
+
+class RealTimesResult(BaseModel):
+    erp_order_id: str
+    status: str  # UPDATED | NOT_FOUND | ERROR
+    error: Optional[str] = None
+
+class BulkRealTimesResponse(BaseModel):
+    matched: int
+    modified: int
+    results: List[RealTimesResult]
+
 class StandDeviation(BaseModel):
     stand_id: str
     tiempo_estimado_promedio: float
@@ -1,19 +1,21 @@
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from .mongo_client import get_db
 
 COLLECTION = "orders"
 
 
-async def insert_order(order_data: Dict[str, Any]) -> str:
+def _order_doc(order_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     order_data puede ser:
     - un Pydantic model (OrderCreate)
     - o un dict normal (si ya lo convertiste antes)
     """
-    db = get_db()
-
     # Si viene como modelo Pydantic, lo convertimos a dict
     if hasattr(order_data, "model_dump"):
         order_dict = order_data.model_dump()
@@ -33,23 +35,49 @@ async def insert_order(order_data: Dict[str, Any]) -> str:
         else:
             normalized_items.append(item)  # dict u otro tipo simple
 
-    doc = {
+    return {
         "erp_order_id": order_dict["erp_order_id"],
         "items": normalized_items,
         "status": "CREATED",
         "created_at": datetime.utcnow(),
     }
 
-    result = await db[COLLECTION].insert_one(doc)
+
+async def insert_order(order_data: Dict[str, Any]) -> str:
+    db = get_db()
+    result = await db[COLLECTION].insert_one(_order_doc(order_data))
     return str(result.inserted_id)
 
-async def get_last_10_orders_from_previous_month(month: str) -> List[Dict[str, Any]]:
+
+async def insert_orders(orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Devuelve los últimos 10 pedidos del mes ANTERIOR al mes dado (YYYY-MM),
-    ordenados por created_at descendente.
+    Inserta muchos pedidos con un único insert_many no ordenado: un pedido que falla
+    (p. ej. por un índice único) no frena a los demás. Devuelve, en el mismo orden,
+    {"id", "created_at"} de cada pedido insertado o {"error"} del que falló.
     """
+    if not orders:
+        return []
+
     db = get_db()
+    # insert_many asigna el _id de cada documento antes de enviarlo
+    docs = [_order_doc(order) for order in orders]
+    errors: Dict[int, str] = {}
+    try:
+        await db[COLLECTION].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in (e.details or {}).get("writeErrors", []):
+            errors[write_error["index"]] = write_error.get("errmsg", "write error")
+
+    results = []
+    for index, doc in enumerate(docs):
+        if index in errors:
+            results.append({"error": errors[index]})
+        else:
+            results.append({"id": str(doc["_id"]), "created_at": doc["created_at"]})
+    return results
 
+def _previous_month_range(month: str) -> Tuple[datetime, datetime]:
+    """Devuelve [inicio, fin) del mes ANTERIOR al mes dado (YYYY-MM)."""
     year, month_num = map(int, month.split("-"))
 
     # calcular mes anterior
@@ -67,6 +95,18 @@ async def get_last_10_orders_from_previous_month(month: str) -> List[Dict[str, A
     else:
         end = datetime(prev_year, prev_month + 1, 1)
 
+    return start, end
+
+
+async def get_last_10_orders_from_previous_month(month: str) -> List[Dict[str, Any]]:
+    """
+    Devuelve los últimos 10 pedidos del mes ANTERIOR al mes dado (YYYY-MM),
+    ordenados por created_at descendente.
+    """
+    db = get_db()
+
+    start, end = _previous_month_range(month)
+
     query = {
         "created_at": {
             "$gte": start,
@@ -87,3 +127,137 @@ async def get_last_10_orders_from_previous_month(month: str) -> List[Dict[str, A
         results.append(doc)
 
     return results
+
+
+async def get_previous_month_item_times(
+    month: str, after_id: Optional[str] = None, limit: int = 5000
+) -> Dict[str, Any]:
+    """
+    Devuelve en formato columnar los tiempos de pick de los items de un lote de
+    pedidos del mes ANTERIOR al mes dado. Solo incluye items con tiempo real guardado.
+
+    La paginación es por _id (keyset): el cliente envía el next_after_id del lote
+    anterior hasta que llegue en None.
+    """
+    db = get_db()
+
+    start, end = _previous_month_range(month)
+
+    query: Dict[str, Any] = {"created_at": {"$gte": start, "$lt": end}}
+    if after_id:
+        query["_id"] = {"$gt": ObjectId(after_id)}
+
+    projection = {
+        "items.stand_id_estimada": 1,
+        "items.tiempo_estimado_pick": 1,
+        "items.tiempo_real_pick": 1,
+    }
+
+    cursor = db[COLLECTION].find(query, projection).sort("_id", 1).limit(limit)
+
+    stand_ids: List[str] = []
+    estimados: List[float] = []
+    reales: List[float] = []
+    orders_count = 0
+    last_id = None
+
+    async for doc in cursor:
+        orders_count += 1
+        last_id = doc["_id"]
+        for item in doc.get("items", []):
+            tiempo_real = item.get("tiempo_real_pick")
+            if tiempo_real is None:
+                continue
+            stand_ids.append(item.get("stand_id_estimada", "UNKNOWN"))
+            estimados.append(item.get("tiempo_estimado_pick", 0))
+            reales.append(tiempo_real)
+
+    return {
+        "orders_count": orders_count,
+        "stand_ids": stand_ids,
+        "tiempos_estimados": estimados,
+        "tiempos_reales": reales,
+        "next_after_id": str(last_id) if orders_count == limit else None,
+    }
+
+
+def _real_times_update(order_times: Dict[str, Any]) -> UpdateOne:
+    """
+    Construye un UpdateOne con $set dirigidos a cada item del pedido.
+    Los items se ubican por sku mediante arrayFilters, sin reescribir el arreglo completo.
+    Un sku repetido en el payload se toma una sola vez (gana el último valor): dos filtros
+    sobre el mismo sku apuntan a la misma ruta y Mongo rechazaría el update por conflicto.
+    """
+    set_fields: Dict[str, Any] = {"real_times_updated_at": datetime.utcnow()}
+    array_filters = []
+
+    tiempos_por_sku: Dict[str, Any] = {}
+    for item in order_times.get("items", []):
+        tiempos_por_sku[item["sku"]] = item["tiempo_real_pick"]
+
+    for idx, (sku, tiempo_real) in enumerate(tiempos_por_sku.items()):
+        ident = f"i{idx}"
+        set_fields[f"items.$[{ident}].tiempo_real_pick"] = tiempo_real
+        array_filters.append({f"{ident}.sku": sku})
+
+    if order_times.get("tiempo_total_real") is not None:
+        set_fields["tiempo_total_real"] = order_times["tiempo_total_real"]
+
+    return UpdateOne(
+        {"erp_order_id": order_times["erp_order_id"]},
+        {"$set": set_fields},
+        array_filters=array_filters or None,
+    )
+
+
+async def bulk_update_real_times(orders_times: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Guarda los tiempos reales de pick de muchos pedidos con un único
+    bulk_write no ordenado. Devuelve el resultado por pedido.
+    """
+    db = get_db()
+
+    if not orders_times:
+        return {"matched": 0, "modified": 0, "results": []}
+
+    erp_ids = [o["erp_order_id"] for o in orders_times]
+
+    # Una sola consulta para saber qué pedidos existen
+    existing = set()
+    cursor = db[COLLECTION].find({"erp_order_id": {"$in": erp_ids}}, {"erp_order_id": 1})
+    async for doc in cursor:
+        existing.add(doc["erp_order_id"])
+
+    ops = []
+    op_erp_ids = []
+    for order_times in orders_times:
+        if order_times["erp_order_id"] in existing:
+            ops.append(_real_times_update(order_times))
+            op_erp_ids.append(order_times["erp_order_id"])
+
+    errors: Dict[str, str] = {}
+    matched = 0
+    modified = 0
+
+    if ops:
+        try:
+            result = await db[COLLECTION].bulk_write(ops, ordered=False)
+            matched = result.matched_count
+            modified = result.modified_count
+        except BulkWriteError as e:
+            details = e.details or {}
+            matched = details.get("nMatched", 0)
+            modified = details.get("nModified", 0)
+            for write_error in details.get("writeErrors", []):
+                errors[op_erp_ids[write_error["index"]]] = write_error.get("errmsg", "write error")
+
+    results = []
+    for erp_order_id in erp_ids:
+        if erp_order_id not in existing:
+            results.append({"erp_order_id": erp_order_id, "status": "NOT_FOUND"})
+        elif erp_order_id in errors:
+            results.append({"erp_order_id": erp_order_id, "status": "ERROR", "error": errors[erp_order_id]})
+        else:
+            results.append({"erp_order_id": erp_order_id, "status": "UPDATED"})
+
+    return {"matched": matched, "modified": modified, "results": results}
@@ -4,8 +4,11 @@ import os
 import time
 from .api import health, orders, reports
 from .api import admin as admin_router
+from .core.config import settings
+from .core.responses import CompressionMiddleware, FastJSONResponse
 
-app = FastAPI(title="Provesi Orders Mongo Service")
+app = FastAPI(title="Provesi Orders Mongo Service", default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
 
 app.include_router(health.router)
 app.include_router(orders.router)
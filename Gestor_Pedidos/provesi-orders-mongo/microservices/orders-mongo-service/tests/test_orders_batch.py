@@ -0,0 +1,68 @@
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from pymongo.errors import BulkWriteError
+
+from app.infra import orders_repo
+from app.main import app
+
+client = TestClient(app)
+
+def _order(erp_order_id):
+    return {
+        "erp_order_id": erp_order_id,
+        "items": [{"sku": "SKU-1", "quantity": 1, "stand_id_estimada": "STAND-1", "tiempo_estimado_pick": 4.2}],
+    }
+
+class FakeCollection:
+    """insert_many que asigna _id y falla (como un índice único) en los índices dados"""
+
+    def __init__(self, failing_indexes):
+        self.failing_indexes = failing_indexes
+        self.inserted = []
+
+    async def insert_many(self, docs, ordered=True):
+        assert ordered is False
+        write_errors = []
+        for index, doc in enumerate(docs):
+            doc["_id"] = ObjectId()
+            if index in self.failing_indexes:
+                write_errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key"})
+            else:
+                self.inserted.append(doc)
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": len(self.inserted)})
+
+def test_batch_mezcla_validos_invalidos_y_errores_de_escritura(monkeypatch):
+    # Los válidos son los índices 0, 2 y 3 del lote; el segundo de ellos (índice 2) falla al insertar
+    collection = FakeCollection(failing_indexes={1})
+    monkeypatch.setattr(orders_repo, "get_db", lambda: {orders_repo.COLLECTION: collection})
+
+    resp = client.post("/orders/batch", json={"orders": [
+        _order("ERP-0"),
+        {"erp_order_id": "ERP-1", "items": [{"sku": "SKU-1", "quantity": 0}]},
+        _order("ERP-2"),
+        _order("ERP-3"),
+    ]})
+
+    assert resp.status_code == 200
+    data = resp.json()
+    statuses = [(r["index"], r["erp_order_id"], r["status"]) for r in data["results"]]
+    assert statuses == [
+        (0, "ERP-0", "CREATED"),
+        (1, "ERP-1", "INVALID"),
+        (2, "ERP-2", "ERROR"),
+        (3, "ERP-3", "CREATED"),
+    ]
+    assert data["created"] == 2
+    assert data["failed"] == 2
+    assert "E11000" in data["results"][2]["error"]
+    assert "items" in data["results"][1]["error"]
+    # Los CREATED traen el _id que se insertó de verdad
+    inserted_ids = {str(doc["_id"]) for doc in collection.inserted}
+    assert {data["results"][0]["id"], data["results"][3]["id"]} == inserted_ids
+    assert all(r.get("id") is None for r in data["results"][1:3])
+
+def test_batch_sobre_el_maximo_responde_413(monkeypatch):
+    monkeypatch.setattr("app.api.orders.settings.orders_batch_max", 2)
+    resp = client.post("/orders/batch", json={"orders": [_order(f"ERP-{i}") for i in range(3)]})
+    assert resp.status_code == 413
@@ -0,0 +1,21 @@
+from app.infra.orders_repo import _real_times_update
+
+def test_real_times_update_sku_repetido_usa_un_solo_filtro():
+    op = _real_times_update({
+        "erp_order_id": "ERP-1",
+        "items": [
+            {"sku": "SKU-A", "tiempo_real_pick": 3.0},
+            {"sku": "SKU-B", "tiempo_real_pick": 4.0},
+            {"sku": "SKU-A", "tiempo_real_pick": 5.0},
+        ],
+    })
+    doc = op._doc
+    filters = op._array_filters
+
+    # Un filtro por sku distinto: dos filtros sobre el mismo sku chocan en Mongo
+    assert sorted(f[next(iter(f))] for f in filters) == ["SKU-A", "SKU-B"]
+    item_fields = {k: v for k, v in doc["$set"].items() if k.startswith("items.")}
+    assert len(item_fields) == 2
+    # Gana el último valor del sku repetido
+    ident_a = next(next(iter(f)).split(".")[0] for f in filters if "SKU-A" in f.values())
+    assert item_fields[f"items.$[{ident_a}].tiempo_real_pick"] == 5.0
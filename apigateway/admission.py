@@ -0,0 +1,271 @@
+"""
+Control de admisión del gateway: límites de tasa (token bucket) por cliente y por ruta y
+un límite global de peticiones en curso con cola de espera acotada. Lo que no entra se
+rechaza de inmediato con 429 o 503 y Retry-After, en vez de acumularse sobre los backends.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+
+
+class TokenBucket:
+    """`rate` tokens por segundo hasta un máximo de `burst`"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Segundos hasta tener un token (0 si ya hay)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def consume(self, amount: float = 1):
+        # Con amount > tokens el bucket queda en negativo: las siguientes esperan a saldarlo
+        self.tokens -= amount
+
+
+class RateLimitRule:
+    """
+    Límite de tasa para las peticiones cuyo path empieza con `prefix` (y, si se indican,
+    con uno de `methods`). Con per_client=True cada cliente tiene su propio bucket; si no,
+    el bucket es uno solo para la ruta (protege al backend sin importar quién llama).
+    Los paths de `exclude` no se cobran en el middleware: los cobra su handler con un peso
+    (AdmissionController.charge), p. ej. un lote de pedidos según su cantidad.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prefix: str,
+        rate: float,
+        burst: float,
+        per_client: bool = True,
+        methods: Optional[Sequence[str]] = None,
+        max_clients: int = 10000,
+        exclude: Sequence[str] = (),
+    ):
+        self.name = name
+        self.prefix = prefix.rstrip("/")
+        self.rate = rate
+        self.burst = burst
+        self.per_client = per_client
+        self.methods = frozenset(methods) if methods else None
+        self.max_clients = max_clients
+        self.exclude = frozenset(exclude)
+        # cliente (o "*" si es por ruta) -> bucket; LRU para acotar la memoria
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def applies(self, method: str, path: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        if path in self.exclude:
+            return False
+        return not self.prefix or path == self.prefix or path.startswith(self.prefix + "/")
+
+    def bucket(self, client: str) -> TokenBucket:
+        key = client if self.per_client else "*"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """
+    A lo sumo `max_concurrent` peticiones en curso; las siguientes esperan en orden de
+    llegada en una cola de `max_queue` lugares durante `queue_timeout` segundos.
+    Con la cola llena o al vencer la espera se lanza Overloaded.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise Overloaded("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(fut, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # El cupo pudo llegar justo al vencer la espera: en ese caso se usa
+            if not (fut.done() and not fut.cancelled()):
+                self.rejected["queue_timeout"] += 1
+                raise Overloaded("queue_timeout")
+        except asyncio.CancelledError:
+            # El cliente se fue: si ya se le había pasado el cupo, se devuelve
+            if fut.done() and not fut.cancelled():
+                self.release()
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+        self.admitted += 1
+
+    def release(self):
+        # El cupo pasa directo al primero de la cola (in_flight no cambia)
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.in_flight = max(0, self.in_flight - 1)
+
+
+class AdmissionController:
+    """Reglas de tasa más el limitador de concurrencia, con sus contadores"""
+
+    def __init__(self, rules: List[RateLimitRule], limiter: ConcurrencyLimiter, overload_retry_after: float = 1.0):
+        self.rules = rules
+        self.limiter = limiter
+        self.overload_retry_after = overload_retry_after
+        self.rate_limited: Dict[str, int] = {rule.name: 0 for rule in rules}
+
+    def check_rate(self, method: str, path: str, client: str) -> Optional[Tuple[str, float]]:
+        """
+        None si la petición entra (y consume un token de cada regla que aplica), o
+        (regla, segundos de espera) de la primera regla sin tokens. No se consume nada si
+        alguna regla la rechaza.
+        """
+        now = time.monotonic()
+        buckets = []
+        for rule in self.rules:
+            if not rule.applies(method, path):
+                continue
+            bucket = rule.bucket(client)
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                self.rate_limited[rule.name] += 1
+                return rule.name, wait
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket.consume()
+        return None
+
+    def charge(self, rule_name: str, weight: float, client: str = "*") -> Optional[float]:
+        """
+        Cobra `weight` tokens de una regla (para los paths que la regla excluye del middleware).
+        Alcanza con tener un token: un peso mayor que la ráfaga no queda bloqueado para siempre,
+        el bucket queda en negativo y las peticiones siguientes esperan a que se recupere.
+        Devuelve None si entra o los segundos de espera si no.
+        """
+        rule = next(rule for rule in self.rules if rule.name == rule_name)
+        bucket = rule.bucket(client)
+        wait = bucket.wait_time(time.monotonic())
+        if wait > 0:
+            self.rate_limited[rule.name] += 1
+            return wait
+        bucket.consume(weight)
+        return None
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": self.limiter.in_flight,
+            "queued": self.limiter.queued,
+            "max_concurrent": self.limiter.max_concurrent,
+            "max_queue": self.limiter.max_queue,
+            "admitted_total": self.limiter.admitted,
+            "queued_total": self.limiter.queued_total,
+            "rejected_total": dict(self.limiter.rejected),
+            "rate_limited_total": dict(self.rate_limited),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI (no BaseHTTPMiddleware) para que el cupo se libere cuando termina de
+    enviarse el cuerpo, también en las respuestas en streaming del proxy.
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        exempt_paths: Sequence[str] = (),
+        trust_forwarded_for: bool = False,
+    ):
+        self.app = app
+        self.controller = controller
+        self.exempt_paths = frozenset(exempt_paths)
+        self.trust_forwarded_for = trust_forwarded_for
+
+    def _client(self, scope) -> str:
+        if self.trust_forwarded_for:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        limited = self.controller.check_rate(scope["method"], scope["path"], self._client(scope))
+        if limited is not None:
+            rule, wait = limited
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": f"Límite de tasa excedido ({rule})"},
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.controller.limiter.acquire()
+        except Overloaded as e:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Gateway sobrecargado ({e.reason})"},
+                headers={"Retry-After": str(max(1, math.ceil(self.controller.overload_retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.limiter.release()
@@ -0,0 +1,637 @@
+"""
+Benchmark del gateway contra upstreams simulados.
+
+Levanta en el mismo proceso servidores stub del orquestador (registry, reportes y read model),
+de gestor-pedidos y del monitor, inicia el gateway en un subproceso apuntando a ellos y mide,
+por ruta, tamaño de payload y nivel de concurrencia, el throughput y la latencia de las
+peticiones a través del gateway y directo al stub. La diferencia es la latencia que agrega el
+gateway; además se toma el overhead que el propio gateway reporta en /metrics.
+
+También mide el discovery en frío: la primera petición a un servicio descubierto tras iniciar
+el gateway (consulta al registry y conexión nueva) contra las siguientes (copia local).
+
+Uso (desde apigateway/):
+    python benchmark.py
+    python benchmark.py --routes orders-get monitor --payloads large --concurrency 1 50
+    python benchmark.py --output bench.json --baseline bench_anterior.json
+
+Cliente y stubs comparten proceso (y GIL): las cifras absolutas de throughput están acotadas
+por el cliente, pero directo y gateway se miden con el mismo cliente y son comparables.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+
+PAYLOAD_SIZES = ("small", "large")
+CONCURRENCY_LEVELS = (1, 10, 50)
+
+
+class BenchRoute:
+    """
+    Ruta medida.
+
+    - service: stub que la atiende ("orquestador", "gestor" o "monitor")
+    - gateway_path / direct_path: path en el gateway y en el stub (el monitor quita /monitor)
+    - metrics_label: etiqueta de la ruta en /metrics del gateway
+    - discovered: el gateway resuelve la instancia con el discovery
+    """
+
+    def __init__(
+        self,
+        name: str,
+        method: str,
+        service: str,
+        gateway_path: str,
+        direct_path: str,
+        metrics_label: str,
+        discovered: bool,
+    ):
+        self.name = name
+        self.method = method
+        self.service = service
+        self.gateway_path = gateway_path
+        self.direct_path = direct_path
+        self.metrics_label = metrics_label
+        self.discovered = discovered
+
+
+ROUTES = {
+    route.name: route
+    for route in (
+        # Proxy genérico hacia un servicio descubierto
+        BenchRoute("orders-get", "GET", "gestor", "/orders/ERP-1", "/orders/ERP-1", "/orders/*", True),
+        # Handler propio del gateway (parsea el JSON y avisa al read model)
+        BenchRoute("orders-post", "POST", "gestor", "/orders", "/orders", "/orders", True),
+        # Proxy en streaming hacia el orquestador (URL fija, sin caché)
+        BenchRoute(
+            "reports-stream", "GET", "orquestador",
+            "/reports/pedidos-con-rutas/stream", "/reports/pedidos-con-rutas/stream", "/reports/*", False,
+        ),
+        # Ruta con caché de respuestas (tras la primera petición, aciertos)
+        BenchRoute(
+            "reports-cached", "GET", "orquestador",
+            "/reports/rutas-optimizadas", "/reports/rutas-optimizadas", "/reports/rutas-optimizadas", False,
+        ),
+        # Proxy con strip_prefix hacia un servicio descubierto
+        BenchRoute("monitor", "GET", "monitor", "/monitor/logs", "/logs", "/monitor/*", True),
+    )
+}
+
+
+# ===============================
+# Payloads y stubs
+# ===============================
+def make_orders(target_bytes: int) -> List[Dict]:
+    """Pedidos con items hasta que el JSON ocupe al menos target_bytes"""
+    orders = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        order = {
+            "id": f"{n:024x}",
+            "erp_order_id": f"ERP-{n:06d}",
+            "status": "CREATED",
+            "created_at": "2025-11-01T00:00:00",
+            "items": [
+                {"sku": f"SKU-{n}-{i}", "quantity": 1, "stand_id_estimada": f"STAND-{i % 8}", "tiempo_estimado_pick": 4.2}
+                for i in range(5)
+            ],
+        }
+        orders.append(order)
+        size += len(json.dumps(order)) + 1
+        n += 1
+    return orders
+
+
+def make_order_body(target_bytes: int) -> bytes:
+    """Cuerpo de POST /orders: un pedido con items hasta ocupar al menos target_bytes"""
+    items = []
+    size = 0
+    while size < target_bytes:
+        item = {"sku": f"SKU-{len(items)}", "quantity": 1, "stand_id_estimada": "STAND-1", "tiempo_estimado_pick": 4.2}
+        items.append(item)
+        size += len(json.dumps(item)) + 1
+    return json.dumps({"erp_order_id": "ERP-BENCH", "items": items}).encode()
+
+
+class Payloads:
+    """Respuestas y cuerpos precalculados por tamaño, para no medir la serialización de los stubs"""
+
+    def __init__(self, small_bytes: int, large_bytes: int):
+        self.json: Dict[str, bytes] = {}
+        self.ndjson: Dict[str, List[bytes]] = {}
+        self.order_bodies: Dict[str, bytes] = {}
+        for size, target in (("small", small_bytes), ("large", large_bytes)):
+            orders = make_orders(target)
+            self.json[size] = json.dumps({"status": "success", "orders": orders, "orders_count": len(orders)}).encode()
+            lines = [json.dumps({"type": "order", "order": order}).encode() + b"\n" for order in orders]
+            lines.append(json.dumps({"type": "summary", "orders_count": len(orders)}).encode() + b"\n")
+            self.ndjson[size] = lines
+            self.order_bodies[size] = make_order_body(target)
+
+
+def ndjson_chunks(lines: List[bytes], chunk_bytes: int = 16 * 1024):
+    chunk = bytearray()
+    for line in lines:
+        chunk += line
+        if len(chunk) >= chunk_bytes:
+            yield bytes(chunk)
+            chunk = bytearray()
+    if chunk:
+        yield bytes(chunk)
+
+
+async def stub_delay(latency_ms: float):
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms / 1000)
+
+
+def build_orquestador_stub(
+    payloads: Payloads,
+    registry: Dict[str, List[Dict]],
+    latency_ms: float,
+    registry_latency_ms: float,
+) -> FastAPI:
+    """Stub del orquestador: registry (watch y discovery), reportes, read model y health"""
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "service": "orquestador-stub"}
+
+    @app.get("/registry/watch")
+    async def registry_watch(index: Optional[int] = None, wait: float = 30.0):
+        # El registry no cambia durante el benchmark: el long-poll solo vence
+        if index == 1:
+            await asyncio.sleep(min(wait, 30.0))
+        return {"index": 1, "services": registry}
+
+    @app.get("/registry/service/{service_name}")
+    async def registry_service(service_name: str):
+        await stub_delay(registry_latency_ms)
+        instances = registry.get(service_name)
+        if not instances:
+            raise HTTPException(status_code=404, detail=f"Servicio {service_name} no encontrado")
+        return {"status": "success", "service": instances[0], "instances": instances}
+
+    @app.get("/reports/pedidos-con-rutas/stream")
+    async def report_stream(size: str = Query("small")):
+        await stub_delay(latency_ms)
+        return StreamingResponse(ndjson_chunks(payloads.ndjson[size]), media_type="application/x-ndjson")
+
+    @app.get("/reports/{report_name}")
+    async def report(report_name: str, size: str = Query("small")):
+        await stub_delay(latency_ms)
+        return Response(content=payloads.json[size], media_type="application/json")
+
+    @app.post("/read-model/orders")
+    async def read_model_orders(request: Request):
+        await request.body()
+        return {"status": "success", "stored": 1}
+
+    return app
+
+
+def build_gestor_stub(payloads: Payloads, latency_ms: float) -> FastAPI:
+    """Stub de gestor-pedidos: consulta y creación de pedidos"""
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/orders/{order_id}")
+    async def get_order(order_id: str, size: str = Query("small")):
+        await stub_delay(latency_ms)
+        return Response(content=payloads.json[size], media_type="application/json")
+
+    @app.post("/orders")
+    async def create_order(request: Request):
+        body = await request.body()
+        await stub_delay(latency_ms)
+        return {
+            "id": f"{len(body):024x}",
+            "erp_order_id": "ERP-BENCH",
+            "created_at": "2025-11-01T00:00:00",
+        }
+
+    return app
+
+
+def build_monitor_stub(payloads: Payloads, latency_ms: float) -> FastAPI:
+    """Stub del monitor"""
+    app = FastAPI()
+
+    @app.get("/logs")
+    async def logs(size: str = Query("small")):
+        await stub_delay(latency_ms)
+        return Response(content=payloads.json[size], media_type="application/json")
+
+    return app
+
+
+class ServerThread:
+    """Servidor uvicorn en un hilo en segundo plano"""
+
+    def __init__(self, app: FastAPI, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        self._thread.start()
+        started = time.monotonic()
+        while not self.server.started:
+            if time.monotonic() - started > timeout:
+                raise RuntimeError(f"El stub en el puerto {self.port} no inició")
+            time.sleep(0.01)
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# ===============================
+# Gateway
+# ===============================
+def start_gateway(port: int, stubs: Dict[str, ServerThread], args: argparse.Namespace, watch: bool) -> subprocess.Popen:
+    """Inicia el gateway en un subproceso (su propio GIL), apuntando a los stubs"""
+    env = {
+        **os.environ,
+        "ORQUESTADOR_URL": stubs["orquestador"].url,
+        "GESTOR_PEDIDOS_FALLBACK_URL": stubs["gestor"].url,
+        "MONITOR_FALLBACK_URL": stubs["monitor"].url,
+        "REGISTRY_WATCH_ENABLED": "true" if watch else "false",
+        # Los límites de tasa cortarían la carga del benchmark
+        "ADMISSION_ENABLED": "true" if args.admission else "false",
+        "METRICS_ENABLED": "true",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def stop_gateway(gateway: subprocess.Popen):
+    gateway.terminate()
+    try:
+        gateway.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        gateway.kill()
+
+
+async def wait_healthy(url: str, timeout: float = 15.0):
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"El gateway en {url} no respondió /health")
+
+
+def overhead_totals(metrics_text: str) -> Dict[str, Tuple[float, int]]:
+    """(suma, cantidad) del overhead reportado por el gateway, por etiqueta de ruta"""
+    sums: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for line in metrics_text.splitlines():
+        if 'phase="overhead"' not in line or not line.startswith(("gateway_request_duration_ms_sum", "gateway_request_duration_ms_count")):
+            continue
+        match = re.search(r'route="([^"]*)"', line)
+        if match is None:
+            continue
+        value = float(line.rsplit(" ", 1)[1])
+        if line.startswith("gateway_request_duration_ms_sum"):
+            sums[match.group(1)] = value
+        else:
+            counts[match.group(1)] = int(value)
+    return {label: (sums.get(label, 0.0), counts.get(label, 0)) for label in counts}
+
+
+async def fetch_overhead(client: httpx.AsyncClient, gateway_url: str) -> Dict[str, Tuple[float, int]]:
+    resp = await client.get(f"{gateway_url}/metrics")
+    resp.raise_for_status()
+    return overhead_totals(resp.text)
+
+
+# ===============================
+# Carga y resumen
+# ===============================
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 3)
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": sum(statuses.values()),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "statuses": statuses,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": round(latencies[-1], 3) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        },
+    }
+
+
+async def closed_loop(
+    base_url: str,
+    path: str,
+    route: BenchRoute,
+    size: str,
+    payloads: Payloads,
+    concurrency: int,
+    duration: float,
+    args: argparse.Namespace,
+) -> Dict:
+    """
+    Carga de lazo cerrado: `concurrency` clientes que mandan la siguiente petición apenas
+    reciben la respuesta completa, durante `duration` segundos. Solo las 200 cuentan
+    para la latencia y el throughput.
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    params = {"month": args.month, "size": size}
+    body = payloads.order_bodies[size] if route.method == "POST" else None
+    headers = {"accept-encoding": args.accept_encoding}
+    if body is not None:
+        headers["content-type"] = "application/json"
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout, headers=headers) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(route.method, path, params=params, content=body)
+                    status = str(resp.status_code)
+                except httpx.TimeoutException:
+                    status = "timeout"
+                except httpx.HTTPError:
+                    status = "error"
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "200":
+                    latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, statuses, elapsed)
+
+
+def added_latency(gateway: Dict, direct: Dict) -> Dict[str, Optional[float]]:
+    added = {}
+    for key in ("p50", "p90", "p99", "mean"):
+        g, d = gateway["latency_ms"][key], direct["latency_ms"][key]
+        added[key] = round(g - d, 3) if g is not None and d is not None else None
+    return added
+
+
+async def run_matrix(args: argparse.Namespace, stubs: Dict[str, ServerThread], payloads: Payloads, gateway_url: str) -> List[Dict]:
+    """Cada combinación ruta × payload × concurrencia, directo al stub y a través del gateway"""
+    results = []
+    async with httpx.AsyncClient(timeout=5.0) as metrics_client:
+        for name in args.routes:
+            route = ROUTES[name]
+            for size in args.payloads:
+                for concurrency in args.concurrency:
+                    direct_url = stubs[route.service].url
+                    if args.warmup > 0:
+                        await closed_loop(direct_url, route.direct_path, route, size, payloads, concurrency, args.warmup, args)
+                    direct = await closed_loop(
+                        direct_url, route.direct_path, route, size, payloads, concurrency, args.duration, args
+                    )
+
+                    if args.warmup > 0:
+                        await closed_loop(gateway_url, route.gateway_path, route, size, payloads, concurrency, args.warmup, args)
+                    before = await fetch_overhead(metrics_client, gateway_url)
+                    gateway = await closed_loop(
+                        gateway_url, route.gateway_path, route, size, payloads, concurrency, args.duration, args
+                    )
+                    after = await fetch_overhead(metrics_client, gateway_url)
+
+                    overhead_sum = after.get(route.metrics_label, (0.0, 0))[0] - before.get(route.metrics_label, (0.0, 0))[0]
+                    overhead_count = after.get(route.metrics_label, (0.0, 0))[1] - before.get(route.metrics_label, (0.0, 0))[1]
+                    result = {
+                        "route": name,
+                        "payload": size,
+                        "payload_bytes": len(payloads.order_bodies[size] if route.method == "POST" else payloads.json[size]),
+                        "concurrency": concurrency,
+                        "direct": direct,
+                        "gateway": gateway,
+                        "added_latency_ms": added_latency(gateway, direct),
+                        "gateway_reported_overhead_ms": (
+                            round(overhead_sum / overhead_count, 3) if overhead_count else None
+                        ),
+                    }
+                    results.append(result)
+                    print(
+                        f"   {name:<15} {size:<5} c={concurrency:<3} "
+                        f"directo {direct['rps']} rps p50={direct['latency_ms']['p50']}ms | "
+                        f"gateway {gateway['rps']} rps p50={gateway['latency_ms']['p50']}ms | "
+                        f"agrega p50={result['added_latency_ms']['p50']}ms "
+                        f"(overhead reportado {result['gateway_reported_overhead_ms']}ms)"
+                    )
+    return results
+
+
+async def measure_cold_discovery(args: argparse.Namespace, stubs: Dict[str, ServerThread], payloads: Payloads) -> Dict:
+    """
+    Por cada muestra inicia un gateway nuevo sin watch del registry y mide la primera petición
+    a cada ruta con discovery (consulta al registry y conexión nueva) y la siguiente (caché).
+    """
+    routes = [ROUTES[name] for name in args.routes if ROUTES[name].discovered]
+    samples: Dict[str, Dict[str, List[float]]] = {route.name: {"cold": [], "warm": []} for route in routes}
+    if not routes:
+        return {}
+
+    for _ in range(args.cold_samples):
+        port = free_port()
+        gateway = start_gateway(port, stubs, args, watch=False)
+        gateway_url = f"http://127.0.0.1:{port}"
+        try:
+            await wait_healthy(gateway_url)
+            async with httpx.AsyncClient(base_url=gateway_url, timeout=args.timeout) as client:
+                for route in routes:
+                    for phase in ("cold", "warm"):
+                        body = payloads.order_bodies["small"] if route.method == "POST" else None
+                        start = time.perf_counter()
+                        resp = await client.request(
+                            route.method, route.gateway_path, params={"month": args.month, "size": "small"}, content=body,
+                            headers={"content-type": "application/json"} if body else None,
+                        )
+                        if resp.status_code == 200:
+                            samples[route.name][phase].append((time.perf_counter() - start) * 1000)
+        finally:
+            stop_gateway(gateway)
+
+    result = {}
+    for name, phases in samples.items():
+        cold, warm = sorted(phases["cold"]), sorted(phases["warm"])
+        result[name] = {
+            "samples": len(cold),
+            "cold_p50_ms": percentile(cold, 50),
+            "cold_max_ms": round(cold[-1], 3) if cold else None,
+            "warm_p50_ms": percentile(warm, 50),
+        }
+        print(f"   {name:<15} primera petición p50={result[name]['cold_p50_ms']}ms  siguiente p50={result[name]['warm_p50_ms']}ms")
+    return result
+
+
+# ===============================
+# Comparación con un resultado anterior
+# ===============================
+def compare_with_baseline(results: List[Dict], baseline: Dict, max_regression_pct: float) -> List[Dict]:
+    """
+    Celdas (ruta, payload, concurrencia) donde el gateway empeoró más de max_regression_pct
+    respecto del resultado anterior: menos throughput o más latencia p50 agregada. La
+    latencia agregada se compara con un piso de 1ms para no marcar ruido de décimas.
+    """
+    previous = {(r["route"], r["payload"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get((result["route"], result["payload"], result["concurrency"]))
+        if old is None:
+            continue
+        old_rps, new_rps = old["gateway"]["rps"], result["gateway"]["rps"]
+        if old_rps and new_rps is not None and new_rps < old_rps * (1 - max_regression_pct / 100):
+            regressions.append({**_cell(result), "metric": "rps", "baseline": old_rps, "current": new_rps})
+        old_added, new_added = old["added_latency_ms"]["p50"], result["added_latency_ms"]["p50"]
+        if old_added is not None and new_added is not None:
+            if new_added > max(old_added, 1.0) * (1 + max_regression_pct / 100):
+                regressions.append({**_cell(result), "metric": "added_p50_ms", "baseline": old_added, "current": new_added})
+    return regressions
+
+
+def _cell(result: Dict) -> Dict:
+    return {"route": result["route"], "payload": result["payload"], "concurrency": result["concurrency"]}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark del gateway contra upstreams simulados")
+    parser.add_argument("--routes", nargs="+", choices=sorted(ROUTES), default=list(ROUTES))
+    parser.add_argument("--payloads", nargs="+", choices=PAYLOAD_SIZES, default=list(PAYLOAD_SIZES))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=list(CONCURRENCY_LEVELS))
+    parser.add_argument("--duration", type=float, default=3.0, help="Segundos medidos por celda")
+    parser.add_argument("--warmup", type=float, default=0.5, help="Segundos de carga previa que no se miden")
+    parser.add_argument("--small-bytes", type=int, default=512)
+    parser.add_argument("--large-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0.0, help="Latencia simulada de los stubs")
+    parser.add_argument("--registry-latency-ms", type=float, default=5.0, help="Latencia del discovery del stub del orquestador")
+    parser.add_argument("--cold-samples", type=int, default=5, help="Gateways nuevos para medir el discovery en frío (0 = no medir)")
+    parser.add_argument("--accept-encoding", default="identity", help="Accept-Encoding del cliente (p. ej. gzip)")
+    parser.add_argument("--admission", action="store_true", help="Medir con el control de admisión activado")
+    parser.add_argument("--month", default="2025-11")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--output", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--baseline", help="Resultado JSON anterior con el que comparar")
+    parser.add_argument("--max-regression-pct", type=float, default=20.0)
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace, stubs: Dict[str, ServerThread], payloads: Payloads) -> Dict:
+    port = free_port()
+    gateway = start_gateway(port, stubs, args, watch=True)
+    gateway_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_healthy(gateway_url)
+        print(f"🚀 Gateway en {gateway_url}: {len(args.routes)} rutas × {len(args.payloads)} payloads × "
+              f"concurrencia {args.concurrency}, {args.duration}s por celda")
+        results = await run_matrix(args, stubs, payloads, gateway_url)
+    finally:
+        stop_gateway(gateway)
+
+    cold = {}
+    if args.cold_samples > 0:
+        print(f"🧊 Discovery en frío ({args.cold_samples} gateways nuevos, sin watch del registry)")
+        cold = await measure_cold_discovery(args, stubs, payloads)
+    return {"results": results, "cold_discovery": cold}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    payloads = Payloads(args.small_bytes, args.large_bytes)
+
+    ports = {name: free_port() for name in ("orquestador", "gestor", "monitor")}
+    registry = {
+        "gestor-pedidos": [{"host": "127.0.0.1", "port": ports["gestor"], "instance_id": "gestor-stub-0"}],
+        "monitor": [{"host": "127.0.0.1", "port": ports["monitor"], "instance_id": "monitor-stub-0"}],
+    }
+    stubs = {
+        "orquestador": ServerThread(
+            build_orquestador_stub(payloads, registry, args.upstream_latency_ms, args.registry_latency_ms),
+            ports["orquestador"],
+        ),
+        "gestor": ServerThread(build_gestor_stub(payloads, args.upstream_latency_ms), ports["gestor"]),
+        "monitor": ServerThread(build_monitor_stub(payloads, args.upstream_latency_ms), ports["monitor"]),
+    }
+    try:
+        for stub in stubs.values():
+            stub.start()
+        print(f"🧪 Stubs iniciados: {ports}")
+        summary = asyncio.run(run(args, stubs, payloads))
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+
+    summary["config"] = vars(args)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(summary["results"], json.load(f), args.max_regression_pct)
+        summary["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+            print(f"❌ {len(regressions)} regresiones respecto de {args.baseline} (más de {args.max_regression_pct}%):")
+            for regression in regressions:
+                print(f"   {regression}")
+        else:
+            print(f"✅ Sin regresiones respecto de {args.baseline}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultado guardado en {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+Discovery del gateway sin consultas al orquestador en el camino de cada petición:
+copia local del registry por long-poll a /registry/watch y, mientras el watch no está
+sincronizado (o está desactivado), una caché por servicio con TTL
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+
+class RegistryWatcher:
+    """
+    Tarea en segundo plano que repite GET /registry/watch?index=N: el orquestador responde
+    solo cuando cambia el registry (o al vencer `wait`), así el gateway conoce las
+    instancias de cada servicio sin hacer una consulta de discovery por petición.
+    `on_change` se llama cada vez que llega un conjunto de instancias nuevo.
+    """
+
+    def __init__(
+        self,
+        orquestador_url: str,
+        wait: float = 30.0,
+        retry_delay: float = 2.0,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.orquestador_url = orquestador_url
+        self.wait = wait
+        self.retry_delay = retry_delay
+        self.on_change = on_change
+        self.index: Optional[int] = None
+        self.services: Dict[str, List[Dict]] = {}
+        # False hasta la primera respuesta y tras un error: se usa el discovery por petición
+        self.synced = False
+        self._task: Optional[asyncio.Task] = None
+
+    def instances(self, service_name: str) -> Optional[List[Dict]]:
+        """Instancias sanas del servicio según la copia local, o None si no está sincronizada"""
+        if not self.synced:
+            return None
+        return self.services.get(service_name, [])
+
+    async def _run(self):
+        # El timeout de lectura cubre la espera del long-poll
+        async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, read=self.wait + 5.0)) as client:
+            while True:
+                # Sin sincronizar se pide el estado actual sin esperar
+                params = {"index": self.index, "wait": self.wait} if self.synced else {}
+                try:
+                    resp = await client.get(f"{self.orquestador_url}/registry/watch", params=params)
+                    resp.raise_for_status()
+                    data = resp.json()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.synced:
+                        print(f"⚠️ Watch del registry falló, se vuelve al discovery por petición: {e}")
+                    self.synced = False
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+                changed = data["index"] != self.index or not self.synced
+                if changed:
+                    print(f"🔄 Registry actualizado (versión {data['index']}): {sorted(data['services'])}")
+                self.services = data["services"]
+                self.index = data["index"]
+                self.synced = True
+                if changed and self.on_change is not None:
+                    self.on_change()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class DiscoveryCache:
+    """
+    Caché de GET /registry/service/{nombre} por servicio.
+
+    - Con la entrada fresca (menos de `ttl` segundos) se responde sin ninguna llamada.
+    - Con la entrada vencida se sigue respondiendo con ella y se refresca en segundo plano
+      (además una tarea refresca periódicamente los servicios leídos en la ventana de
+      `ttl + stale_if_error`, salvo los que ya resuelve el watch según `covered`; las
+      entradas que nadie lee en esa ventana se descartan).
+    - Si el orquestador falla se sigue usando la última respuesta hasta `stale_if_error`
+      segundos después de vencida.
+    - Sin entrada utilizable se consulta una vez (las peticiones concurrentes esperan la
+      misma consulta) con un timeout corto; si falla, durante `error_backoff` segundos se
+      responde None de inmediato y el gateway usa la URL de fallback.
+
+    `on_change` se llama cuando cambia el conjunto de entradas (consulta nueva o descarte).
+    """
+
+    def __init__(
+        self,
+        orquestador_url: str,
+        get_client: Callable[[], httpx.AsyncClient],
+        ttl: float = 10.0,
+        stale_if_error: float = 300.0,
+        timeout: float = 1.0,
+        error_backoff: float = 5.0,
+        covered: Optional[Callable[[str], bool]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+    ):
+        self.orquestador_url = orquestador_url
+        self.get_client = get_client
+        self.ttl = ttl
+        self.stale_if_error = stale_if_error
+        self.timeout = timeout
+        self.error_backoff = error_backoff
+        self.covered = covered
+        self.on_change = on_change
+        # servicio -> (instancias, momento de la consulta)
+        self._entries: Dict[str, Tuple[List[Dict], float]] = {}
+        # servicio -> momento de la última lectura (decide si vale la pena refrescarlo)
+        self._read_at: Dict[str, float] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def cached_instances(self) -> Iterator[Dict]:
+        """Todas las instancias guardadas en la caché, de todos los servicios"""
+        for instances, _ in self._entries.values():
+            yield from instances
+
+    def _usable(self, name: str, now: float) -> Optional[List[Dict]]:
+        entry = self._entries.get(name)
+        if entry is None or now - entry[1] > self.ttl + self.stale_if_error:
+            return None
+        return entry[0]
+
+    async def instances(self, service_name: str) -> Optional[List[Dict]]:
+        """Instancias del servicio ([] si no está registrado), o None si no se pudo saber"""
+        now = time.monotonic()
+        self._read_at[service_name] = now
+        instances = self._usable(service_name, now)
+        if instances is not None:
+            if now - self._entries[service_name][1] > self.ttl:
+                self._refresh(service_name)
+            return instances
+
+        if now - self._failed_at.get(service_name, float("-inf")) < self.error_backoff:
+            return None
+        return await asyncio.shield(self._refresh(service_name))
+
+    def _refresh(self, service_name: str) -> asyncio.Task:
+        """Consulta al orquestador (una sola en curso por servicio)"""
+        task = self._inflight.get(service_name)
+        if task is None:
+            task = asyncio.create_task(self._load(service_name))
+            self._inflight[service_name] = task
+            task.add_done_callback(lambda _: self._inflight.pop(service_name, None))
+        return task
+
+    async def _load(self, service_name: str) -> Optional[List[Dict]]:
+        try:
+            resp = await self.get_client().get(
+                f"{self.orquestador_url}/registry/service/{service_name}", timeout=self.timeout
+            )
+            if resp.status_code == 404:
+                instances = []
+            else:
+                resp.raise_for_status()
+                data = resp.json()
+                instances = data.get("instances") or [data.get("service", {})]
+        except Exception as e:
+            # Solo se avisa al empezar a fallar, no en cada reintento
+            if service_name not in self._failed_at:
+                print(f"⚠️ Discovery de {service_name} falló, se usa la caché o el fallback: {e}")
+            self._failed_at[service_name] = time.monotonic()
+            return self._usable(service_name, time.monotonic())
+
+        if self._failed_at.pop(service_name, None) is not None:
+            print(f"✅ Discovery de {service_name} recuperado")
+        previous = self._entries.get(service_name)
+        self._entries[service_name] = (instances, time.monotonic())
+        if self.on_change is not None and (previous is None or previous[0] != instances):
+            self.on_change()
+        return instances
+
+    async def _run(self):
+        # Refresca antes de que venzan para que el camino de la petición siempre encuentre la entrada fresca
+        while True:
+            await asyncio.sleep(self.ttl / 2)
+            now = time.monotonic()
+            names = []
+            dropped = False
+            for name in list(self._entries):
+                if now - self._read_at.get(name, float("-inf")) > self.ttl + self.stale_if_error:
+                    # Nadie la leyó en toda la ventana (p. ej. el watch está sincronizado): se descarta
+                    del self._entries[name]
+                    self._read_at.pop(name, None)
+                    dropped = True
+                elif self.covered is None or not self.covered(name):
+                    names.append(name)
+            if dropped and self.on_change is not None:
+                self.on_change()
+            if names:
+                await asyncio.gather(*(self._refresh(name) for name in names), return_exceptions=True)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
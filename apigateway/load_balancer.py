@@ -0,0 +1,113 @@
+"""
+Balanceo de carga del gateway entre las instancias descubiertas de un servicio
+"""
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional
+
+STRATEGIES = ("round-robin", "least-outstanding", "latency-weighted")
+
+# Peso del último valor en la latencia promedio móvil (EWMA)
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class InstanceBalancer:
+    """
+    Elige una instancia (de las que devuelve el registry del orquestador) para cada petición.
+    Las peticiones en curso y la latencia se miden desde el propio gateway, por URL de instancia.
+
+    - round-robin: round-robin ponderado suave según 'weight'
+    - least-outstanding: menor número de peticiones en curso por unidad de peso
+    - latency-weighted: aleatorio con probabilidad proporcional a weight / latencia
+    """
+
+    def __init__(self, strategy: str = "round-robin"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia de balanceo no soportada: {strategy}")
+        self.strategy = strategy
+        self._current_weights: Dict[str, float] = {}
+        self._outstanding: Dict[str, int] = {}
+        self._latency_ms: Dict[str, float] = {}
+
+    @staticmethod
+    def instance_url(instance: Dict) -> str:
+        host = instance.get("host")
+        port = instance.get("port")
+        if host and port:
+            return f"http://{host}:{int(port)}"
+        return instance.get("url")
+
+    def retain(self, instances: Iterable[Dict]):
+        """
+        Descarta el estado de las URLs que ya no están entre `instances` (todas las instancias
+        conocidas, de todos los servicios): sin esto los dicts crecen con cada instancia que
+        pasa por el registry. Las peticiones en curso se conservan hasta que terminan.
+        """
+        live = {self.instance_url(instance) for instance in instances}
+        for state in (self._current_weights, self._latency_ms):
+            for url in [url for url in state if url not in live]:
+                del state[url]
+        for url in [url for url, count in self._outstanding.items() if url not in live and count == 0]:
+            del self._outstanding[url]
+
+    def choose(self, instances: List[Dict]) -> Optional[str]:
+        """Devuelve la URL base de la instancia elegida"""
+        candidates = [(self.instance_url(i), max(int(i.get("weight", 1)), 0)) for i in instances]
+        candidates = [(url, weight) for url, weight in candidates if url]
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0][0]
+
+        if self.strategy == "least-outstanding":
+            return self._least_outstanding(candidates)
+        if self.strategy == "latency-weighted":
+            return self._latency_weighted(candidates)
+        return self._round_robin(candidates)
+
+    def _round_robin(self, candidates) -> str:
+        total = 0
+        best_url, best_weight = None, None
+        for url, weight in candidates:
+            current = self._current_weights.get(url, 0) + weight
+            self._current_weights[url] = current
+            total += weight
+            if best_weight is None or current > best_weight:
+                best_url, best_weight = url, current
+        self._current_weights[best_url] -= total
+        return best_url
+
+    def _least_outstanding(self, candidates) -> str:
+        loads = {url: (self._outstanding.get(url, 0) + 1) / max(weight, 1) for url, weight in candidates}
+        lowest = min(loads.values())
+        return random.choice([url for url, load in loads.items() if load == lowest])
+
+    def _latency_weighted(self, candidates) -> str:
+        known = [self._latency_ms[url] for url, _ in candidates if url in self._latency_ms]
+        # Instancias sin medición usan la latencia promedio para que también reciban tráfico
+        default_latency = sum(known) / len(known) if known else 1.0
+        scores = [weight / max(self._latency_ms.get(url, default_latency), 0.1) for url, weight in candidates]
+        if not any(scores):
+            return random.choice(candidates)[0]
+        return random.choices([url for url, _ in candidates], weights=scores, k=1)[0]
+
+    @asynccontextmanager
+    async def track(self, base_url: Optional[str]):
+        """Cuenta la petición como en curso y mide su latencia contra la instancia"""
+        if not base_url:
+            yield
+            return
+
+        self._outstanding[base_url] = self._outstanding.get(base_url, 0) + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._outstanding[base_url] = max(0, self._outstanding[base_url] - 1)
+            latency_ms = (time.perf_counter() - start) * 1000
+            previous = self._latency_ms.get(base_url)
+            self._latency_ms[base_url] = (
+                latency_ms if previous is None
+                else LATENCY_EWMA_ALPHA * latency_ms + (1 - LATENCY_EWMA_ALPHA) * previous
+            )
@@ -1,10 +1,23 @@
+import math
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
 import httpx
-from fastapi import FastAPI, HTTPException, Request, Query
-from fastapi.responses import JSONResponse
+import orjson
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
+from starlette.background import BackgroundTask
+
+from load_balancer import InstanceBalancer
+from discovery import DiscoveryCache, RegistryWatcher
+from upstreams import UpstreamClients
+from proxy import ProxyRoute, ReverseProxy, UpstreamUnavailable
+from response_cache import CachePolicy, ResponseCache
+from admission import AdmissionController, AdmissionMiddleware, ConcurrencyLimiter, RateLimitRule
+from responses import CompressionMiddleware, FastJSONResponse
+from metrics import MetricsMiddleware, gateway_metrics, render_stats
 from fastapi.middleware.cors import CORSMiddleware
 
 # ===============================
@@ -19,6 +32,61 @@ MONITOR_SERVICE_NAME = os.getenv("MONITOR_SERVICE_NAME", "monitor")
 GESTOR_PEDIDOS_FALLBACK_URL = os.getenv("GESTOR_PEDIDOS_FALLBACK_URL", "http://localhost:8001")
 MONITOR_FALLBACK_URL = os.getenv("MONITOR_FALLBACK_URL", "http://localhost:5001")
 
+# Balanceo entre instancias: round-robin | least-outstanding | latency-weighted
+LOAD_BALANCING_STRATEGY = os.getenv("LOAD_BALANCING_STRATEGY", "round-robin")
+
+# Copia local del registry por long-poll a /registry/watch (sin discovery por petición)
+REGISTRY_WATCH_ENABLED = os.getenv("REGISTRY_WATCH_ENABLED", "true").lower() == "true"
+REGISTRY_WATCH_WAIT = float(os.getenv("REGISTRY_WATCH_WAIT", 30))
+
+# Caché de discovery (mientras el watch no está sincronizado): TTL, stale-if-error y timeout de la consulta
+DISCOVERY_CACHE_TTL = float(os.getenv("DISCOVERY_CACHE_TTL", 10))
+DISCOVERY_STALE_IF_ERROR = float(os.getenv("DISCOVERY_STALE_IF_ERROR", 300))
+DISCOVERY_TIMEOUT = float(os.getenv("DISCOVERY_TIMEOUT", 1))
+DISCOVERY_ERROR_BACKOFF = float(os.getenv("DISCOVERY_ERROR_BACKOFF", 5))
+
+# Avisar al orquestador de cada pedido creado (alimenta su read model de pedidos con rutas)
+READ_MODEL_EVENTS_ENABLED = os.getenv("READ_MODEL_EVENTS_ENABLED", "true").lower() == "true"
+
+# Tiempo máximo (segundos) de un POST /orders/batch al gestor (miles de pedidos por lote)
+ORDERS_BATCH_TIMEOUT = float(os.getenv("ORDERS_BATCH_TIMEOUT", 30))
+
+# Pool de conexiones por upstream (clientes compartidos entre peticiones)
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 30))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 3))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "true").lower() == "true"
+
+# Caché de respuestas para los endpoints que consultan los dashboards (TTL y stale-while-revalidate en segundos)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", 4 * 1024 * 1024))
+REPORTS_CACHE_TTL = float(os.getenv("REPORTS_CACHE_TTL", 30))
+REPORTS_CACHE_SWR = float(os.getenv("REPORTS_CACHE_SWR", 120))
+MONITOR_STATS_CACHE_TTL = float(os.getenv("MONITOR_STATS_CACHE_TTL", 5))
+MONITOR_STATS_CACHE_SWR = float(os.getenv("MONITOR_STATS_CACHE_SWR", 30))
+
+# Control de admisión: límites de tasa (peticiones/segundo y ráfaga) y peticiones en curso con cola acotada
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+CLIENT_RATE_LIMIT = float(os.getenv("CLIENT_RATE_LIMIT", 50))
+CLIENT_RATE_BURST = float(os.getenv("CLIENT_RATE_BURST", 100))
+ORDERS_RATE_LIMIT = float(os.getenv("ORDERS_RATE_LIMIT", 200))  # pedidos/s por POST /orders y /orders/batch, de todos los clientes
+ORDERS_RATE_BURST = float(os.getenv("ORDERS_RATE_BURST", 400))
+REPORTS_CLIENT_RATE_LIMIT = float(os.getenv("REPORTS_CLIENT_RATE_LIMIT", 5))
+REPORTS_CLIENT_RATE_BURST = float(os.getenv("REPORTS_CLIENT_RATE_BURST", 20))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", 100))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", 200))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", 2))
+# Usar el primer X-Forwarded-For como cliente (solo detrás de un balanceador de confianza)
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Métricas por ruta en /metrics (conteos, status, latencia por fase, en curso y upstreams)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Compresión gzip/brotli (según Accept-Encoding) de las respuestas de al menos este tamaño en bytes
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
 # ===============================
 # FastAPI app
 # ===============================
@@ -26,7 +94,32 @@ app = FastAPI(
     title="API Gateway Provesi",
     description="Punto único de entrada para frontend, usando al orquestador para discovery y reportes.",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
+)
+
+# Compresión de las respuestas que el upstream no comprimió (p. ej. las servidas desde el caché)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# Control de admisión (se agrega antes que CORS para que los 429/503 también lleven los headers de CORS)
+admission = AdmissionController(
+    [
+        RateLimitRule("client", "/", CLIENT_RATE_LIMIT, CLIENT_RATE_BURST),
+        # POST /orders/batch se cobra en su handler, un token por pedido del lote
+        RateLimitRule(
+            "orders", "/orders", ORDERS_RATE_LIMIT, ORDERS_RATE_BURST,
+            per_client=False, methods=("POST",), exclude=("/orders/batch",),
+        ),
+        RateLimitRule("reports", "/reports", REPORTS_CLIENT_RATE_LIMIT, REPORTS_CLIENT_RATE_BURST),
+    ],
+    ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS, MAX_QUEUED_REQUESTS, QUEUE_TIMEOUT),
 )
+if ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        exempt_paths=("/health", "/cache/stats", "/admission/stats", "/metrics"),
+        trust_forwarded_for=TRUST_FORWARDED_FOR,
+    )
 
 # CORS
 app.add_middleware(
@@ -41,29 +134,66 @@ app.add_middleware(
 # ===============================
 # Service Discovery Helper
 # ===============================
-async def get_service_base_url(service_name: str, fallback_url: Optional[str] = None) -> str:
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(f"{ORQUESTADOR_URL}/registry/service/{service_name}")
+balancer = InstanceBalancer(LOAD_BALANCING_STRATEGY)
 
-        if resp.status_code == 200:
-            data = resp.json()
-            service_data = data.get("service", {})
 
-            host = service_data.get("host")
-            port = service_data.get("port")
+def retain_known_instances():
+    """Al cambiar las instancias conocidas se descarta el estado del balanceo de las que ya no están"""
+    instances = list(discovery_cache.cached_instances())
+    if registry_watcher.synced:
+        instances.extend(instance for group in registry_watcher.services.values() for instance in group)
+    balancer.retain(instances)
 
-            if host and port:
-                return f"http://{host}:{int(port)}"
 
-            if service_data.get("url"):
-                return service_data["url"]
+registry_watcher = RegistryWatcher(ORQUESTADOR_URL, wait=REGISTRY_WATCH_WAIT, on_change=retain_known_instances)
+upstreams = UpstreamClients(
+    max_connections=UPSTREAM_MAX_CONNECTIONS,
+    max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+    keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    connect_timeout=UPSTREAM_CONNECT_TIMEOUT,
+    http2=UPSTREAM_HTTP2,
+)
+
+ORQUESTADOR_UPSTREAM = "orquestador"
+
+discovery_cache = DiscoveryCache(
+    ORQUESTADOR_URL,
+    lambda: upstreams.get(ORQUESTADOR_UPSTREAM),
+    ttl=DISCOVERY_CACHE_TTL,
+    stale_if_error=DISCOVERY_STALE_IF_ERROR,
+    timeout=DISCOVERY_TIMEOUT,
+    error_backoff=DISCOVERY_ERROR_BACKOFF,
+    # Con el watch sincronizado la caché no se lee: no se refresca en segundo plano
+    covered=lambda service_name: registry_watcher.instances(service_name) is not None,
+    on_change=retain_known_instances,
+)
 
-    except Exception as e:
-        print(f"⚠️ Descubrimiento falló: {e}")
 
-    print(f"➡️ Usando fallback: {fallback_url}")
-    return fallback_url
+@app.on_event("startup")
+async def start_background_tasks():
+    upstreams.open(ORQUESTADOR_UPSTREAM, GESTOR_PEDIDOS_SERVICE_NAME, MONITOR_SERVICE_NAME)
+    if REGISTRY_WATCH_ENABLED:
+        registry_watcher.start()
+    discovery_cache.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await registry_watcher.stop()
+    await discovery_cache.stop()
+    await upstreams.aclose()
+
+
+async def get_service_base_url(service_name: str, fallback_url: Optional[str] = None) -> str:
+    # Con el watch sincronizado se elige de la copia local; si no, de la caché de discovery.
+    # Ninguna de las dos llama al orquestador en el camino de la petición (salvo la primera vez)
+    instances = registry_watcher.instances(service_name)
+    if instances is None:
+        instances = await discovery_cache.instances(service_name)
+
+    # Varias instancias: el gateway elige con su propio balanceo
+    base_url = balancer.choose(instances) if instances else None
+    return base_url or fallback_url
 
 
 # ===============================
@@ -72,77 +202,211 @@ async def get_service_base_url(service_name: str, fallback_url: Optional[str] =
 @app.get("/health")
 async def gateway_health():
     try:
-        async with httpx.AsyncClient(timeout=3.0) as client:
-            orch_resp = await client.get(f"{ORQUESTADOR_URL}/health")
-            orch_status = orch_resp.json()
+        async with gateway_metrics.upstream(ORQUESTADOR_UPSTREAM):
+            orch_resp = await upstreams.get(ORQUESTADOR_UPSTREAM).get(f"{ORQUESTADOR_URL}/health", timeout=3.0)
+        orch_status = orch_resp.json()
     except:
         orch_status = {"status": "down"}
 
     return {"gateway_status": "ok", "orquestador": orch_status}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Aciertos, vencidos servidos, fallos, agrupadas, 304 y tamaño del caché de respuestas"""
+    return {"enabled": RESPONSE_CACHE_ENABLED, **response_cache.stats()}
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Peticiones en curso y en cola, admitidas, rechazadas por sobrecarga y por límite de tasa"""
+    return {"enabled": ADMISSION_ENABLED, **admission.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas por ruta y por upstream, más los contadores del caché y de la admisión (formato Prometheus)"""
+    return (
+        gateway_metrics.render_prometheus()
+        + render_stats("cache", response_cache.stats(), label="event")
+        + render_stats("admission", admission.stats(), label="reason")
+    )
+
+
 # ===============================
 # 1. Orders - Create Order
 # ===============================
+async def notify_order_created(request_body: bytes, response_body: bytes):
+    """Envía el pedido creado al read model del orquestador (best-effort, tras responder)"""
+    order: Dict[str, Any] = {}
+    try:
+        # El gestor responde id, erp_order_id y created_at; los items vienen en el body
+        order = {**orjson.loads(request_body), **orjson.loads(response_body)}
+        async with gateway_metrics.upstream(ORQUESTADOR_UPSTREAM):
+            await upstreams.get(ORQUESTADOR_UPSTREAM).post(f"{ORQUESTADOR_URL}/read-model/orders", json=order, timeout=2.0)
+    except Exception as e:
+        print(f"⚠️ No se pudo avisar el pedido {order.get('erp_order_id')} al orquestador: {e}")
+
+
 @app.post("/orders")
 async def create_order(request: Request):
-    body = await request.json()
+    """
+    Crea un pedido por el proxy genérico (mismos headers, errores y métricas que el resto de
+    /orders). Si el pedido se crea, se avisa al read model del orquestador en segundo plano.
+    """
+    route = proxy.match(request.url.path)
+    if not READ_MODEL_EVENTS_ENABLED:
+        return await proxy.forward(request, route)
+
+    # El aviso necesita ambos cuerpos: se leen completos (un pedido es chico) y sin compresión
+    body = await request.body()
+    headers = [(name, value) for name, value in proxy.request_headers(request) if name != "accept-encoding"]
+    headers.append(("accept-encoding", "identity"))
+    try:
+        resp = await proxy.send(route, request.method, request.url.path, request.url.query, headers, content=body)
+        try:
+            content = await resp.aread()
+        finally:
+            await resp.aclose()
+    except (UpstreamUnavailable, httpx.HTTPError) as e:
+        return proxy.error_response(route, e)
 
-    base_url = await get_service_base_url(GESTOR_PEDIDOS_SERVICE_NAME, GESTOR_PEDIDOS_FALLBACK_URL)
-    url = f"{base_url}/orders"
+    background = BackgroundTask(notify_order_created, body, content) if resp.status_code < 300 else None
+    return proxy.buffered_response(resp, content, background)
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.post(url, json=body)
 
-    return JSONResponse(status_code=resp.status_code, content=resp.json())
+async def notify_orders_created(request_body: bytes, response_body: bytes):
+    """Envía los pedidos creados de un lote al read model del orquestador, en una sola llamada"""
+    try:
+        orders = orjson.loads(request_body).get("orders", [])
+        created: List[Dict[str, Any]] = [
+            {**orders[result["index"]], "id": result["id"], "created_at": result["created_at"]}
+            for result in orjson.loads(response_body).get("results", [])
+            if result.get("status") == "CREATED"
+        ]
+        if not created:
+            return
+        async with gateway_metrics.upstream(ORQUESTADOR_UPSTREAM):
+            await upstreams.get(ORQUESTADOR_UPSTREAM).post(
+                f"{ORQUESTADOR_URL}/read-model/orders", json={"orders": created}, timeout=5.0
+            )
+    except Exception as e:
+        print(f"⚠️ No se pudo avisar el lote de pedidos al orquestador: {e}")
 
 
 # ===============================
-# 2. Reports - Rutas optimizadas
+# 1b. Orders - Create Orders in Batch
 # ===============================
-@app.get("/reports/rutas-optimizadas")
-async def get_rutas_optimizadas(month: str = Query(...)):
-    url = f"{ORQUESTADOR_URL}/reports/rutas-optimizadas"
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params={"month": month})
+@app.post("/orders/batch")
+async def create_orders_batch(request: Request):
+    """
+    Crea muchos pedidos en una sola petición ({"orders": [...]}, p. ej. sincronizaciones del ERP).
+    El cuerpo se reenvía tal cual al gestor, que valida cada pedido y los inserta con un único
+    insert_many; la respuesta trae el resultado por pedido (CREATED con id, INVALID o ERROR).
+    El límite de tasa de pedidos se cobra por pedido del lote, no por petición.
+    """
+    body = await request.body()
+
+    if ADMISSION_ENABLED:
+        try:
+            orders_count = len(orjson.loads(body).get("orders") or [])
+        except (orjson.JSONDecodeError, AttributeError, TypeError):
+            # Cuerpo inválido: el gestor responde el error de validación
+            orders_count = 1
+        wait = admission.charge("orders", max(orders_count, 1))
+        if wait is not None:
+            return FastJSONResponse(
+                status_code=429,
+                content={"detail": "Límite de tasa excedido (orders)"},
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )
 
-    return resp.json()
+    base_url = await get_service_base_url(GESTOR_PEDIDOS_SERVICE_NAME, GESTOR_PEDIDOS_FALLBACK_URL)
+    client = upstreams.get(GESTOR_PEDIDOS_SERVICE_NAME)
+    try:
+        async with balancer.track(base_url), gateway_metrics.upstream(GESTOR_PEDIDOS_SERVICE_NAME):
+            resp = await client.post(
+                f"{base_url}/orders/batch",
+                content=body,
+                # Sin compresión entre gateway y gestor: la respuesta se lee acá para el read model
+                headers={"content-type": "application/json", "accept-encoding": "identity"},
+                timeout=httpx.Timeout(ORDERS_BATCH_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+            )
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Timeout esperando al gestor de pedidos")
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Error conectando con el gestor de pedidos: {e}")
+
+    background = None
+    if READ_MODEL_EVENTS_ENABLED and resp.status_code < 300:
+        background = BackgroundTask(notify_orders_created, body, resp.content)
+
+    return Response(
+        content=resp.content,
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type", "application/json"),
+        background=background,
+    )
 
 
 # ===============================
-# 3. Reports - Pedidos con rutas (TU ENDPOINT)
+# 2. Proxy genérico (reportes, monitor y el resto de /orders)
 # ===============================
-@app.get("/reports/pedidos-con-rutas")
-async def get_pedidos_con_rutas(month: str = Query(...)):
-    url = f"{ORQUESTADOR_URL}/reports/pedidos-con-rutas"
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params={"month": month})
+# Prefijo del gateway -> servicio. Los reportes van al orquestador (URL fija); gestor-pedidos
+# y monitor se resuelven con el discovery. /monitor/logs se reenvía como /logs.
+ROUTE_TABLE = [
+    ProxyRoute("/reports", ORQUESTADOR_UPSTREAM, ORQUESTADOR_URL, discover=False),
+    ProxyRoute("/orders", GESTOR_PEDIDOS_SERVICE_NAME, GESTOR_PEDIDOS_FALLBACK_URL),
+    ProxyRoute("/monitor", MONITOR_SERVICE_NAME, MONITOR_FALLBACK_URL, strip_prefix=True),
+]
+
+proxy = ReverseProxy(ROUTE_TABLE, upstreams, balancer, get_service_base_url)
+
+# Paths exactos que se sirven del caché (con live=true o debug=true se consulta al upstream)
+response_cache = ResponseCache(
+    proxy,
+    [
+        CachePolicy("/reports/rutas-optimizadas", REPORTS_CACHE_TTL, REPORTS_CACHE_SWR),
+        CachePolicy("/reports/pedidos-con-rutas", REPORTS_CACHE_TTL, REPORTS_CACHE_SWR),
+        CachePolicy("/monitor/stats", MONITOR_STATS_CACHE_TTL, MONITOR_STATS_CACHE_SWR),
+    ],
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES,
+)
 
-    return resp.json()
 
+# Etiqueta de ruta de las métricas: paths propios y cacheados tal cual, el resto por prefijo
+# ("/orders/123" -> "/orders/*") para no crear una serie por id
+GATEWAY_PATHS = frozenset({"/health", "/cache/stats", "/admission/stats", "/metrics", "/orders/batch"})
 
-# ===============================
-# 4. Monitor - Seguridad
-# ===============================
-@app.get("/monitor/logs")
-async def get_monitor_logs(limit: int = 50, suspicious_only: bool = False):
-    base_url = await get_service_base_url(MONITOR_SERVICE_NAME, MONITOR_FALLBACK_URL)
-    url = f"{base_url}/logs"
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url, params={"limit": limit, "suspicious_only": suspicious_only})
+def metrics_route_label(path: str) -> str:
+    if path in GATEWAY_PATHS or path in response_cache.policies:
+        return path
+    route = proxy.match(path)
+    if route is None:
+        return "unmatched"
+    return route.prefix if path == route.prefix else route.prefix + "/*"
 
-    return resp.json()
 
+# Se agrega al final: envuelve a la admisión y a CORS, así mide también las 429/503 y la espera en cola
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, route_label=metrics_route_label)
 
-@app.get("/monitor/stats")
-async def get_monitor_stats():
-    base_url = await get_service_base_url(MONITOR_SERVICE_NAME, MONITOR_FALLBACK_URL)
-    url = f"{base_url}/stats"
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        resp = await client.get(url)
+@app.api_route("/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"], include_in_schema=False)
+async def proxy_request(request: Request, path: str):
+    """
+    Reenvía al servicio de la tabla de rutas y devuelve la respuesta del upstream tal cual
+    (status, headers y cuerpo en streaming). Se registra al final: las rutas propias del
+    gateway (/health, POST /orders, POST /orders/batch) tienen prioridad.
+    """
+    route = proxy.match(request.url.path)
+    if route is None:
+        raise HTTPException(status_code=404, detail="Not Found")
 
-    return resp.json()
+    # Las rutas con política pasan por el caché, que además agrupa las peticiones idénticas en curso
+    policy = response_cache.policy_for(request)
+    if policy is not None:
+        return await response_cache.handle(request, route, policy, use_cache=RESPONSE_CACHE_ENABLED)
+    return await proxy.forward(request, route)
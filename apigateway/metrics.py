@@ -0,0 +1,247 @@
+"""
+Métricas del gateway por ruta: peticiones por status, histogramas de latencia (total, hasta
+el primer byte, espera del upstream y overhead propio del gateway), peticiones en curso y
+latencia de las llamadas a cada upstream. Se exponen en /metrics en formato Prometheus.
+
+Todo se actualiza desde el event loop (un solo hilo): sin locks, solo sumas en dicts.
+"""
+import contextvars
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Límites superiores (ms) de los buckets de los histogramas
+GATEWAY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Histograma acumulado con buckets fijos (formato Prometheus)"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=GATEWAY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cantidad acumulada) por bucket, terminando en +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((str(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class RequestRecord:
+    """Tiempo esperando a los upstreams durante una petición (lo suman las llamadas del proxy)"""
+
+    __slots__ = ("upstream_ms",)
+
+    def __init__(self):
+        self.upstream_ms = 0.0
+
+
+current_request: contextvars.ContextVar[Optional[RequestRecord]] = contextvars.ContextVar(
+    "gateway_current_request", default=None
+)
+
+
+def add_upstream_wait(elapsed_ms: float):
+    """
+    Suma a la petición actual una espera del upstream que no pasó por GatewayMetrics.upstream:
+    la de una petición agrupada (X-Cache: COALESCED) esperando la consulta de otra. Esa
+    consulta corre con el contexto de quien la inició; sin esto toda la espera contaría
+    como overhead del gateway.
+    """
+    record = current_request.get()
+    if record is not None:
+        record.upstream_ms += elapsed_ms
+
+
+class GatewayMetrics:
+    """
+    Contadores e histogramas por ruta y por upstream.
+
+    Fases de una petición:
+    - total: hasta enviar el último byte del cuerpo
+    - ttfb: hasta enviar los headers de la respuesta
+    - upstream: esperando los headers de los upstreams (suma de las llamadas de la petición;
+      en las peticiones agrupadas, toda la espera de la consulta compartida)
+    - overhead: ttfb - upstream (routing, discovery, admisión, caché y serialización)
+    """
+
+    def __init__(self):
+        # (ruta, fase) -> histograma
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        # (ruta, método, status) -> cantidad
+        self._requests: Dict[Tuple[str, str, int], int] = {}
+        # ruta -> peticiones en curso
+        self._in_flight: Dict[str, int] = {}
+        # servicio -> histograma de la espera de headers
+        self._upstream_histograms: Dict[str, Histogram] = {}
+        # (servicio, resultado) -> cantidad
+        self._upstream_outcomes: Dict[Tuple[str, str], int] = {}
+
+    def _observe(self, route: str, phase: str, value: float):
+        histogram = self._histograms.get((route, phase))
+        if histogram is None:
+            histogram = self._histograms[(route, phase)] = Histogram()
+        histogram.observe(value)
+
+    def request_started(self, route: str):
+        self._in_flight[route] = self._in_flight.get(route, 0) + 1
+
+    def request_finished(
+        self,
+        route: str,
+        method: str,
+        status: int,
+        total_ms: float,
+        ttfb_ms: Optional[float],
+        upstream_ms: float,
+    ):
+        self._in_flight[route] -= 1
+        key = (route, method, status)
+        self._requests[key] = self._requests.get(key, 0) + 1
+        self._observe(route, "total", total_ms)
+        if ttfb_ms is not None:
+            self._observe(route, "ttfb", ttfb_ms)
+            self._observe(route, "upstream", upstream_ms)
+            self._observe(route, "overhead", max(0.0, ttfb_ms - upstream_ms))
+
+    @asynccontextmanager
+    async def upstream(self, service: str):
+        """Mide la espera de una llamada a un upstream (hasta tener los headers de su respuesta)"""
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            record = current_request.get()
+            if record is not None:
+                record.upstream_ms += elapsed_ms
+            histogram = self._upstream_histograms.get(service)
+            if histogram is None:
+                histogram = self._upstream_histograms[service] = Histogram()
+            histogram.observe(elapsed_ms)
+            key = (service, outcome)
+            self._upstream_outcomes[key] = self._upstream_outcomes.get(key, 0) + 1
+
+    @staticmethod
+    def _histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+        lines = [f'{name}_bucket{{{labels},le="{le}"}} {count}' for le, count in histogram.cumulative()]
+        lines.append(f"{name}_sum{{{labels}}} {round(histogram.sum, 3)}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return lines
+
+    def render_prometheus(self) -> str:
+        """Métricas en formato de texto de Prometheus"""
+        lines = [
+            "# HELP gateway_requests_total Peticiones atendidas por ruta, método y status",
+            "# TYPE gateway_requests_total counter",
+        ]
+        for (route, method, status), count in sorted(self._requests.items()):
+            lines.append(f'gateway_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+        lines.append("# HELP gateway_request_duration_ms Latencia de las peticiones por ruta y fase")
+        lines.append("# TYPE gateway_request_duration_ms histogram")
+        for (route, phase), histogram in sorted(self._histograms.items()):
+            lines.extend(self._histogram_lines(
+                "gateway_request_duration_ms", f'route="{route}",phase="{phase}"', histogram
+            ))
+
+        lines.append("# HELP gateway_in_flight_requests Peticiones en curso por ruta")
+        lines.append("# TYPE gateway_in_flight_requests gauge")
+        for route, count in sorted(self._in_flight.items()):
+            lines.append(f'gateway_in_flight_requests{{route="{route}"}} {count}')
+
+        lines.append("# HELP gateway_upstream_duration_ms Espera de los headers de cada upstream")
+        lines.append("# TYPE gateway_upstream_duration_ms histogram")
+        for service, histogram in sorted(self._upstream_histograms.items()):
+            lines.extend(self._histogram_lines("gateway_upstream_duration_ms", f'service="{service}"', histogram))
+
+        lines.append("# HELP gateway_upstream_requests_total Llamadas a los upstreams por resultado")
+        lines.append("# TYPE gateway_upstream_requests_total counter")
+        for (service, outcome), count in sorted(self._upstream_outcomes.items()):
+            lines.append(f'gateway_upstream_requests_total{{service="{service}",outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def render_stats(prefix: str, stats: Dict, label: str = "kind") -> str:
+    """
+    Stats planas de otros componentes (caché, admisión) como gauges de Prometheus:
+    {"hit": 3, "rejected": {"queue_full": 1}} -> gateway_<prefix>_hit 3 y
+    gateway_<prefix>_rejected{kind="queue_full"} 1
+    """
+    lines = []
+    for key, value in stats.items():
+        name = f"gateway_{prefix}_{key}"
+        if isinstance(value, bool):
+            lines.append(f"{name} {int(value)}")
+        elif isinstance(value, (int, float)):
+            lines.append(f"{name} {value}")
+        elif isinstance(value, dict):
+            for sub_key, sub_value in sorted(value.items()):
+                lines.append(f'{name}{{{label}="{sub_key}"}} {sub_value}')
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+gateway_metrics = GatewayMetrics()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP, etiquetada con `route_label(path)`. La
+    etiqueta debe tener pocos valores posibles (prefijos o paths fijos, no ids).
+    Va por fuera de la admisión, así las 429/503 y la espera en cola también se cuentan.
+    """
+
+    def __init__(self, app, route_label: Callable[[str], str]):
+        self.app = app
+        self.route_label = route_label
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        route = self.route_label(scope["path"])
+        record = RequestRecord()
+        token = current_request.set(record)
+        gateway_metrics.request_started(route)
+        status = 500
+        ttfb_ms = None
+        upstream_ms = 0.0
+
+        async def send_measured(message):
+            nonlocal status, ttfb_ms, upstream_ms
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                ttfb_ms = (time.perf_counter() - started) * 1000
+                # Lo que se llame después (p. ej. tareas en segundo plano) no es parte del ttfb
+                upstream_ms = record.upstream_ms
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_measured)
+        finally:
+            current_request.reset(token)
+            total_ms = (time.perf_counter() - started) * 1000
+            gateway_metrics.request_finished(route, scope["method"], status, total_ms, ttfb_ms, upstream_ms)
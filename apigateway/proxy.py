@@ -0,0 +1,221 @@
+"""
+Reverse proxy genérico del gateway: reenvía la petición al servicio que corresponde según una
+tabla de rutas por prefijo y devuelve la respuesta del upstream en streaming, sin parsearla
+"""
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from load_balancer import InstanceBalancer
+from metrics import gateway_metrics
+from upstreams import UpstreamClients
+
+# Headers de un solo salto (RFC 9110 §7.6.1): no se reenvían en ninguna dirección
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+})
+
+# El servidor del gateway (uvicorn) ya pone los suyos: reenviarlos los duplicaría
+GATEWAY_RESPONSE_HEADERS = frozenset({"date", "server"})
+
+
+class UpstreamUnavailable(Exception):
+    """No hay instancia ni URL de fallback para el servicio de la ruta"""
+
+
+class ProxyRoute:
+    """
+    Entrada de la tabla de rutas.
+
+    - prefix: prefijo del path en el gateway (p. ej. "/monitor")
+    - service: nombre del servicio en el registry; también identifica su cliente HTTP
+    - fallback_url: URL base si el discovery no devuelve instancias (o la URL fija si discover=False)
+    - strip_prefix: quitar el prefijo antes de reenviar ("/monitor/logs" -> "/logs")
+    - discover: resolver la instancia con el discovery (False para el orquestador, que tiene URL fija)
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        service: str,
+        fallback_url: Optional[str] = None,
+        strip_prefix: bool = False,
+        discover: bool = True,
+    ):
+        self.prefix = prefix.rstrip("/")
+        self.service = service
+        self.fallback_url = fallback_url
+        self.strip_prefix = strip_prefix
+        self.discover = discover
+
+    def matches(self, path: str) -> bool:
+        return path == self.prefix or path.startswith(self.prefix + "/")
+
+    def upstream_path(self, path: str) -> str:
+        if not self.strip_prefix:
+            return path
+        return path[len(self.prefix):] or "/"
+
+
+class ReverseProxy:
+    """
+    Reenvía método, query, headers y cuerpo (en streaming) a la instancia elegida y devuelve
+    status, headers y cuerpo del upstream sin modificarlos: la memoria y el CPU por petición
+    no dependen del tamaño del payload.
+    """
+
+    def __init__(
+        self,
+        routes: Iterable[ProxyRoute],
+        upstreams: UpstreamClients,
+        balancer: InstanceBalancer,
+        resolve: Callable[[str, Optional[str]], Awaitable[str]],
+    ):
+        # Se prueba primero el prefijo más largo
+        self.routes: List[ProxyRoute] = sorted(routes, key=lambda r: len(r.prefix), reverse=True)
+        self.upstreams = upstreams
+        self.balancer = balancer
+        self.resolve = resolve
+
+    def match(self, path: str) -> Optional[ProxyRoute]:
+        for route in self.routes:
+            if route.matches(path):
+                return route
+        return None
+
+    @staticmethod
+    def request_headers(request: Request) -> List[Tuple[str, str]]:
+        """Headers a reenviar: sin los de un solo salto ni Host, con los X-Forwarded-*"""
+        headers = [
+            (name, value) for name, value in request.headers.items()
+            if name not in HOP_BY_HOP_HEADERS and name != "host"
+        ]
+        client_host = request.client.host if request.client else None
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if client_host:
+            forwarded_for = f"{forwarded_for}, {client_host}" if forwarded_for else client_host
+        if forwarded_for:
+            headers = [(n, v) for n, v in headers if n != "x-forwarded-for"]
+            headers.append(("x-forwarded-for", forwarded_for))
+        headers.append(("x-forwarded-host", request.headers.get("host", "")))
+        headers.append(("x-forwarded-proto", request.url.scheme))
+        return headers
+
+    @staticmethod
+    def response_headers(resp: httpx.Response) -> List[Tuple[bytes, bytes]]:
+        """
+        Headers del upstream a devolver. content-length y content-encoding se conservan: el
+        cuerpo se reenvía tal cual (aiter_raw). Se usan los headers crudos para no perder
+        los repetidos (p. ej. set-cookie)
+        """
+        return [
+            (name, value) for name, value in resp.headers.raw
+            if name.lower().decode("latin-1") not in HOP_BY_HOP_HEADERS | GATEWAY_RESPONSE_HEADERS
+        ]
+
+    async def send(
+        self,
+        route: ProxyRoute,
+        method: str,
+        path: str,
+        query: str,
+        headers: List[Tuple[str, str]],
+        content=None,
+    ) -> httpx.Response:
+        """
+        Envía la petición a una instancia del servicio de la ruta y devuelve la respuesta
+        abierta en streaming (el llamador debe cerrarla). Lanza UpstreamUnavailable si no
+        hay a dónde mandarla y httpx.HTTPError si el upstream falla.
+        """
+        if route.discover:
+            base_url = await self.resolve(route.service, route.fallback_url)
+        else:
+            base_url = route.fallback_url
+        if not base_url:
+            raise UpstreamUnavailable(f"Servicio {route.service} no disponible")
+
+        url = base_url + route.upstream_path(path)
+        if query:
+            url += "?" + query
+
+        client = self.upstreams.get(route.service)
+        upstream_request = client.build_request(method, url, headers=headers, content=content)
+        async with self.balancer.track(base_url if route.discover else None):
+            async with gateway_metrics.upstream(route.service):
+                return await client.send(upstream_request, stream=True)
+
+    @staticmethod
+    def error_response(route: ProxyRoute, error: Exception) -> JSONResponse:
+        if isinstance(error, UpstreamUnavailable):
+            return JSONResponse(status_code=503, content={"detail": str(error)})
+        if isinstance(error, httpx.TimeoutException):
+            return JSONResponse(status_code=504, content={"detail": f"Timeout esperando a {route.service}"})
+        return JSONResponse(status_code=502, content={"detail": f"Error conectando con {route.service}: {error}"})
+
+    def stream_response(
+        self,
+        resp: httpx.Response,
+        head: bytes = b"",
+        chunks: Optional[AsyncIterator[bytes]] = None,
+    ) -> Response:
+        """
+        Devuelve la respuesta del upstream en streaming. `head` son bytes ya leídos del cuerpo
+        y `chunks` el iterador del que se estaban leyendo (para continuar donde quedó).
+        Al terminar de enviar el cuerpo se cierra la respuesta y la conexión vuelve al pool.
+        """
+        chunks = chunks if chunks is not None else resp.aiter_raw()
+
+        async def body():
+            if head:
+                yield head
+            async for chunk in chunks:
+                yield chunk
+
+        response = StreamingResponse(
+            body() if head else chunks,
+            status_code=resp.status_code,
+            background=BackgroundTask(resp.aclose),
+        )
+        response.raw_headers = self.response_headers(resp)
+        return response
+
+    def buffered_response(
+        self, resp: httpx.Response, content: bytes, background: Optional[BackgroundTask] = None
+    ) -> Response:
+        """
+        Respuesta del upstream con el cuerpo ya leído y decodificado (resp.aread()), para las
+        rutas que necesitan el cuerpo después de responder (p. ej. avisar al read model).
+        content-length y content-encoding se reemplazan por los del cuerpo decodificado.
+        """
+        response = Response(content=content, status_code=resp.status_code, background=background)
+        response.raw_headers = [
+            (name, value) for name, value in self.response_headers(resp)
+            if name.lower() not in (b"content-length", b"content-encoding")
+        ] + [(b"content-length", str(len(content)).encode("latin-1"))]
+        return response
+
+    async def forward(self, request: Request, route: ProxyRoute) -> Response:
+        has_body = request.method not in ("GET", "HEAD", "OPTIONS", "DELETE") or "content-length" in request.headers
+        try:
+            resp = await self.send(
+                route,
+                request.method,
+                request.url.path,
+                request.url.query,
+                self.request_headers(request),
+                content=request.stream() if has_body else None,
+            )
+        except (UpstreamUnavailable, httpx.HTTPError) as e:
+            return self.error_response(route, e)
+        return self.stream_response(resp)
@@ -0,0 +1,281 @@
+"""
+Caché de respuestas del gateway para los endpoints que consultan los dashboards:
+TTL por ruta, ETag con respuestas 304, stale-while-revalidate, LRU acotado en bytes y
+single-flight (peticiones idénticas concurrentes comparten una sola consulta al upstream)
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from metrics import add_upstream_wait
+from proxy import ProxyRoute, ReverseProxy, UpstreamUnavailable
+from singleflight import SingleFlight
+
+# Headers que arma el caché en cada respuesta (no se guardan los del upstream)
+CACHE_MANAGED_HEADERS = frozenset({b"content-length", b"etag", b"cache-control", b"age", b"x-cache"})
+
+# Headers de la petición que no se reenvían al llenar el caché: la entrada es la misma para
+# todos los clientes y se guarda sin comprimir
+UNCACHED_REQUEST_HEADERS = frozenset({"accept-encoding", "if-none-match", "if-modified-since", "cache-control"})
+
+
+class CachePolicy:
+    """
+    Política de caché de un path exacto.
+
+    - ttl: segundos en que la respuesta se sirve del caché sin consultar al upstream
+    - stale_while_revalidate: segundos extra en que se sirve la respuesta vencida mientras
+      se refresca en segundo plano
+    - bypass_params: parámetros de query que, presentes, saltan el caché (p. ej. live, debug);
+      esas peticiones igual se agrupan con las idénticas que estén en curso
+    """
+
+    def __init__(self, path: str, ttl: float, stale_while_revalidate: float = 0.0, bypass_params=("live", "debug")):
+        self.path = path
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.bypass_params = frozenset(bypass_params)
+
+    def cache_control(self) -> str:
+        value = f"max-age={int(self.ttl)}"
+        if self.stale_while_revalidate:
+            value += f", stale-while-revalidate={int(self.stale_while_revalidate)}"
+        return value
+
+
+class CacheEntry:
+    """Respuesta del upstream ya leída; cacheable=False si solo se comparte entre peticiones en curso"""
+
+    __slots__ = ("status", "headers", "body", "etag", "stored_at", "cacheable")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, cacheable: bool = True):
+        self.status = status
+        self.cacheable = cacheable
+        self.headers = [(name, value) for name, value in headers if name.lower() not in CACHE_MANAGED_HEADERS]
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.stored_at = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+class ResponseCache:
+    """
+    Sirve GETs de las rutas con política desde un LRU en memoria (a lo sumo `max_bytes`).
+    Solo se guardan respuestas 200 de hasta `max_entry_bytes`; las más grandes se devuelven
+    en streaming como cualquier otra respuesta del proxy.
+
+    Las consultas al upstream pasan por un single-flight con la misma clave del caché:
+    mientras una está en curso, las peticiones idénticas esperan su resultado.
+    """
+
+    def __init__(
+        self,
+        proxy: ReverseProxy,
+        policies: List[CachePolicy],
+        max_bytes: int = 64 * 1024 * 1024,
+        max_entry_bytes: int = 4 * 1024 * 1024,
+    ):
+        self.proxy = proxy
+        self.policies: Dict[str, CachePolicy] = {policy.path: policy for policy in policies}
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._flights = SingleFlight()
+        self.counters = {"hit": 0, "stale": 0, "miss": 0, "coalesced": 0, "not_modified": 0, "evicted": 0}
+
+    def policy_for(self, request: Request) -> Optional[CachePolicy]:
+        if request.method != "GET":
+            return None
+        return self.policies.get(request.url.path)
+
+    @staticmethod
+    def cache_key(request: Request) -> str:
+        """Path con los parámetros ordenados: ?month=x&limit=1 y ?limit=1&month=x comparten entrada"""
+        query = urlencode(sorted(parse_qsl(request.url.query, keep_blank_values=True)))
+        return f"{request.url.path}?{query}"
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "in_flight": self._flights.in_flight,
+        }
+
+    def _get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, entry: CacheEntry):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.counters["evicted"] += 1
+
+    async def handle(
+        self,
+        request: Request,
+        route: ProxyRoute,
+        policy: CachePolicy,
+        use_cache: bool = True,
+    ) -> Response:
+        """
+        Responde desde el caché o consulta al upstream (agrupando las peticiones idénticas).
+        Con use_cache=False (caché desactivado o parámetros de bypass) solo se agrupa.
+        """
+        key = self.cache_key(request)
+        use_cache = use_cache and not any(param in policy.bypass_params for param in request.query_params)
+        # Cache-Control: no-cache del cliente obliga a consultar al upstream
+        no_cache = "no-cache" in request.headers.get("cache-control", "").lower()
+        entry = self._get(key) if use_cache and not no_cache else None
+
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age <= policy.ttl:
+                self.counters["hit"] += 1
+                return self._respond(request, entry, policy, "HIT", age)
+            if age <= policy.ttl + policy.stale_while_revalidate:
+                self.counters["stale"] += 1
+                self._refresh_in_background(key, route, request)
+                return self._respond(request, entry, policy, "STALE", age)
+
+        path, query, headers = request.url.path, request.url.query, self._fill_headers(request)
+        started = time.perf_counter()
+        result, shared = await self._flights.do(key, lambda: self._load(key, route, path, query, headers, use_cache))
+        if shared:
+            # La consulta es de otra petición (y se mide en su contexto): la espera es de upstream
+            add_upstream_wait((time.perf_counter() - started) * 1000)
+        self.counters["coalesced" if shared else "miss"] += 1
+        if shared and isinstance(result, StreamingResponse):
+            # Demasiado grande para compartirla: el stream es de quien hizo la consulta
+            result = await self._load(key, route, path, query, headers, use_cache)
+        if isinstance(result, CacheEntry):
+            return self._respond(request, result, policy, "COALESCED" if shared else "MISS", 0.0)
+        return result
+
+    def _fill_headers(self, request: Request) -> List[Tuple[str, str]]:
+        headers = [
+            (name, value) for name, value in self.proxy.request_headers(request)
+            if name not in UNCACHED_REQUEST_HEADERS
+        ]
+        headers.append(("accept-encoding", "identity"))
+        return headers
+
+    async def _load(
+        self,
+        key: str,
+        route: ProxyRoute,
+        path: str,
+        query: str,
+        headers: List[Tuple[str, str]],
+        store: bool = True,
+    ):
+        """
+        Consulta al upstream y lee la respuesta (guardándola si store=True y se puede cachear).
+        Devuelve la entrada leída o, si no se pudo leer (error o demasiado grande), la
+        respuesta a devolver tal cual.
+        """
+        try:
+            resp = await self.proxy.send(route, "GET", path, query, headers)
+        except (UpstreamUnavailable, httpx.HTTPError) as e:
+            return self.proxy.error_response(route, e)
+
+        if int(resp.headers.get("content-length") or 0) > self.max_entry_bytes:
+            return self.proxy.stream_response(resp)
+
+        body = bytearray()
+        chunks = resp.aiter_raw()
+        try:
+            async for chunk in chunks:
+                body += chunk
+                if len(body) > self.max_entry_bytes:
+                    # Demasiado grande para el caché: se sigue en streaming desde lo ya leído
+                    return self.proxy.stream_response(resp, bytes(body), chunks)
+        except httpx.HTTPError as e:
+            await resp.aclose()
+            return self.proxy.error_response(route, e)
+        except BaseException:
+            # Cancelación a mitad del cuerpo: la conexión no debe quedar tomada
+            await resp.aclose()
+            raise
+        await resp.aclose()
+
+        cache_control = resp.headers.get("cache-control", "").lower()
+        cacheable = resp.status_code == 200 and "no-store" not in cache_control and "private" not in cache_control
+        entry = CacheEntry(resp.status_code, self.proxy.response_headers(resp), bytes(body), cacheable)
+        if store and cacheable:
+            self._store(key, entry)
+        return entry
+
+    def _refresh_in_background(self, key: str, route: ProxyRoute, request: Request):
+        if key in self._refreshing or key in self._flights:
+            return
+        # La petición original termina antes que el refresco: se copian path, query y headers
+        task = asyncio.create_task(
+            self._refresh(key, route, request.url.path, request.url.query, self._fill_headers(request))
+        )
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key: str, route: ProxyRoute, path: str, query: str, headers: List[Tuple[str, str]]):
+        # Por el single-flight: si justo hay una consulta de la misma clave en curso, se usa esa
+        result, shared = await self._flights.do(key, lambda: self._load(key, route, path, query, headers))
+        # Respuesta demasiado grande: se cierra sin enviarla y sigue la entrada vieja
+        if not shared and isinstance(result, Response) and result.background is not None:
+            await result.background()
+
+    @staticmethod
+    def _etag_matches(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        candidates = [value.strip() for value in if_none_match.split(",")]
+        # Comparación débil (RFC 9110 §13.1.2): W/"x" coincide con "x"
+        return "*" in candidates or etag in (c[2:] if c.startswith("W/") else c for c in candidates)
+
+    def _respond(self, request: Request, entry: CacheEntry, policy: CachePolicy, status: str, age: float) -> Response:
+        if not entry.cacheable:
+            # Error u otra respuesta no cacheable compartida entre peticiones en curso
+            response = Response(content=entry.body, status_code=entry.status)
+            response.raw_headers = entry.headers + [
+                (b"content-length", str(len(entry.body)).encode("latin-1")),
+                (b"x-cache", status.encode("latin-1")),
+            ]
+            return response
+
+        cache_headers = [
+            (b"etag", entry.etag.encode("latin-1")),
+            (b"cache-control", policy.cache_control().encode("latin-1")),
+            (b"age", str(int(age)).encode("latin-1")),
+            (b"x-cache", status.encode("latin-1")),
+        ]
+        if self._etag_matches(request, entry.etag):
+            self.counters["not_modified"] += 1
+            response = Response(status_code=304)
+            response.raw_headers = cache_headers
+            return response
+
+        response = Response(content=entry.body, status_code=entry.status)
+        response.raw_headers = entry.headers + cache_headers + [
+            (b"content-length", str(len(entry.body)).encode("latin-1"))
+        ]
+        return response
@@ -0,0 +1,183 @@
+"""
+Respuestas JSON con orjson y compresión negociada (brotli / gzip) de las respuestas grandes.
+
+FastAPI pasa lo que devuelve cada endpoint por jsonable_encoder antes de serializarlo, lo que
+recorre todo el payload en Python. Los endpoints con payloads grandes devuelven FastJSONResponse
+directamente para serializar una sola vez con orjson (datetime, NumPy, ObjectId y Decimal).
+Un tipo desconocido es un error (TypeError), no se convierte a texto en silencio.
+
+Las respuestas que ya vienen comprimidas (p. ej. del upstream del gateway) pasan tal cual.
+
+Este módulo está copiado igual en apigateway/, orquestador/ y orders-mongo-service
+(app/core/): cada servicio se despliega por separado. Un cambio va en las tres copias.
+"""
+import zlib
+from decimal import Decimal
+from typing import Any, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    from bson import Decimal128, ObjectId
+except ImportError:
+    # Servicios sin pymongo: no reciben tipos de BSON
+    Decimal128 = ObjectId = None
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+
+# Tipos de contenido que vale la pena comprimir
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/problem+json", "text/")
+
+
+def _default(obj: Any):
+    """Tipos que orjson no serializa por sí mismo (datetime, date, UUID y NumPy sí los maneja)"""
+    if ObjectId is not None:
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, Decimal128):
+            return float(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def dumps_line(content: Any) -> bytes:
+    """Una línea NDJSON (con el salto de línea)"""
+    return orjson.dumps(content, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' o 'gzip' según el Accept-Encoding del cliente (mayor q; a igual q, br), o None"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",):
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Compressor:
+    """Compresor incremental: cada bloque se vacía al enviarse (no demora el streaming)"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que comprime con brotli (si está instalado) o gzip, según Accept-Encoding,
+    las respuestas de tipo JSON/texto de al menos `minimum_size` bytes. Las respuestas en
+    streaming se comprimen bloque a bloque. No toca las que ya traen Content-Encoding.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        started = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, started
+            if message["type"] == "http.response.start":
+                # Los headers se envían con el primer bloque, cuando se sabe si se comprime
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not started:
+                started = True
+                headers = MutableHeaders(raw=start_message["headers"])
+                if self._should_compress(start_message["status"], headers, body, more_body):
+                    compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                    body = compressor.compress(body, final=not more_body)
+                    headers["content-encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    # El cuerpo ya no es byte a byte el mismo: el ETag pasa a ser débil
+                    etag = headers.get("etag")
+                    if etag and not etag.startswith("W/"):
+                        headers["etag"] = "W/" + etag
+                    if more_body:
+                        del headers["content-length"]
+                    else:
+                        headers["content-length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            if compressor is not None:
+                body = compressor.compress(body, final=not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _should_compress(self, status: int, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if status < 200 or status in (204, 304) or "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        # Un stream se comprime siempre: su tamaño total no se conoce de antemano
+        return more_body or len(body) >= self.minimum_size
@@ -0,0 +1,46 @@
+"""
+Single-flight: peticiones idénticas concurrentes comparten una sola llamada al upstream
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    La primera llamada con una clave ejecuta `fn`; las que llegan mientras está en curso
+    esperan ese mismo resultado (o excepción) en vez de repetir el trabajo. La llamada corre
+    en su propia tarea: si el cliente que la inició se desconecta, sigue para los demás.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Devuelve (resultado, compartido): compartido=True si lo calculó otra petición"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+
+        task = asyncio.create_task(fn())
+        self._calls[key] = task
+        self.leaders += 1
+
+        def done(finished: asyncio.Task):
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            # Si todos los que esperaban se fueron, la excepción no queda sin recuperar
+            if not finished.cancelled():
+                finished.exception()
+
+        task.add_done_callback(done)
+        return await asyncio.shield(task), False
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos del gateway se importan planos (como los corre uvicorn desde apigateway/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
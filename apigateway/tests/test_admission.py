@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import admission as admission_module
+import main
+from admission import AdmissionController, AdmissionMiddleware, ConcurrencyLimiter, RateLimitRule, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj de admission controlado por el test"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(admission_module, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def _controller(*rules):
+    return AdmissionController(list(rules), ConcurrencyLimiter(max_concurrent=10, max_queue=10, queue_timeout=1.0))
+
+
+def test_token_bucket_se_recarga_hasta_la_rafaga():
+    bucket = TokenBucket(rate=2.0, burst=3.0)
+    bucket.updated_at = 0.0
+    for _ in range(3):
+        assert bucket.wait_time(0.0) == 0.0
+        bucket.consume()
+
+    # Sin tokens: falta medio segundo para el siguiente
+    assert bucket.wait_time(0.0) == pytest.approx(0.5)
+    assert bucket.wait_time(0.5) == 0.0
+    # Mucho tiempo sin uso: se recarga solo hasta la ráfaga
+    bucket.wait_time(60.0)
+    assert bucket.tokens == 3.0
+
+
+def test_limite_por_cliente_y_por_ruta(clock):
+    controller = _controller(
+        RateLimitRule("client", "/", rate=1.0, burst=2.0),
+        RateLimitRule("orders", "/orders", rate=1.0, burst=3.0, per_client=False, methods=("POST",)),
+    )
+
+    assert controller.check_rate("GET", "/reports/x", "a") is None
+    assert controller.check_rate("GET", "/reports/x", "a") is None
+    rule, wait = controller.check_rate("GET", "/reports/x", "a")
+    assert (rule, wait) == ("client", pytest.approx(1.0))
+    # Cada cliente tiene su bucket
+    assert controller.check_rate("GET", "/reports/x", "b") is None
+
+    # El de /orders es uno solo para todos los clientes
+    assert controller.check_rate("POST", "/orders", "c") is None
+    assert controller.check_rate("POST", "/orders", "d") is None
+    assert controller.check_rate("POST", "/orders", "e") is None
+    assert controller.check_rate("POST", "/orders", "f")[0] == "orders"
+    assert controller.stats()["rate_limited_total"] == {"client": 1, "orders": 1}
+
+    clock.value += 1.0
+    assert controller.check_rate("GET", "/reports/x", "a") is None
+
+
+def test_rechazo_no_consume_de_las_otras_reglas(clock):
+    client_rule = RateLimitRule("client", "/", rate=1.0, burst=5.0)
+    controller = _controller(client_rule, RateLimitRule("reports", "/reports", rate=1.0, burst=1.0))
+
+    assert controller.check_rate("GET", "/reports/x", "a") is None
+    assert controller.check_rate("GET", "/reports/x", "a")[0] == "reports"
+    assert client_rule.bucket("a").tokens == 4.0
+
+
+def test_429_con_retry_after(clock):
+    app = FastAPI()
+
+    @app.get("/reports/x")
+    async def report():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    controller = _controller(RateLimitRule("reports", "/reports", rate=0.4, burst=1.0))
+    app.add_middleware(AdmissionMiddleware, controller=controller, exempt_paths=("/health",))
+    client = TestClient(app)
+
+    assert client.get("/reports/x").status_code == 200
+    limited = client.get("/reports/x")
+    assert limited.status_code == 429
+    # Falta 1 token a 0.4/s: 2.5 s, redondeado hacia arriba
+    assert limited.headers["retry-after"] == "3"
+    assert limited.json() == {"detail": "Límite de tasa excedido (reports)"}
+    # Los paths exentos no se cobran
+    assert client.get("/health").status_code == 200
+
+
+def test_charge_cobra_el_peso_y_deja_deuda(clock):
+    controller = _controller(
+        RateLimitRule("orders", "/orders", rate=1.0, burst=3.0, per_client=False, exclude=("/orders/batch",))
+    )
+    assert not controller.rules[0].applies("POST", "/orders/batch")
+
+    # Alcanza con un token aunque el peso supere la ráfaga; el bucket queda en -2
+    assert controller.charge("orders", 5) is None
+    assert controller.charge("orders", 1) == pytest.approx(3.0)
+    clock.value += 3.0
+    assert controller.charge("orders", 1) is None
+
+
+def test_orders_batch_se_cobra_por_pedido(monkeypatch, clock):
+    rule = next(rule for rule in main.admission.rules if rule.name == "orders")
+    monkeypatch.setattr(rule, "rate", 1.0)
+    monkeypatch.setattr(rule, "burst", 3.0)
+    monkeypatch.setattr(rule, "_buckets", type(rule._buckets)())
+    monkeypatch.setattr(main, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(main, "READ_MODEL_EVENTS_ENABLED", False)
+
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        orders = orjson.loads(request.content)["orders"]
+        sent.append(len(orders))
+        results = [{"index": i, "status": "CREATED", "id": str(i)} for i in range(len(orders))]
+        return httpx.Response(200, json={"results": results})
+
+    upstream = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(main.upstreams, "get", lambda name: upstream)
+
+    async def base_url(service_name, fallback_url=None):
+        return "http://gestor"
+
+    monkeypatch.setattr(main, "get_service_base_url", base_url)
+    client = TestClient(main.app)
+    batch = {"orders": [{"erp_order_id": f"ERP-{i}"} for i in range(5)]}
+
+    assert client.post("/orders/batch", json=batch).status_code == 200
+    limited = client.post("/orders/batch", json={"orders": [{"erp_order_id": "ERP-5"}]})
+    assert limited.status_code == 429
+    # 5 pedidos contra una ráfaga de 3: faltan 3 tokens a 1/s
+    assert limited.headers["retry-after"] == "3"
+    assert sent == [5]
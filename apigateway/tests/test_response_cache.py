@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import httpx
+import orjson
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from load_balancer import InstanceBalancer
+from proxy import ProxyRoute, ReverseProxy
+from response_cache import CachePolicy, ResponseCache
+
+PATH = "/reports/rutas-optimizadas"
+
+
+def _gateway(reports):
+    """Gateway mínimo con el caché de reportes delante de un orquestador falso que responde `reports` en orden"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        report = reports[min(len(calls), len(reports)) - 1]
+        # Como el orquestador: los reportes que no salieron completos van con no-store
+        headers = {} if report["status"] == "success" else {"cache-control": "no-store"}
+        body = orjson.dumps(report)
+        # Cuerpo como stream, igual que una respuesta de red (el proxy lo lee con aiter_raw)
+        return httpx.Response(200, stream=httpx.ByteStream(body),
+                              headers={"content-type": "application/json", "content-length": str(len(body)), **headers})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    upstreams = SimpleNamespace(get=lambda name: client)
+
+    async def resolve(service, fallback_url=None):
+        return fallback_url
+
+    proxy = ReverseProxy([ProxyRoute("/reports", "orquestador", "http://orquestador", discover=False)],
+                         upstreams, InstanceBalancer(), resolve)
+    cache = ResponseCache(proxy, [CachePolicy(PATH, ttl=60, stale_while_revalidate=30)])
+
+    app = FastAPI()
+
+    @app.get(PATH)
+    async def report(request: Request):
+        return await cache.handle(request, proxy.match(request.url.path), cache.policy_for(request))
+
+    return TestClient(app), calls, cache
+
+
+def test_reporte_parcial_no_se_cachea():
+    partial = {"status": "partial", "orders_count": 3, "partial": True}
+    complete = {"status": "success", "orders_count": 10, "partial": False}
+    client, calls, cache = _gateway([partial, complete])
+
+    first = client.get(PATH, params={"month": "2026-10"})
+    assert first.json()["status"] == "partial"
+    assert first.headers["x-cache"] == "MISS"
+    assert "etag" not in first.headers
+    assert cache.stats()["entries"] == 0
+
+    # La siguiente petición vuelve al orquestador y ya recibe el reporte completo
+    second = client.get(PATH, params={"month": "2026-10"})
+    assert second.json()["status"] == "success"
+    assert len(calls) == 2
+
+    third = client.get(PATH, params={"month": "2026-10"})
+    assert third.json()["status"] == "success"
+    assert third.headers["x-cache"] == "HIT"
+    assert len(calls) == 2
+
+
+def test_reporte_completo_se_sirve_del_cache_con_etag():
+    client, calls, _ = _gateway([{"status": "success", "orders_count": 10}])
+
+    first = client.get(PATH, params={"month": "2026-10"})
+    revalidated = client.get(PATH, params={"month": "2026-10"}, headers={"if-none-match": first.headers["etag"]})
+
+    assert first.headers["x-cache"] == "MISS"
+    assert revalidated.status_code == 304
+    assert len(calls) == 1
@@ -0,0 +1,60 @@
+"""
+Clientes HTTP compartidos del gateway: un httpx.AsyncClient con pool de conexiones por upstream
+"""
+from typing import Dict
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx solo negocia HTTP/2 si está instalado httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class UpstreamClients:
+    """
+    Un cliente por upstream (orquestador, gestor-pedidos, monitor, ...), creado al iniciar
+    la app y cerrado al apagarla. Cada cliente mantiene sus conexiones keep-alive hacia
+    todas las instancias del servicio, así una petición del frontend no abre conexiones
+    nuevas y un upstream lento no agota las conexiones de los demás.
+
+    HTTP/2 se negocia por ALPN, así que solo aplica a upstreams con https y con el
+    paquete h2 instalado; con http plano los clientes usan HTTP/1.1 con keep-alive.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        http2: bool = True,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def open(self, *names: str):
+        """Crea de una vez los clientes de los upstreams conocidos"""
+        for name in names:
+            self.get(name)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Cliente del upstream (se crea si es la primera vez que se usa)"""
+        client = self._clients.get(name)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.limits, http2=self.http2, timeout=self.timeout)
+            self._clients[name] = client
+        return client
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
@@ -19,7 +19,65 @@ class Config:
     # Configuración de service registry
     REGISTRY_PORT = int(os.getenv('REGISTRY_PORT', 8081))
     SERVICE_TTL = int(os.getenv('SERVICE_TTL', 30))  # Tiempo de vida del servicio en segundos
+    # Balanceo entre instancias: round-robin | least-outstanding | latency-weighted
+    LOAD_BALANCING_STRATEGY = os.getenv('LOAD_BALANCING_STRATEGY', 'round-robin')
+    # Barrido del registry: expira instancias sin heartbeat y elimina las que pasan TTL + gracia
+    REGISTRY_SWEEP_INTERVAL = float(os.getenv('REGISTRY_SWEEP_INTERVAL', 1))
+    REGISTRY_EVICTION_GRACE = float(os.getenv('REGISTRY_EVICTION_GRACE', 60))
+    # Sondeo activo de /health de cada instancia (latencia usada por el balanceo latency-weighted)
+    REGISTRY_PROBE_ENABLED = os.getenv('REGISTRY_PROBE_ENABLED', 'false').lower() == 'true'
+    REGISTRY_PROBE_INTERVAL = float(os.getenv('REGISTRY_PROBE_INTERVAL', 5))
+    REGISTRY_PROBE_TIMEOUT = float(os.getenv('REGISTRY_PROBE_TIMEOUT', 0.5))
+    REGISTRY_PROBE_CONCURRENCY = int(os.getenv('REGISTRY_PROBE_CONCURRENCY', 10))
+    REGISTRY_PROBE_FAILURE_THRESHOLD = int(os.getenv('REGISTRY_PROBE_FAILURE_THRESHOLD', 3))
+    # Checkpoint del registry en disco (vacío lo desactiva): se restaura al iniciar si tiene menos de MAX_AGE
+    REGISTRY_CHECKPOINT_PATH = os.getenv('REGISTRY_CHECKPOINT_PATH', 'registry_checkpoint.json')
+    REGISTRY_CHECKPOINT_INTERVAL = float(os.getenv('REGISTRY_CHECKPOINT_INTERVAL', 10))
+    REGISTRY_CHECKPOINT_MAX_AGE = float(os.getenv('REGISTRY_CHECKPOINT_MAX_AGE', 300))
+    REGISTRY_RESTORE_GRACE = float(os.getenv('REGISTRY_RESTORE_GRACE', 15))  # segundos para volver a mandar heartbeat
+    # Tiempo máximo que un long-poll de /registry/watch espera un cambio
+    REGISTRY_WATCH_MAX_WAIT = float(os.getenv('REGISTRY_WATCH_MAX_WAIT', 60))
     
     # Timeouts para llamadas a microservicios
     REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 0.5))  # 500ms para cumplir < 1 segundo total
+    
+    # Circuit breaker por instancia: fallos seguidos para abrir y segundos abierto antes de probar
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 5))
+    CIRCUIT_HALF_OPEN_MAX_CALLS = int(os.getenv('CIRCUIT_HALF_OPEN_MAX_CALLS', 1))
+    # Reintentos en otra instancia (solo métodos idempotentes), limitados por un token bucket por servicio
+    RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', 2))  # intentos totales por llamada
+    RETRY_BUDGET_PER_SECOND = float(os.getenv('RETRY_BUDGET_PER_SECOND', 2))
+    RETRY_BUDGET_BURST = float(os.getenv('RETRY_BUDGET_BURST', 10))
+    # Hedging de GETs: si la respuesta tarda más que el percentil de latencia, duplicar en otra instancia
+    HEDGING_ENABLED = os.getenv('HEDGING_ENABLED', 'false').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_DELAY_MS = float(os.getenv('HEDGE_MIN_DELAY_MS', 20))
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))  # muestras antes de empezar a hacer hedging
+    HEDGE_WORKERS = int(os.getenv('HEDGE_WORKERS', 20))
+    
+    # Deadline total de los reportes: al agotarse se responde con resultados parciales
+    REPORT_DEADLINE_MS = float(os.getenv('REPORT_DEADLINE_MS', 900))
+    ROUTE_LOOKUP_WORKERS = int(os.getenv('ROUTE_LOOKUP_WORKERS', 10))  # búsquedas de ruta en paralelo
+    # Pool de procesos para el cómputo de los reportes (0 = todo en el proceso del orquestador)
+    REPORT_PROCESS_WORKERS = int(os.getenv('REPORT_PROCESS_WORKERS', 2))
+    REPORT_PROCESS_MIN_ITEMS = int(os.getenv('REPORT_PROCESS_MIN_ITEMS', 500))  # con menos items se calcula en línea
+    
+    # Análisis de mes completo (todos los pedidos del mes, por lotes)
+    FULL_MONTH_BATCH_SIZE = int(os.getenv('FULL_MONTH_BATCH_SIZE', 5000))  # pedidos por lote
+    FULL_MONTH_REQUEST_TIMEOUT = float(os.getenv('FULL_MONTH_REQUEST_TIMEOUT', 10))  # segundos por lote
+    
+    # Precomputación de reportes mensuales
+    REPORT_SCHEDULER_ENABLED = os.getenv('REPORT_SCHEDULER_ENABLED', 'true').lower() == 'true'
+    REPORT_SCHEDULER_INTERVAL = int(os.getenv('REPORT_SCHEDULER_INTERVAL', 3600))  # segundos entre revisiones
+    REPORT_SNAPSHOT_DIR = os.getenv('REPORT_SNAPSHOT_DIR', 'report_snapshots')
+    REPORT_SNAPSHOT_TTL = float(os.getenv('REPORT_SNAPSHOT_TTL', 86400))  # segundos que vale un snapshot (0 = no vence)
+    
+    # Respuestas de al menos este tamaño (bytes) se comprimen con gzip/brotli si el cliente lo acepta
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    
+    # Read model local (SQLite) de pedidos con su ruta y tiempos reales; vacío lo desactiva
+    READ_MODEL_PATH = os.getenv('READ_MODEL_PATH', 'read_model.sqlite3')
+    # Segundos que vale la carga de un mes antes de revalidarla contra el gestor
+    READ_MODEL_SYNC_TTL = float(os.getenv('READ_MODEL_SYNC_TTL', 60))
 
@@ -0,0 +1,45 @@
+"""
+Deadline por petición para acotar el tiempo total de los reportes
+"""
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Se lanza cuando ya no queda presupuesto para hacer una llamada"""
+    pass
+
+
+class Deadline:
+    """
+    Presupuesto de tiempo de una petición.
+    Se crea al entrar al endpoint y se pasa a cada llamada del ServiceClient,
+    que deriva su timeout del tiempo restante.
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self._expires_at = time.monotonic() + budget_seconds
+
+    @classmethod
+    def from_ms(cls, budget_ms: float) -> 'Deadline':
+        return cls(budget_ms / 1000.0)
+
+    def remaining(self) -> float:
+        """Segundos restantes (nunca negativo)"""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """
+        Timeout para una sub-llamada: el tiempo restante, acotado por cap.
+        Lanza DeadlineExceeded si ya no queda presupuesto.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline de {round(self.budget * 1000)}ms agotado")
+        if cap is not None:
+            return min(cap, remaining)
+        return remaining
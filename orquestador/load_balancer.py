@@ -0,0 +1,130 @@
+"""
+Estrategias de balanceo de carga entre instancias de un mismo servicio
+"""
+import random
+import threading
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+STRATEGIES = ('round-robin', 'least-outstanding', 'latency-weighted')
+
+# Peso del último valor en la latencia promedio móvil (EWMA)
+LATENCY_EWMA_ALPHA = 0.2
+
+
+class LoadBalancer:
+    """
+    Elige una instancia entre las instancias sanas de un servicio.
+    
+    - round-robin: round-robin ponderado suave (como nginx) según 'weight'
+    - least-outstanding: menor número de peticiones en curso por unidad de peso
+    - latency-weighted: aleatorio con probabilidad proporcional a weight / latencia
+    
+    Las peticiones en curso y la latencia de cada instancia las mide quien hace
+    las llamadas (acquire/release). El lock es propio del balanceador, no del registry.
+    """
+    
+    def __init__(self, strategy: str = 'round-robin'):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia de balanceo no soportada: {strategy}")
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        # Estado por (servicio, instancia)
+        self._current_weights: Dict[Tuple[str, str], float] = {}
+        self._outstanding: Dict[Tuple[str, str], int] = {}
+        self._latency_ms: Dict[Tuple[str, str], float] = {}
+    
+    def choose(self, service_name: str, instances: Sequence[Mapping], strategy: Optional[str] = None) -> Optional[Mapping]:
+        if not instances:
+            return None
+        if len(instances) == 1:
+            return instances[0]
+        
+        strategy = strategy or self.strategy
+        if strategy == 'least-outstanding':
+            return self._least_outstanding(service_name, instances)
+        if strategy == 'latency-weighted':
+            return self._latency_weighted(service_name, instances)
+        return self._round_robin(service_name, instances)
+    
+    def acquire(self, service_name: str, instance_id: str):
+        """Marca el inicio de una petición a la instancia"""
+        key = (service_name, instance_id)
+        with self._lock:
+            self._outstanding[key] = self._outstanding.get(key, 0) + 1
+    
+    def release(self, service_name: str, instance_id: str, latency_ms: Optional[float] = None):
+        """Marca el fin de una petición y actualiza la latencia promedio de la instancia"""
+        key = (service_name, instance_id)
+        with self._lock:
+            self._outstanding[key] = max(0, self._outstanding.get(key, 0) - 1)
+            if latency_ms is not None:
+                previous = self._latency_ms.get(key)
+                self._latency_ms[key] = (
+                    latency_ms if previous is None
+                    else LATENCY_EWMA_ALPHA * latency_ms + (1 - LATENCY_EWMA_ALPHA) * previous
+                )
+    
+    def retain(self, services: Mapping[str, Sequence[Mapping]]):
+        """
+        Descarta el estado de las instancias que ya no están en `services` (servicio -> instancias):
+        sin esto los dicts crecen con cada instance_id nuevo y un peso viejo sesga el round-robin
+        si el id vuelve a aparecer.
+        """
+        live = {
+            (service_name, instance['instance_id'])
+            for service_name, instances in services.items()
+            for instance in instances
+        }
+        with self._lock:
+            for state in (self._current_weights, self._outstanding, self._latency_ms):
+                for key in [key for key in state if key not in live]:
+                    del state[key]
+    
+    def latency_ms(self, service_name: str, instance_id: str) -> Optional[float]:
+        return self._latency_ms.get((service_name, instance_id))
+    
+    def _round_robin(self, service_name: str, instances: Sequence[Mapping]) -> Mapping:
+        with self._lock:
+            total = 0
+            best = None
+            best_weight = None
+            for instance in instances:
+                key = (service_name, instance['instance_id'])
+                weight = instance.get('weight', 1)
+                current = self._current_weights.get(key, 0) + weight
+                self._current_weights[key] = current
+                total += weight
+                if best_weight is None or current > best_weight:
+                    best, best_weight = instance, current
+            
+            self._current_weights[(service_name, best['instance_id'])] -= total
+            return best
+    
+    def _least_outstanding(self, service_name: str, instances: Sequence[Mapping]) -> Mapping:
+        def load(instance: Mapping) -> float:
+            outstanding = self._outstanding.get((service_name, instance['instance_id']), 0)
+            return (outstanding + 1) / max(instance.get('weight', 1), 1)
+        
+        loads = [load(i) for i in instances]
+        lowest = min(loads)
+        return random.choice([i for i, l in zip(instances, loads) if l == lowest])
+    
+    def _latency_weighted(self, service_name: str, instances: Sequence[Mapping]) -> Mapping:
+        latencies = [self._instance_latency(service_name, i) for i in instances]
+        known = [l for l in latencies if l]
+        # Instancias sin medición usan la latencia promedio para que también reciban tráfico
+        default_latency = sum(known) / len(known) if known else 1.0
+        scores = [
+            max(i.get('weight', 1), 0) / max(l or default_latency, 0.1)
+            for i, l in zip(instances, latencies)
+        ]
+        if not any(scores):
+            return random.choice(instances)
+        return random.choices(instances, weights=scores, k=1)[0]
+    
+    def _instance_latency(self, service_name: str, instance: Mapping) -> Optional[float]:
+        """Latencia medida por las llamadas propias o, si no hay, la del sondeo activo del registry"""
+        latency = self._latency_ms.get((service_name, instance['instance_id']))
+        if latency is None:
+            return instance.get('probe_latency_ms')
+        return latency
@@ -0,0 +1,416 @@
+"""
+Prueba de carga del orquestador con backends simulados.
+
+Levanta en el mismo proceso servidores stub de gestor-pedidos y ruta-optima (con latencia
+y errores configurables), los registra en el registry del orquestador y llama al endpoint
+de reportes a una tasa fija (RPS). Al final muestra percentiles de latencia y la tasa de
+violaciones del SLA, para comparar cambios en ReportService y ServiceClient.
+
+Uso:
+    python -m orquestador.loadtest --rps 10 --duration 30
+    python -m orquestador.loadtest --ruta-instances 3 --ruta-degraded 1 --degraded-latency-ms 600
+    python -m orquestador.loadtest --orchestrator-url http://localhost:8080 --output resultado.json
+
+Sin --orchestrator-url se inicia un orquestador propio en un subproceso (sin precomputación
+de reportes ni checkpoint del registry) apuntando a los stubs.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse
+
+REPORT_ENDPOINTS = ('rutas-optimizadas', 'pedidos-con-rutas')
+
+class LatencyProfile:
+    """
+    Latencia simulada de un backend: lognormal alrededor de la mediana, más una
+    fracción de respuestas lentas (cola) y una fracción de errores 500
+    """
+    
+    def __init__(self, median_ms: float, sigma: float = 0.3, slow_rate: float = 0.0,
+                 slow_ms: float = 0.0, error_rate: float = 0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+    
+    def delay(self) -> float:
+        """Segundos a esperar antes de responder"""
+        if self.slow_rate and random.random() < self.slow_rate:
+            return self.slow_ms / 1000
+        return random.lognormvariate(math.log(max(self.median_ms, 0.01)), self.sigma) / 1000
+    
+    def fails(self) -> bool:
+        return bool(self.error_rate) and random.random() < self.error_rate
+
+def build_gestor_stub(profile: LatencyProfile, items_per_order: int = 5, stands: int = 8) -> FastAPI:
+    """Stub de gestor-pedidos con los endpoints que usa ReportService"""
+    app = FastAPI()
+    
+    def make_order(n: int, month: str) -> Dict:
+        return {
+            'id': f"{n:024x}",
+            'erp_order_id': f"ERP-{month}-{n:05d}",
+            'status': 'DELIVERED',
+            'created_at': f"{month}-01T00:00:00",
+            'items': [
+                {
+                    'sku': f"SKU-{n}-{i}",
+                    'cantidad': 1,
+                    'stand_id_estimada': f"STAND-{(n + i) % stands}",
+                    'tiempo_estimado_pick': round(random.uniform(3, 8), 2)
+                }
+                for i in range(items_per_order)
+            ]
+        }
+    
+    @app.get('/health')
+    async def health():
+        return {'status': 'healthy'}
+    
+    @app.get('/orders/last-10-previous-month')
+    async def last_10(month: str = Query(...)):
+        await asyncio.sleep(profile.delay())
+        if profile.fails():
+            return JSONResponse(status_code=500, content={'detail': 'error simulado'})
+        return {'status': 'success', 'orders': [make_order(n, month) for n in range(10)]}
+    
+    @app.put('/orders/real-times')
+    async def real_times(request: Request):
+        payload = await request.json()
+        await asyncio.sleep(profile.delay())
+        if profile.fails():
+            return JSONResponse(status_code=500, content={'detail': 'error simulado'})
+        orders = payload.get('orders', [])
+        return {
+            'status': 'success',
+            'updated': len(orders),
+            'results': [{'erp_order_id': o.get('erp_order_id'), 'status': 'UPDATED'} for o in orders]
+        }
+    
+    return app
+
+def build_ruta_stub(profile: LatencyProfile) -> FastAPI:
+    """Stub de ruta-optima: devuelve una ruta para cualquier pedido"""
+    app = FastAPI()
+    
+    @app.get('/health')
+    async def health():
+        return {'status': 'healthy'}
+    
+    @app.get('/ruta/{order_id}/')
+    async def ruta(order_id: str):
+        await asyncio.sleep(profile.delay())
+        if profile.fails():
+            return JSONResponse(status_code=500, content={'status': 'ERROR', 'mensaje': 'error simulado'})
+        return {
+            'status': 'OK',
+            'ruta': {
+                'ruta': ['ENTRADA', 'STAND-1', 'STAND-4', 'SALIDA'],
+                'distancia_m': 120.0,
+                'tiempo_caminar_seg': 48.0,
+                'tiempo_picking_seg': 30.0,
+                'tiempo_total_seg': 78.0,
+                'tiempo_total_min': 1.3,
+                'items_recogidos': 5,
+                'velocidad_usada_m_s': 2.5
+            }
+        }
+    
+    return app
+
+class ServerThread:
+    """Servidor uvicorn en un hilo en segundo plano"""
+    
+    def __init__(self, app: FastAPI, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+    
+    def start(self, timeout: float = 10.0):
+        self._thread.start()
+        started = time.monotonic()
+        while not self.server.started:
+            if time.monotonic() - started > timeout:
+                raise RuntimeError(f"El stub en el puerto {self.port} no inició")
+            time.sleep(0.01)
+    
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_orchestrator(port: int, gestor_url: str, ruta_url: str, read_model_path: str = '') -> subprocess.Popen:
+    """Inicia un orquestador en un subproceso, aislado del GIL de los stubs y del generador de carga"""
+    env = {
+        **os.environ,
+        'ORCHESTRATOR_PORT': str(port),
+        'GESTOR_PEDIDOS_URL': gestor_url,
+        'RUTA_OPTIMA_URL': ruta_url,
+        'REPORT_SCHEDULER_ENABLED': 'false',
+        'REGISTRY_CHECKPOINT_PATH': '',
+        # Sin read model se mide el join en vivo contra los stubs
+        'READ_MODEL_PATH': read_model_path,
+    }
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'orquestador.main:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning'],
+        cwd=repo_root,
+        env=env,
+        stdout=subprocess.DEVNULL
+    )
+
+async def wait_healthy(url: str, timeout: float = 15.0):
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"El orquestador en {url} no respondió /health")
+
+async def register_backends(orchestrator_url: str, backends: List[Tuple[str, str, int]]):
+    """Registra cada instancia stub (servicio, instance_id, puerto) en el registry del orquestador"""
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        for service_name, instance_id, port in backends:
+            resp = await client.post(f"{orchestrator_url}/registry/register", params={
+                'service_name': service_name,
+                'host': '127.0.0.1',
+                'port': port,
+                'instance_id': instance_id
+            })
+            resp.raise_for_status()
+
+async def unregister_backends(orchestrator_url: str, backends: List[Tuple[str, str, int]]):
+    """Quita los stubs del registry (importante con un orquestador externo)"""
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        for service_name, instance_id, _ in backends:
+            try:
+                await client.delete(f"{orchestrator_url}/registry/service/{service_name}",
+                                    params={'instance_id': instance_id})
+            except httpx.HTTPError:
+                pass
+
+async def heartbeat_loop(orchestrator_url: str, backends: List[Tuple[str, str, int]], interval: float):
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        while True:
+            await asyncio.sleep(interval)
+            for service_name, instance_id, _ in backends:
+                try:
+                    await client.post(f"{orchestrator_url}/registry/heartbeat/{service_name}",
+                                      params={'instance_id': instance_id})
+                except httpx.HTTPError as e:
+                    print(f"⚠️ Heartbeat de {service_name} [{instance_id}] falló: {e}")
+
+async def drive_load(url: str, params: Dict, rps: float, duration: float, timeout: float,
+                     max_in_flight: int) -> List[Dict]:
+    """
+    Carga de lazo abierto: lanza las peticiones a intervalos fijos sin esperar a que
+    terminen las anteriores (como llegan los usuarios), con un tope de peticiones en curso.
+    Las que no caben en el tope se cuentan como descartadas.
+    """
+    results: List[Dict] = []
+    in_flight = 0
+    
+    async with httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=max_in_flight)) as client:
+        async def one():
+            nonlocal in_flight
+            start = time.perf_counter()
+            try:
+                resp = await client.get(url, params=params)
+                status = resp.status_code
+                body = resp.json() if status == 200 else {}
+                partial = body.get('status') == 'partial'
+            except httpx.TimeoutException:
+                status, partial = 'timeout', False
+            except Exception:
+                status, partial = 'error', False
+            finally:
+                in_flight -= 1
+            results.append({
+                'latency_ms': (time.perf_counter() - start) * 1000,
+                'status': status,
+                'partial': partial
+            })
+        
+        tasks = []
+        total = int(rps * duration)
+        started = time.perf_counter()
+        for n in range(total):
+            delay = started + n / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= max_in_flight:
+                results.append({'latency_ms': None, 'status': 'dropped', 'partial': False})
+                continue
+            in_flight += 1
+            tasks.append(asyncio.create_task(one()))
+        await asyncio.gather(*tasks)
+    
+    return results
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 2)
+
+def summarize(results: List[Dict], sla_ms: float, duration: float) -> Dict:
+    """Percentiles de latencia y violaciones del SLA (respuesta no 200 o más lenta que sla_ms)"""
+    latencies = sorted(r['latency_ms'] for r in results if r['latency_ms'] is not None)
+    ok = [r for r in results if r['status'] == 200]
+    violations = [
+        r for r in results
+        if r['status'] != 200 or r['latency_ms'] is None or r['latency_ms'] > sla_ms
+    ]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+    
+    return {
+        'requests': len(results),
+        'achieved_rps': round(len(latencies) / duration, 2) if duration else None,
+        'ok': len(ok),
+        'partial': sum(1 for r in ok if r['partial']),
+        'statuses': statuses,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': round(latencies[-1], 2) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None
+        },
+        'sla_ms': sla_ms,
+        'sla_violations': len(violations),
+        'sla_violation_rate': round(len(violations) / len(results), 4) if results else 0.0
+    }
+
+def print_summary(summary: Dict):
+    lat = summary['latency_ms']
+    print("\n📊 Resultado de la prueba de carga")
+    print(f"   Peticiones: {summary['requests']} ({summary['achieved_rps']} rps completadas)")
+    print(f"   OK: {summary['ok']} (parciales: {summary['partial']})  Estados: {summary['statuses']}")
+    print(f"   Latencia ms  p50={lat['p50']}  p90={lat['p90']}  p95={lat['p95']}  p99={lat['p99']}  max={lat['max']}")
+    print(f"   Violaciones del SLA ({summary['sla_ms']}ms): {summary['sla_violations']} "
+          f"({summary['sla_violation_rate'] * 100:.2f}%)")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Prueba de carga del orquestador con backends simulados")
+    parser.add_argument('--orchestrator-url', help="Orquestador ya en ejecución (por defecto se inicia uno)")
+    parser.add_argument('--endpoint', choices=REPORT_ENDPOINTS, default='rutas-optimizadas')
+    parser.add_argument('--month', default='2025-11')
+    parser.add_argument('--rps', type=float, default=10.0, help="Peticiones por segundo")
+    parser.add_argument('--duration', type=float, default=30.0, help="Segundos de carga")
+    parser.add_argument('--warmup', type=float, default=2.0, help="Segundos de carga previa que no se miden")
+    parser.add_argument('--sla-ms', type=float, default=1000.0)
+    parser.add_argument('--timeout', type=float, default=10.0, help="Timeout de cada petición del cliente")
+    parser.add_argument('--max-in-flight', type=int, default=200)
+    # Backends simulados
+    parser.add_argument('--gestor-instances', type=int, default=1)
+    parser.add_argument('--gestor-latency-ms', type=float, default=20.0)
+    parser.add_argument('--gestor-error-rate', type=float, default=0.0)
+    parser.add_argument('--ruta-instances', type=int, default=2)
+    parser.add_argument('--ruta-latency-ms', type=float, default=40.0)
+    parser.add_argument('--ruta-error-rate', type=float, default=0.0)
+    parser.add_argument('--latency-sigma', type=float, default=0.3, help="Dispersión lognormal de la latencia")
+    parser.add_argument('--slow-rate', type=float, default=0.0, help="Fracción de respuestas lentas de ruta-optima")
+    parser.add_argument('--slow-ms', type=float, default=800.0)
+    parser.add_argument('--ruta-degraded', type=int, default=0, help="Instancias de ruta-optima degradadas")
+    parser.add_argument('--degraded-latency-ms', type=float, default=600.0)
+    parser.add_argument('--heartbeat-interval', type=float, default=10.0)
+    parser.add_argument('--read-model-path', default='',
+                        help="READ_MODEL_PATH del orquestador iniciado (vacío: sin read model, join en vivo)")
+    parser.add_argument('--output', help="Archivo JSON donde guardar el resultado")
+    return parser.parse_args(argv)
+
+async def run(args: argparse.Namespace, orchestrator_url: str, backends: List[Tuple[str, str, int]]) -> Dict:
+    await wait_healthy(orchestrator_url)
+    await register_backends(orchestrator_url, backends)
+    heartbeats = asyncio.create_task(heartbeat_loop(orchestrator_url, backends, args.heartbeat_interval))
+    
+    url = f"{orchestrator_url}/reports/{args.endpoint}"
+    # live=true: medir la generación del reporte, no el snapshot precomputado
+    params = {'month': args.month, 'live': 'true'}
+    try:
+        if args.warmup > 0:
+            await drive_load(url, params, args.rps, args.warmup, args.timeout, args.max_in_flight)
+        print(f"🚀 {args.rps} rps durante {args.duration}s contra {url}")
+        results = await drive_load(url, params, args.rps, args.duration, args.timeout, args.max_in_flight)
+    finally:
+        heartbeats.cancel()
+        await unregister_backends(orchestrator_url, backends)
+    return summarize(results, args.sla_ms, args.duration)
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    args = parse_args(argv)
+    
+    gestor_profile = LatencyProfile(args.gestor_latency_ms, args.latency_sigma, error_rate=args.gestor_error_rate)
+    ruta_profile = LatencyProfile(args.ruta_latency_ms, args.latency_sigma, args.slow_rate, args.slow_ms,
+                                  args.ruta_error_rate)
+    degraded_profile = LatencyProfile(args.degraded_latency_ms, args.latency_sigma, error_rate=args.ruta_error_rate)
+    
+    servers: List[ServerThread] = []
+    backends: List[Tuple[str, str, int]] = []
+    for n in range(args.gestor_instances):
+        servers.append(ServerThread(build_gestor_stub(gestor_profile), free_port()))
+        backends.append(('gestor-pedidos', f"gestor-stub-{n}", servers[-1].port))
+    for n in range(args.ruta_instances):
+        profile = degraded_profile if n < args.ruta_degraded else ruta_profile
+        servers.append(ServerThread(build_ruta_stub(profile), free_port()))
+        backends.append(('ruta-optima', f"ruta-stub-{n}", servers[-1].port))
+    
+    orchestrator: Optional[subprocess.Popen] = None
+    try:
+        for server in servers:
+            server.start()
+        print(f"🧪 Stubs iniciados: {[(name, port) for name, _, port in backends]}")
+        
+        orchestrator_url = args.orchestrator_url
+        if not orchestrator_url:
+            port = free_port()
+            orchestrator = start_orchestrator(port, f"http://127.0.0.1:{backends[0][2]}",
+                                              f"http://127.0.0.1:{backends[-1][2]}", args.read_model_path)
+            orchestrator_url = f"http://127.0.0.1:{port}"
+        
+        summary = asyncio.run(run(args, orchestrator_url, backends))
+        summary['config'] = vars(args)
+    finally:
+        if orchestrator is not None:
+            orchestrator.terminate()
+            orchestrator.wait(timeout=10)
+        for server in servers:
+            server.stop()
+    
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultado guardado en {args.output}")
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -2,18 +2,29 @@
 Orquestador de Microservicios
 Comunica y coordina los microservicios usando service discovery
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Dict, List, Optional
+import asyncio
 import uvicorn
 from .config import Config
-from .service_registry import ServiceRegistry
+from .service_registry import registry
 from .report_service import ReportService
+from .read_model import normalize_timestamp
+from .deadline import Deadline
+from .report_snapshots import ReportSnapshotStore, ReportScheduler, MONTH_PATTERN, report_month_of
+from .registry_sweeper import RegistrySweeper
+from .registry_checkpoint import RegistryCheckpointer
+from .registry_watch import RegistryWatchHub
+from .metrics import RequestTrace, current_trace, hop_metrics
+from .singleflight import SingleFlight
+from .responses import CompressionMiddleware, FastJSONResponse, dumps_line
 
-# Inicializar registry con TTL desde configuración
-registry = ServiceRegistry(ttl=Config.SERVICE_TTL)
+app = FastAPI(title="Orquestador de Microservicios", version="1.0.0", default_response_class=FastJSONResponse)
 
-app = FastAPI(title="Orquestador de Microservicios", version="1.0.0")
+# Compresión gzip/brotli de las respuestas grandes (reportes), según Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=Config.COMPRESSION_MIN_SIZE)
 
 # CORS
 app.add_middleware(
@@ -26,26 +37,79 @@ app.add_middleware(
 
 # Inicializar servicios
 report_service = ReportService()
+snapshot_store = ReportSnapshotStore(Config.REPORT_SNAPSHOT_DIR, ttl=Config.REPORT_SNAPSHOT_TTL)
+report_scheduler = ReportScheduler(report_service, snapshot_store, interval=Config.REPORT_SCHEDULER_INTERVAL)
+
+registry_sweeper = RegistrySweeper(
+    registry,
+    interval=Config.REGISTRY_SWEEP_INTERVAL,
+    eviction_grace=Config.REGISTRY_EVICTION_GRACE,
+    probe_enabled=Config.REGISTRY_PROBE_ENABLED,
+    probe_interval=Config.REGISTRY_PROBE_INTERVAL,
+    probe_timeout=Config.REGISTRY_PROBE_TIMEOUT,
+    probe_concurrency=Config.REGISTRY_PROBE_CONCURRENCY
+)
+
+registry_checkpointer = RegistryCheckpointer(
+    registry,
+    Config.REGISTRY_CHECKPOINT_PATH,
+    interval=Config.REGISTRY_CHECKPOINT_INTERVAL,
+    restore_grace=Config.REGISTRY_RESTORE_GRACE,
+    max_age=Config.REGISTRY_CHECKPOINT_MAX_AGE
+) if Config.REGISTRY_CHECKPOINT_PATH else None
+
+registry_watch = RegistryWatchHub(registry)
+
+# Generaciones de reportes en curso (las peticiones idénticas concurrentes comparten una)
+report_flights = SingleFlight()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    registry_watch.attach(asyncio.get_running_loop())
+    if registry_checkpointer:
+        registry_checkpointer.restore()
+        registry_checkpointer.start()
+    registry_sweeper.start()
+    report_service.compute.start()
+    if Config.REPORT_SCHEDULER_ENABLED:
+        report_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await registry_sweeper.stop()
+    await report_scheduler.stop()
+    if registry_checkpointer:
+        await registry_checkpointer.stop()
+    # Espera a que terminen los procesos del pool sin bloquear el event loop
+    await asyncio.to_thread(report_service.compute.shutdown)
 
 # ==================== SERVICE REGISTRY ENDPOINTS ====================
 
 @app.post("/registry/register")
-async def register_service(service_name: str, host: str, port: int):
+async def register_service(
+    service_name: str,
+    host: str,
+    port: int,
+    instance_id: Optional[str] = Query(None, description="Identificador de la instancia (por defecto host:port)"),
+    weight: int = Query(1, ge=0, description="Peso relativo de la instancia para el balanceo"),
+    metadata: Optional[Dict] = Body(None)
+):
     """
-    Registra un servicio en el registry.
+    Registra una instancia de un servicio en el registry.
     Los servicios deben llamar a este endpoint al iniciar.
+    Varias instancias del mismo servicio se registran con distinto instance_id.
     """
-    registry.register(service_name, host, port)
+    instance = registry.register(service_name, host, port, metadata=metadata, instance_id=instance_id, weight=weight)
     return {
         "status": "success",
         "message": f"Servicio {service_name} registrado",
-        "service": registry.get_service(service_name)
+        "service": instance
     }
 
 @app.post("/registry/heartbeat/{service_name}")
-async def heartbeat(service_name: str):
-    """Endpoint para heartbeat de servicios"""
-    success = registry.heartbeat(service_name)
+async def heartbeat(service_name: str, instance_id: Optional[str] = None):
+    """Endpoint para heartbeat de servicios (sin instance_id aplica a todas sus instancias)"""
+    success = registry.heartbeat(service_name, instance_id)
     if success:
         return {"status": "success", "message": f"Heartbeat recibido de {service_name}"}
     else:
@@ -53,7 +117,7 @@ async def heartbeat(service_name: str):
 
 @app.get("/registry/services")
 async def list_services():
-    """Lista todos los servicios registrados"""
+    """Lista todas las instancias registradas"""
     services = registry.list_services()
     return {
         "status": "success",
@@ -63,17 +127,37 @@ async def list_services():
 
 @app.get("/registry/service/{service_name}")
 async def get_service(service_name: str):
-    """Obtiene información de un servicio específico"""
-    service = registry.get_service(service_name)
-    if service:
-        return {"status": "success", "service": service}
+    """
+    Obtiene información de un servicio específico.
+    'service' es la primera instancia sana e 'instances' todas; es solo lectura, no avanza
+    el balanceo (cada consumidor balancea con 'instances').
+    """
+    instances = registry.get_instances(service_name)
+    if instances:
+        return {"status": "success", "service": instances[0], "instances": instances}
     else:
         raise HTTPException(status_code=404, detail=f"Servicio {service_name} no encontrado")
 
+@app.get("/registry/watch")
+async def watch_registry(
+    index: Optional[int] = Query(None, ge=0, description="Versión del registry que ya conoce el consumidor"),
+    wait: float = Query(30, gt=0, description="Segundos máximos a esperar un cambio")
+):
+    """
+    Long-poll del registry: responde apenas la versión sea distinta de `index`
+    (o al vencer `wait`) con la versión actual y todas las instancias sanas por servicio.
+    Sin `index` responde de inmediato (sincronización inicial).
+    El consumidor repite la llamada con el `index` recibido para enterarse del próximo cambio.
+    """
+    if index is None:
+        return registry_watch.to_response(registry.snapshot())
+    snapshot = await registry_watch.wait(index, min(wait, Config.REGISTRY_WATCH_MAX_WAIT))
+    return registry_watch.to_response(snapshot)
+
 @app.delete("/registry/service/{service_name}")
-async def unregister_service(service_name: str):
-    """Desregistra un servicio"""
-    success = registry.unregister(service_name)
+async def unregister_service(service_name: str, instance_id: Optional[str] = None):
+    """Desregistra una instancia (o, sin instance_id, todas las instancias) de un servicio"""
+    success = registry.unregister(service_name, instance_id)
     if success:
         return {"status": "success", "message": f"Servicio {service_name} desregistrado"}
     else:
@@ -81,50 +165,262 @@ async def unregister_service(service_name: str):
 
 # ==================== REPORT ENDPOINTS ====================
 
+def _snapshot_response(month: str, report_name: str) -> Optional[Dict]:
+    """Respuesta a partir del snapshot precomputado, o None si no existe"""
+    snapshot = snapshot_store.load(month, report_name)
+    if not snapshot:
+        return None
+    return {
+        "status": "success",
+        **snapshot['report'],
+        "source": "snapshot",
+        "generated_at": snapshot['generated_at']
+    }
+
+def _report_response(content: Dict) -> FastJSONResponse:
+    """
+    Respuesta de un reporte. Los que no salieron completos (partial, warning o error) van con
+    Cache-Control: no-store para que el caché del gateway no los siga sirviendo
+    """
+    headers = None if content.get('status') == 'success' else {'Cache-Control': 'no-store'}
+    return FastJSONResponse(content, headers=headers)
+
+def _traced(debug: bool, generate, *args) -> Dict:
+    """
+    Genera el reporte; con debug agrega 'timing_breakdown' con los spans de cada
+    sub-llamada (servicio, endpoint, ttfb y total) y el tiempo propio del orquestador
+    """
+    if not debug:
+        return generate(*args)
+    
+    trace = RequestTrace()
+    token = current_trace.set(trace)
+    try:
+        report = generate(*args)
+    finally:
+        current_trace.reset(token)
+    report['timing_breakdown'] = trace.breakdown()
+    return report
+
+async def _generate(debug: bool, generate, *args) -> Dict:
+    """
+    _traced en un hilo: la generación es bloqueante (llamadas HTTP y espera del pool de
+    procesos) y en el event loop frenaría heartbeats y health checks mientras dura.
+    
+    Sin debug, las peticiones concurrentes del mismo reporte con los mismos parámetros
+    (sin contar el deadline de cada una) esperan la generación que ya está en curso.
+    El reporte compartido no se modifica: cada endpoint arma su propio dict de respuesta.
+    """
+    if debug:
+        return await asyncio.to_thread(_traced, debug, generate, *args)
+    
+    key = (generate.__name__,) + tuple(arg for arg in args if not isinstance(arg, Deadline))
+    report, _ = await report_flights.do(key, lambda: asyncio.to_thread(generate, *args))
+    return report
+
 @app.get("/reports/rutas-optimizadas")
-async def get_rutas_optimizadas_report(month: str = Query(..., description="Mes en formato YYYY-MM")):
+async def get_rutas_optimizadas_report(
+    month: str = Query(..., description="Mes en formato YYYY-MM"),
+    mode: str = Query("last-10", description="'last-10' (últimos 10 pedidos) o 'full-month' (todo el mes)"),
+    live: bool = Query(False, description="Ignorar el snapshot precomputado y generar el reporte en vivo"),
+    debug: bool = Query(False, description="Generar en vivo e incluir el desglose de tiempos por sub-llamada")
+):
     """
     Genera reporte de rutas optimizadas para los últimos 10 pedidos del mes anterior.
     Identifica stands donde no se estima correctamente el tiempo de preparación.
     
+    Con mode=full-month analiza todos los pedidos del mes anterior con estadísticas
+    vectorizadas (media, mediana, p90, desviación estándar e IC 95% por stand).
+    
+    Si el reporte del mes ya fue precomputado se sirve el snapshot (con generated_at).
+    Con debug=true se genera en vivo e incluye timing_breakdown.
+    
     Requisitos:
     - Respuesta en menos de 1 segundo
     - Relaciona datos de GestorPedidos con ruta_optima
     - Compara tiempos estimados vs reales por stand
     """
+    if mode not in ("last-10", "full-month"):
+        raise HTTPException(status_code=400, detail=f"Modo no soportado: {mode}")
+    
+    if mode == "full-month":
+        report = await _generate(debug, report_service.generate_full_month_report, month)
+        return _report_response({"status": "success" if 'error' not in report else "error", **report})
+    
+    if not live and not debug:
+        snapshot = _snapshot_response(month, 'rutas-optimizadas')
+        if snapshot:
+            return _report_response(snapshot)
+    
     try:
-        report = report_service.generate_route_report(month)
+        report = await _generate(debug, report_service.generate_route_report, month, Deadline.from_ms(Config.REPORT_DEADLINE_MS))
+        
+        if 'error' in report:
+            return _report_response({"status": "error", **report})
+        
+        # El deadline se agotó: el reporte solo incluye las rutas que alcanzaron a llegar
+        if report.get('partial'):
+            return _report_response({
+                "status": "partial",
+                "message": "Deadline agotado, el reporte incluye solo las rutas recibidas a tiempo",
+                **report
+            })
         
         # Verificar que el tiempo de procesamiento sea < 1 segundo
         if report.get('processing_time_ms', 0) > 1000:
-            return {
+            return _report_response({
                 "status": "warning",
                 "message": "El reporte tardó más de 1 segundo en generarse",
                 **report
-            }
+            })
         
-        return {
+        return _report_response({
             "status": "success",
             **report
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/reports/pedidos-con-rutas")
-async def get_pedidos_con_rutas(month: str = Query(..., description="Mes en formato YYYY-MM")):
+async def get_pedidos_con_rutas(
+    month: str = Query(..., description="Mes en formato YYYY-MM"),
+    live: bool = Query(False, description="Ignorar el snapshot precomputado y generar el reporte en vivo"),
+    debug: bool = Query(False, description="Generar en vivo e incluir el desglose de tiempos por sub-llamada")
+):
     """
     Obtiene los últimos 10 pedidos del mes anterior con toda su información
     y las rutas optimizadas calculadas para cada uno.
+    Si el deadline se agota, los pedidos sin ruta a tiempo vienen con ruta_completa=False.
+    Si el reporte del mes ya fue precomputado se sirve el snapshot (con generated_at).
+    Con debug=true se genera en vivo e incluye timing_breakdown.
     """
+    if not live and not debug:
+        snapshot = _snapshot_response(month, 'pedidos-con-rutas')
+        if snapshot:
+            return _report_response(snapshot)
+    
     try:
-        result = report_service.get_orders_with_routes_detailed(month)
-        return {
-            "status": "success",
+        result = await _generate(
+            debug, report_service.get_orders_with_routes_detailed, month, Deadline.from_ms(Config.REPORT_DEADLINE_MS)
+        )
+        if 'error' in result:
+            status = "error"
+        else:
+            status = "partial" if result.get('partial') else "success"
+        return _report_response({
+            "status": status,
             **result
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _ndjson(events):
+    """Serializa cada evento como una línea NDJSON"""
+    for event in events:
+        yield dumps_line(event)
+
+def _snapshot_events(snapshot: Dict):
+    report = snapshot['report']
+    for order in report.get('orders', []):
+        yield {'type': 'order', 'order': order}
+    yield {
+        'type': 'summary',
+        'month': report.get('month'),
+        'orders_count': report.get('orders_count', 0),
+        'partial': False,
+        'source': 'snapshot',
+        'generated_at': snapshot['generated_at']
+    }
+
+@app.get("/reports/pedidos-con-rutas/stream")
+async def stream_pedidos_con_rutas(
+    month: str = Query(..., description="Mes en formato YYYY-MM"),
+    live: bool = Query(False, description="Ignorar el snapshot precomputado y generar el reporte en vivo")
+):
+    """
+    Variante en streaming (NDJSON) de /reports/pedidos-con-rutas.
+    Emite una línea {"type": "order", ...} por pedido apenas llega su ruta
+    y una línea final {"type": "summary", ...}.
+    """
+    snapshot = None if live else snapshot_store.load(month, 'pedidos-con-rutas')
+    if snapshot:
+        events = _snapshot_events(snapshot)
+    else:
+        events = report_service.stream_orders_with_routes(month, Deadline.from_ms(Config.REPORT_DEADLINE_MS))
+    
+    # El generador es bloqueante; StreamingResponse lo itera en el threadpool
+    return StreamingResponse(_ndjson(events), media_type="application/x-ndjson")
+
+@app.post("/reports/snapshots/{month}")
+async def rebuild_report_snapshots(month: str):
+    """Genera (o regenera) los snapshots de los reportes de un mes"""
+    if not MONTH_PATTERN.match(month):
+        raise HTTPException(status_code=400, detail=f"Mes inválido: {month} (formato YYYY-MM)")
+    built = await asyncio.to_thread(report_scheduler.build_month, month, True)
+    return {
+        "status": "success",
+        "month": month,
+        "reports": {name: snapshot['generated_at'] for name, snapshot in built.items()}
+    }
+
+# ==================== READ MODEL ENDPOINTS ====================
+
+def _require_read_model():
+    if report_service.read_model is None:
+        raise HTTPException(status_code=404, detail="Read model desactivado (READ_MODEL_PATH vacío)")
+    return report_service.read_model
+
+def _ingest_orders(read_model, orders: List[Dict]) -> int:
+    """
+    Guarda los pedidos en el read model e invalida los snapshots de los meses que cubren:
+    un pedido tardío de un mes ya precomputado deja su snapshot desactualizado
+    """
+    stored = read_model.upsert_orders(orders)
+    months = set()
+    for order in orders:
+        try:
+            months.add(report_month_of(normalize_timestamp(order['created_at'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    snapshot_store.invalidate(months)
+    return stored
+
+@app.post("/read-model/orders")
+async def ingest_orders(payload: Dict = Body(...)):
+    """
+    Evento de pedido creado (lo envía el API Gateway): un pedido o {"orders": [...]}.
+    Cada pedido necesita erp_order_id y created_at.
+    """
+    read_model = _require_read_model()
+    orders = payload.get('orders') if 'orders' in payload else [payload]
+    stored = await asyncio.to_thread(_ingest_orders, read_model, orders)
+    return {"status": "success", "stored": stored}
+
+@app.post("/read-model/routes")
+async def ingest_route(payload: Dict = Body(...)):
+    """
+    Evento de ruta calculada (lo envía ruta_optima): {"order_id": ..., "route": {...}}.
+    order_id puede ser el erp_order_id o el id de MongoDB; si el pedido aún no está en el
+    read model, la ruta queda pendiente hasta que llegue.
+    """
+    read_model = _require_read_model()
+    order_id = payload.get('order_id')
+    route = payload.get('route')
+    if not order_id or not isinstance(route, dict):
+        raise HTTPException(status_code=400, detail="Se requieren order_id y route")
+    matched = await asyncio.to_thread(read_model.record_route, str(order_id), route)
+    return {"status": "success", "matched": matched}
+
+@app.get("/read-model/stats")
+async def read_model_stats():
+    """Cantidad de pedidos, pedidos con ruta y rutas pendientes en el read model"""
+    return await asyncio.to_thread(_require_read_model().stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Histogramas de latencia de las sub-llamadas por servicio, endpoint y fase (formato Prometheus)"""
+    return hop_metrics.render_prometheus()
+
 @app.get("/health")
 async def health_check():
     """Health check del orquestador"""
@@ -133,7 +429,9 @@ async def health_check():
         "status": "healthy",
         "service": "orquestador",
         "registered_services": len(services),
-        "services": [s['name'] for s in services]
+        "services": sorted({s['name'] for s in services}),
+        "open_circuits": report_service.client.open_circuits(),
+        "report_flights": report_flights.stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+Métricas de las sub-llamadas del orquestador (por servicio y endpoint) y
+desglose de tiempos por petición para depurar reportes lentos
+"""
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Límites superiores (ms) de los buckets de los histogramas
+HOP_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class Histogram:
+    """Histograma acumulado con buckets fijos (formato Prometheus)"""
+    
+    def __init__(self, buckets=HOP_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+    
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cantidad acumulada) por bucket, terminando en +Inf"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((str(bound), total))
+        result.append(('+Inf', self.count))
+        return result
+
+class HopMetrics:
+    """
+    Histogramas de latencia y conteo de resultados de las llamadas a los microservicios,
+    etiquetados por servicio, endpoint y fase. Se exponen en /metrics.
+    
+    Fases: 'ttfb' hasta leer los headers de la respuesta (incluye DNS y conexión, porque
+    cada llamada abre su propia conexión) y 'total' hasta leer el cuerpo completo.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (servicio, endpoint, fase) -> histograma
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        # (servicio, endpoint, resultado) -> cantidad
+        self._outcomes: Dict[Tuple[str, str, str], int] = {}
+    
+    def record(self, service: str, endpoint: str, outcome: str, phases: Dict[str, Optional[float]]):
+        with self._lock:
+            key = (service, endpoint, outcome)
+            self._outcomes[key] = self._outcomes.get(key, 0) + 1
+            for phase, value in phases.items():
+                if value is None:
+                    continue
+                histogram = self._histograms.setdefault((service, endpoint, phase), Histogram())
+                histogram.observe(value)
+    
+    def render_prometheus(self) -> str:
+        """Métricas en formato de texto de Prometheus"""
+        lines = [
+            '# HELP orquestador_hop_duration_ms Latencia de las llamadas a los microservicios por fase',
+            '# TYPE orquestador_hop_duration_ms histogram',
+        ]
+        with self._lock:
+            for (service, endpoint, phase), histogram in sorted(self._histograms.items()):
+                labels = f'service="{service}",endpoint="{endpoint}",phase="{phase}"'
+                for le, count in histogram.cumulative():
+                    lines.append(f'orquestador_hop_duration_ms_bucket{{{labels},le="{le}"}} {count}')
+                lines.append(f'orquestador_hop_duration_ms_sum{{{labels}}} {round(histogram.sum, 3)}')
+                lines.append(f'orquestador_hop_duration_ms_count{{{labels}}} {histogram.count}')
+            
+            lines.append('# HELP orquestador_hop_requests_total Llamadas a los microservicios por resultado')
+            lines.append('# TYPE orquestador_hop_requests_total counter')
+            for (service, endpoint, outcome), count in sorted(self._outcomes.items()):
+                lines.append(
+                    f'orquestador_hop_requests_total{{service="{service}",endpoint="{endpoint}",outcome="{outcome}"}} {count}'
+                )
+        return '\n'.join(lines) + '\n'
+
+class RequestTrace:
+    """
+    Spans de las sub-llamadas hechas durante una petición (con ?debug=true).
+    Se activa con current_trace y se propaga a los hilos con submit_with_context.
+    """
+    
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict] = []
+    
+    def add(self, service: str, endpoint: str, instance: Optional[str], outcome: str,
+            started: float, ttfb_ms: Optional[float], total_ms: float):
+        with self._lock:
+            self.spans.append({
+                'service': service,
+                'endpoint': endpoint,
+                'instance': instance,
+                'outcome': outcome,
+                'start_ms': round((started - self._started) * 1000, 2),
+                'ttfb_ms': round(ttfb_ms, 2) if ttfb_ms is not None else None,
+                'total_ms': round(total_ms, 2)
+            })
+    
+    def breakdown(self) -> Dict:
+        """
+        Desglose de la petición: spans ordenados, resumen por servicio y el tiempo en que
+        no había ninguna sub-llamada en curso (trabajo propio del orquestador)
+        """
+        wall_ms = (time.perf_counter() - self._started) * 1000
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start_ms'])
+        
+        by_service: Dict[str, Dict] = {}
+        for span in spans:
+            summary = by_service.setdefault(span['service'], {'calls': 0, 'sum_ms': 0.0, 'max_ms': 0.0})
+            summary['calls'] += 1
+            summary['sum_ms'] = round(summary['sum_ms'] + span['total_ms'], 2)
+            summary['max_ms'] = max(summary['max_ms'], span['total_ms'])
+        
+        # Unión de los intervalos de las llamadas (las búsquedas de ruta van en paralelo)
+        covered_ms = 0.0
+        current_start, current_end = None, None
+        for span in spans:
+            start, end = span['start_ms'], span['start_ms'] + span['total_ms']
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    covered_ms += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            covered_ms += current_end - current_start
+        
+        return {
+            'wall_ms': round(wall_ms, 2),
+            'orchestrator_ms': round(max(wall_ms - covered_ms, 0.0), 2),
+            'by_service': by_service,
+            'spans': spans
+        }
+
+# Trace de la petición en curso (None si no se pidió el desglose)
+current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar('current_trace', default=None)
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit que conserva los contextvars (p. ej. el trace) en el hilo del pool"""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+# Instancia global, alimentada por ServiceClient y expuesta en /metrics
+hop_metrics = HopMetrics()
@@ -0,0 +1,236 @@
+"""
+Read model desnormalizado de pedidos con su ruta y sus tiempos reales.
+
+Evita el join distribuido (gestor-pedidos + ruta_optima por HTTP) en cada reporte:
+cada fila guarda el pedido, su última ruta y sus tiempos reales, indexada por created_at,
+y los reportes la leen con una sola consulta por rango del mes.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_routes (
+    erp_order_id TEXT PRIMARY KEY,
+    order_id TEXT,
+    created_at TEXT NOT NULL,
+    order_json TEXT NOT NULL,
+    route_json TEXT,
+    real_times_json TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_order_routes_created_at ON order_routes (created_at);
+CREATE INDEX IF NOT EXISTS idx_order_routes_order_id ON order_routes (order_id);
+
+-- Rutas que llegaron antes que su pedido (se asocian al ingresar el pedido)
+CREATE TABLE IF NOT EXISTS pending_routes (
+    route_key TEXT PRIMARY KEY,
+    route_json TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+-- Meses (del reporte) cuyos pedidos ya se cargaron completos desde el gestor, con la marca
+-- de agua (created_at más nuevo que devolvió el gestor) para revalidarlos
+CREATE TABLE IF NOT EXISTS synced_months (
+    month TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    watermark TEXT
+);
+"""
+
+# created_at se guarda siempre con este formato para que el orden de texto sea cronológico
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+def previous_month_range(month: str) -> Tuple[str, str]:
+    """[inicio, fin) del mes ANTERIOR al mes dado (YYYY-MM), como en el gestor de pedidos"""
+    year, month_num = map(int, month.split('-'))
+    prev_year, prev_month = (year - 1, 12) if month_num == 1 else (year, month_num - 1)
+    start = datetime(prev_year, prev_month, 1)
+    end = datetime(year, month_num, 1)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+def normalize_timestamp(value) -> str:
+    """created_at del gestor (datetime o ISO con o sin 'Z') al formato de la tabla"""
+    parsed = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+def apply_real_times(order: Dict, real_times: Optional[Dict]) -> Dict:
+    """Copia los tiempos reales guardados (payload de PUT /orders/real-times) en los items del pedido"""
+    if not real_times:
+        return order
+    por_sku = {item['sku']: item['tiempo_real_pick'] for item in real_times.get('items', []) if item.get('sku')}
+    for item in order.get('items', []):
+        if item.get('sku') in por_sku:
+            item['tiempo_real_pick'] = por_sku[item['sku']]
+    return order
+
+class OrderRouteReadModel:
+    """
+    Read model en SQLite (un archivo local, con índices por created_at y por id de pedido).
+    
+    Se alimenta de forma incremental:
+    - upsert_orders: pedidos creados (evento del API Gateway) o leídos del gestor
+    - record_route: rutas calculadas (evento de ruta_optima) o leídas en un reporte;
+      la ruta se asocia por erp_order_id o, si no, por el id de MongoDB
+    - record_real_times: tiempos reales guardados por el reporte; last_orders los devuelve
+      y los reportes los reutilizan en lugar de generar otros
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+            # Archivos creados antes de la marca de agua
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(synced_months)")}
+            if 'watermark' not in columns:
+                self._conn.execute("ALTER TABLE synced_months ADD COLUMN watermark TEXT")
+    
+    @staticmethod
+    def _order_id(order: Dict) -> Optional[str]:
+        order_id = order.get('id') or order.get('_id')
+        return str(order_id) if order_id else None
+    
+    def upsert_orders(self, orders: Iterable[Dict]) -> int:
+        """Inserta o actualiza pedidos (conserva la ruta y los tiempos reales ya guardados)"""
+        now = time.time()
+        count = 0
+        with self._lock, self._conn:
+            for order in orders:
+                erp_order_id = order.get('erp_order_id')
+                if not erp_order_id or not order.get('created_at'):
+                    continue
+                order_id = self._order_id(order)
+                self._conn.execute(
+                    """
+                    INSERT INTO order_routes (erp_order_id, order_id, created_at, order_json, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (erp_order_id) DO UPDATE SET
+                        order_id = excluded.order_id,
+                        created_at = excluded.created_at,
+                        order_json = excluded.order_json,
+                        updated_at = excluded.updated_at
+                    """,
+                    (erp_order_id, order_id, normalize_timestamp(order['created_at']),
+                     json.dumps(order, default=str), now)
+                )
+                
+                # Ruta que llegó antes que el pedido
+                keys = [key for key in (erp_order_id, order_id) if key]
+                pending = self._conn.execute(
+                    f"SELECT route_key, route_json FROM pending_routes WHERE route_key IN ({','.join('?' * len(keys))})"
+                    " ORDER BY updated_at DESC LIMIT 1",
+                    keys
+                ).fetchone()
+                if pending:
+                    self._conn.execute(
+                        "UPDATE order_routes SET route_json = ? WHERE erp_order_id = ?",
+                        (pending['route_json'], erp_order_id)
+                    )
+                    self._conn.execute(
+                        f"DELETE FROM pending_routes WHERE route_key IN ({','.join('?' * len(keys))})", keys
+                    )
+                count += 1
+        return count
+    
+    def record_route(self, route_key: str, route: Dict) -> bool:
+        """
+        Guarda la última ruta de un pedido (route_key es el erp_order_id o el id de MongoDB).
+        Devuelve False si el pedido aún no está en el read model (queda pendiente).
+        """
+        route_json = json.dumps(route, default=str)
+        now = time.time()
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE order_routes SET route_json = ?, updated_at = ? WHERE erp_order_id = ? OR order_id = ?",
+                (route_json, now, route_key, route_key)
+            ).rowcount
+            if updated:
+                return True
+            self._conn.execute(
+                """
+                INSERT INTO pending_routes (route_key, route_json, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (route_key) DO UPDATE SET route_json = excluded.route_json, updated_at = excluded.updated_at
+                """,
+                (route_key, route_json, now)
+            )
+            return False
+    
+    def record_real_times(self, real_times: Iterable[Dict]):
+        """Guarda los tiempos reales (payload de PUT /orders/real-times) por erp_order_id"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE order_routes SET real_times_json = ?, updated_at = ? WHERE erp_order_id = ?",
+                [(json.dumps(entry, default=str), now, entry['erp_order_id'])
+                 for entry in real_times if entry.get('erp_order_id')]
+            )
+    
+    def mark_synced(self, month: str, watermark=None):
+        """
+        Marca que los pedidos del mes anterior a `month` ya se cargaron desde el gestor.
+        `watermark` es el created_at más nuevo que devolvió el gestor para ese mes.
+        """
+        watermark = normalize_timestamp(watermark) if watermark else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO synced_months (month, synced_at, watermark) VALUES (?, ?, ?)",
+                (month, time.time(), watermark)
+            )
+    
+    def sync_state(self, month: str) -> Optional[Tuple[float, Optional[str]]]:
+        """(synced_at, marca de agua) del mes, o None si nunca se cargó desde el gestor"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at, watermark FROM synced_months WHERE month = ?", (month,)
+            ).fetchone()
+        return (row['synced_at'], row['watermark']) if row else None
+    
+    def is_synced(self, month: str) -> bool:
+        return self.sync_state(month) is not None
+    
+    def last_orders(self, month: str, limit: int = 10) -> List[Dict]:
+        """
+        Últimos `limit` pedidos del mes anterior a `month` (created_at descendente),
+        con su ruta y tiempos reales: una consulta por rango sobre el índice de created_at
+        """
+        start, end = previous_month_range(month)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT order_json, route_json, real_times_json FROM order_routes
+                WHERE created_at >= ? AND created_at < ?
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (start, end, limit)
+            ).fetchall()
+        return [
+            {
+                'order': json.loads(row['order_json']),
+                'route': json.loads(row['route_json']) if row['route_json'] else None,
+                'real_times': json.loads(row['real_times_json']) if row['real_times_json'] else None
+            }
+            for row in rows
+        ]
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            orders, with_route = self._conn.execute(
+                "SELECT COUNT(*), COUNT(route_json) FROM order_routes"
+            ).fetchone()
+            pending = self._conn.execute("SELECT COUNT(*) FROM pending_routes").fetchone()[0]
+        return {'orders': orders, 'orders_with_route': with_route, 'pending_routes': pending}
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -7,15 +7,18 @@ import time
 import sys
 from typing import Optional
 
-def register_service(service_name: str, host: str, port: int, orchestrator_url: str = "http://localhost:8080"):
+def register_service(service_name: str, host: str, port: int, orchestrator_url: str = "http://localhost:8080",
+                     instance_id: Optional[str] = None, weight: int = 1):
     """
-    Registra un servicio en el orquestador
+    Registra una instancia de un servicio en el orquestador
     
     Args:
         service_name: Nombre del servicio (ej: 'gestor-pedidos', 'ruta-optima')
         host: IP o hostname del servicio
         port: Puerto del servicio
         orchestrator_url: URL del orquestador
+        instance_id: Identificador de la instancia (por defecto host:port)
+        weight: Peso relativo de la instancia para el balanceo
     """
     try:
         response = requests.post(
@@ -23,7 +26,9 @@ def register_service(service_name: str, host: str, port: int, orchestrator_url:
             params={
                 "service_name": service_name,
                 "host": host,
-                "port": port
+                "port": port,
+                "instance_id": instance_id or f"{host}:{port}",
+                "weight": weight
             },
             timeout=5
         )
@@ -38,18 +43,20 @@ def register_service(service_name: str, host: str, port: int, orchestrator_url:
         print(f"❌ Error conectando al orquestador: {e}")
         return False
 
-def send_heartbeat(service_name: str, orchestrator_url: str = "http://localhost:8080"):
-    """Envía heartbeat al orquestador"""
+def send_heartbeat(service_name: str, orchestrator_url: str = "http://localhost:8080", instance_id: Optional[str] = None):
+    """Envía heartbeat al orquestador (solo de esta instancia si se indica instance_id)"""
     try:
         response = requests.post(
             f"{orchestrator_url}/registry/heartbeat/{service_name}",
+            params={"instance_id": instance_id} if instance_id else None,
             timeout=2
         )
         return response.status_code == 200
     except:
         return False
 
-def start_heartbeat_loop(service_name: str, interval: int = 10, orchestrator_url: str = "http://localhost:8080"):
+def start_heartbeat_loop(service_name: str, interval: int = 10, orchestrator_url: str = "http://localhost:8080",
+                         instance_id: Optional[str] = None):
     """
     Inicia un loop para enviar heartbeat periódicamente
     
@@ -57,12 +64,13 @@ def start_heartbeat_loop(service_name: str, interval: int = 10, orchestrator_url
         service_name: Nombre del servicio
         interval: Intervalo en segundos entre heartbeats
         orchestrator_url: URL del orquestador
+        instance_id: Identificador de la instancia
     """
     print(f"🔄 Iniciando heartbeat loop para {service_name} (cada {interval}s)")
     
     while True:
         try:
-            if send_heartbeat(service_name, orchestrator_url):
+            if send_heartbeat(service_name, orchestrator_url, instance_id):
                 print(f"💓 Heartbeat enviado: {service_name}")
             else:
                 print(f"⚠️ Error enviando heartbeat: {service_name}")
@@ -76,7 +84,7 @@ def start_heartbeat_loop(service_name: str, interval: int = 10, orchestrator_url
 
 if __name__ == "__main__":
     if len(sys.argv) < 4:
-        print("Uso: python register_service.py <service_name> <host> <port> [orchestrator_url]")
+        print("Uso: python register_service.py <service_name> <host> <port> [orchestrator_url] [instance_id] [weight]")
         print("Ejemplo: python register_service.py gestor-pedidos 172.31.15.10 5000")
         sys.exit(1)
     
@@ -84,11 +92,13 @@ if __name__ == "__main__":
     host = sys.argv[2]
     port = int(sys.argv[3])
     orchestrator_url = sys.argv[4] if len(sys.argv) > 4 else "http://localhost:8080"
+    instance_id = sys.argv[5] if len(sys.argv) > 5 else f"{host}:{port}"
+    weight = int(sys.argv[6]) if len(sys.argv) > 6 else 1
     
     # Registrar servicio
-    if register_service(service_name, host, port, orchestrator_url):
+    if register_service(service_name, host, port, orchestrator_url, instance_id=instance_id, weight=weight):
         # Iniciar heartbeat loop
-        start_heartbeat_loop(service_name, interval=10, orchestrator_url=orchestrator_url)
+        start_heartbeat_loop(service_name, interval=10, orchestrator_url=orchestrator_url, instance_id=instance_id)
     else:
         sys.exit(1)
 
@@ -0,0 +1,102 @@
+"""
+Checkpoint en disco del service registry para arrancar en caliente:
+el estado se guarda periódicamente y al apagar, y se restaura al iniciar
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Optional
+from .service_registry import ServiceRegistry
+
+class RegistryCheckpointer:
+    """
+    Guarda las instancias vivas del registry en un archivo JSON cada `interval` segundos
+    (escritura atómica: archivo temporal + fsync + rename) y al apagar el orquestador.
+    
+    Al iniciar, restore() carga el checkpoint si tiene menos de `max_age` segundos:
+    las instancias quedan vivas durante `restore_grace` segundos mientras vuelven a
+    mandar heartbeat, así el descubrimiento no depende de las URLs de Config tras un reinicio.
+    """
+    
+    def __init__(self, registry: ServiceRegistry, path: str, interval: float = 10.0,
+                 restore_grace: float = 15.0, max_age: float = 300.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.restore_grace = restore_grace
+        self.max_age = max_age
+        self._task: Optional[asyncio.Task] = None
+    
+    def save(self) -> int:
+        """Escribe el checkpoint y devuelve la cantidad de instancias guardadas"""
+        instances = self.registry.export_state()
+        checkpoint = {
+            'saved_at': time.time(),
+            'saved_at_iso': datetime.utcnow().isoformat() + 'Z',
+            'instances': instances
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(instances)
+    
+    def restore(self) -> int:
+        """Restaura el registry desde el checkpoint; devuelve la cantidad de instancias restauradas"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print(f"⚠️ Checkpoint del registry ilegible ({self.path}): {e}")
+            return 0
+        
+        age = time.time() - checkpoint.get('saved_at', 0)
+        if age > self.max_age:
+            print(f"⚠️ Checkpoint del registry descartado: tiene {age:.0f}s (máximo {self.max_age:.0f}s)")
+            return 0
+        
+        try:
+            restored = self.registry.restore_state(checkpoint.get('instances', []), grace=self.restore_grace)
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"⚠️ Checkpoint del registry inválido: {e}")
+            return 0
+        print(f"♻️ Registry restaurado desde checkpoint: {restored} instancias (gracia de {self.restore_grace}s)")
+        return restored
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                print(f"❌ Error guardando el checkpoint del registry: {e}")
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print(f"💾 Checkpoint del registry cada {self.interval}s en {self.path}")
+    
+    async def stop(self):
+        """Detiene el guardado periódico y escribe un último checkpoint"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            saved = self.save()
+            print(f"💾 Checkpoint final del registry: {saved} instancias")
+        except Exception as e:
+            print(f"❌ Error guardando el checkpoint del registry: {e}")
@@ -0,0 +1,86 @@
+"""
+Barrido en segundo plano del service registry: expira y elimina instancias
+sin heartbeat y, opcionalmente, sondea activamente el /health de cada instancia
+"""
+import asyncio
+import time
+from typing import Optional, Tuple
+import httpx
+from .service_registry import ServiceRegistry
+
+class RegistrySweeper:
+    """
+    Cada `interval` segundos:
+    - republica el snapshot si alguna instancia superó el TTL (queda 'unhealthy')
+    - elimina las instancias que llevan más de TTL + eviction_grace sin heartbeat
+    - si el sondeo está activo y pasó `probe_interval`, sondea /health de todas las
+      instancias con concurrencia acotada y guarda la latencia en el registry
+    """
+    
+    def __init__(self, registry: ServiceRegistry, interval: float = 1.0, eviction_grace: float = 60.0,
+                 probe_enabled: bool = False, probe_interval: float = 5.0,
+                 probe_timeout: float = 0.5, probe_concurrency: int = 10):
+        self.registry = registry
+        self.interval = interval
+        self.eviction_grace = eviction_grace
+        self.probe_enabled = probe_enabled
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.probe_concurrency = probe_concurrency
+        self._last_probe = 0.0
+        self._task: Optional[asyncio.Task] = None
+    
+    async def sweep_once(self):
+        self.registry.expire()
+        self.registry.cleanup_expired(grace=self.eviction_grace)
+        
+        if self.probe_enabled and time.monotonic() - self._last_probe >= self.probe_interval:
+            self._last_probe = time.monotonic()
+            await self.probe_all()
+    
+    async def probe_all(self):
+        """Sondea /health de todas las instancias vivas (como máximo probe_concurrency a la vez)"""
+        targets = self.registry.probe_targets()
+        if not targets:
+            return
+        
+        semaphore = asyncio.Semaphore(self.probe_concurrency)
+        
+        async def probe(client: httpx.AsyncClient, target: Tuple[str, str, str]):
+            service_name, instance_id, health_url = target
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    resp = await client.get(health_url)
+                    ok = resp.status_code == 200
+                except Exception:
+                    ok = False
+                return service_name, instance_id, ok, (time.perf_counter() - start) * 1000
+        
+        async with httpx.AsyncClient(timeout=self.probe_timeout) as client:
+            results = await asyncio.gather(*(probe(client, target) for target in targets))
+        
+        self.registry.record_probes(list(results))
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                print(f"❌ Error en el barrido del registry: {e}")
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            probe = f", sondeo cada {self.probe_interval}s" if self.probe_enabled else ""
+            print(f"🧹 Barrido del registry iniciado (cada {self.interval}s{probe})")
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,61 @@
+"""
+Watch del service registry por long-poll: los consumidores (p. ej. el API Gateway)
+mantienen una copia local y solo se enteran de los cambios, sin consultar por petición
+"""
+import asyncio
+from typing import Dict, List, Optional
+from .service_registry import RegistrySnapshot, ServiceRegistry, thaw
+
+class RegistryWatchHub:
+    """
+    Despierta a las peticiones de /registry/watch cuando el registry publica un snapshot.
+    
+    Cada consumidor manda el índice (versión del snapshot) que ya conoce; si el registry
+    está en otra versión responde de inmediato, si no espera a que cambie o a que se acabe
+    el tiempo de espera. Se compara con != para detectar también un reinicio del orquestador
+    (las versiones vuelven a empezar).
+    """
+    
+    def __init__(self, registry: ServiceRegistry):
+        self.registry = registry
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed = asyncio.Event()
+    
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Conecta el hub al event loop del orquestador (al iniciar la app)"""
+        if self._loop is None:
+            self.registry.add_listener(self._on_publish)
+        self._loop = loop
+    
+    def _on_publish(self, snapshot: RegistrySnapshot):
+        # El registry publica desde cualquier hilo y con su lock tomado: solo se agenda el aviso
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._notify)
+    
+    def _notify(self):
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+    
+    async def wait(self, index: int, timeout: float) -> RegistrySnapshot:
+        """Devuelve el snapshot apenas su versión sea distinta de `index`, o el actual al vencer el timeout"""
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + timeout
+        while True:
+            # Se toma el evento antes de revisar la versión para no perder un aviso entre ambos
+            event = self._changed
+            snapshot = self.registry.snapshot()
+            remaining = expires_at - loop.time()
+            if snapshot.version != index or remaining <= 0:
+                return snapshot
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return self.registry.snapshot()
+    
+    @staticmethod
+    def to_response(snapshot: RegistrySnapshot) -> Dict[str, object]:
+        services: Dict[str, List[Dict]] = {
+            name: [thaw(instance) for instance in instances]
+            for name, instances in snapshot.services.items()
+        }
+        return {'index': snapshot.version, 'services': services}
@@ -0,0 +1,297 @@
+"""
+Etapas de cómputo de los reportes (tiempos reales, agrupamiento por stand y estadísticas)
+y el pool de procesos donde se ejecutan.
+
+Las funciones de este módulo son puras: reciben y devuelven solo dicts, listas y arreglos
+de NumPy (serializables con pickle), sin tocar ServiceClient ni el read model, para que
+se puedan mandar a otro proceso sin bloquear al orquestador.
+"""
+import multiprocessing
+import random
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from .stand_analytics import analyze_stand_columns
+
+def count_items(orders: List[Dict]) -> int:
+    """Cantidad de items de los pedidos (decide si vale la pena usar el pool)"""
+    return sum(len(order.get('items', [])) for order in orders)
+
+def compute_real_times(orders_with_routes: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Calcula tiempos reales aleatorios (80% a 150% del estimado) para cada item.
+    Los items que ya traen tiempo_real_pick (guardado en el gestor o en el read model)
+    lo conservan; solo los pedidos con algún tiempo nuevo van al payload.
+    
+    Returns:
+        (pedidos con tiempos reales, payload de PUT /orders/real-times del gestor)
+    """
+    result = []
+    real_times_payload = []
+    
+    for item in orders_with_routes:
+        order = item['order']
+        route = item['route']
+        
+        # Generar tiempos reales para cada item del pedido
+        items_with_real_times = []
+        total_real_time = 0
+        generated = False
+        
+        for order_item in order.get('items', []):
+            tiempo_real = order_item.get('tiempo_real_pick')
+            if tiempo_real is None:
+                tiempo_estimado = order_item.get('tiempo_estimado_pick', 5.0)
+                # Generar tiempo real aleatorio (80% a 150% del estimado)
+                variacion = random.uniform(0.8, 1.5)
+                tiempo_real = round(tiempo_estimado * variacion, 2)
+                generated = True
+            
+            items_with_real_times.append({
+                **order_item,
+                'tiempo_real_pick': tiempo_real
+            })
+            
+            total_real_time += tiempo_real
+        
+        # Actualizar el pedido con tiempos reales
+        order['items'] = items_with_real_times
+        order['tiempo_total_real'] = round(total_real_time, 2)
+        order['tiempo_total_estimado'] = route.get('tiempo_picking_seg', 0)
+        
+        if generated and order.get('erp_order_id'):
+            real_times_payload.append({
+                'erp_order_id': order.get('erp_order_id'),
+                'items': [
+                    {'sku': i.get('sku'), 'tiempo_real_pick': i['tiempo_real_pick']}
+                    for i in items_with_real_times if i.get('sku')
+                ],
+                'tiempo_total_real': order['tiempo_total_real']
+            })
+        
+        result.append({
+            'order': order,
+            'route': route
+        })
+    
+    return result, real_times_payload
+
+def analyze_stand_deviations(orders_with_real_times: List[Dict]) -> Dict[str, Dict]:
+    """
+    Analiza las desviaciones de tiempo por stand
+    
+    Returns:
+        Dict con análisis por stand_id
+    """
+    stand_stats = {}
+    
+    for item in orders_with_real_times:
+        order = item['order']
+        
+        for order_item in order.get('items', []):
+            stand_id = order_item.get('stand_id_estimada', 'UNKNOWN')
+            tiempo_estimado = order_item.get('tiempo_estimado_pick', 0)
+            tiempo_real = order_item.get('tiempo_real_pick', tiempo_estimado)
+            
+            if stand_id not in stand_stats:
+                stand_stats[stand_id] = {
+                    'tiempos_estimados': [],
+                    'tiempos_reales': [],
+                    'count': 0
+                }
+            
+            stand_stats[stand_id]['tiempos_estimados'].append(tiempo_estimado)
+            stand_stats[stand_id]['tiempos_reales'].append(tiempo_real)
+            stand_stats[stand_id]['count'] += 1
+    
+    # Calcular promedios y desviaciones
+    analysis = {}
+    for stand_id, stats in stand_stats.items():
+        if len(stats['tiempos_estimados']) > 0:
+            tiempo_estimado_promedio = sum(stats['tiempos_estimados']) / len(stats['tiempos_estimados'])
+            tiempo_real_promedio = sum(stats['tiempos_reales']) / len(stats['tiempos_reales'])
+            desviacion_promedio = tiempo_real_promedio - tiempo_estimado_promedio
+            desviacion_porcentual = (desviacion_promedio / tiempo_estimado_promedio * 100) if tiempo_estimado_promedio > 0 else 0
+            
+            analysis[stand_id] = {
+                'tiempo_estimado_promedio': round(tiempo_estimado_promedio, 2),
+                'tiempo_real_promedio': round(tiempo_real_promedio, 2),
+                'desviacion_promedio': round(desviacion_promedio, 2),
+                'desviacion_porcentual': round(desviacion_porcentual, 2),
+                'count': stats['count']
+            }
+    
+    return analysis
+
+def identify_problematic_stands(stands_analysis: Dict[str, Dict], threshold_pct: float = 15.0) -> List[Dict]:
+    """
+    Identifica stands con problemas significativos.
+    Un stand tiene problemas si la desviación porcentual es > 15%
+    """
+    problematic = []
+    
+    for stand_id, analysis in stands_analysis.items():
+        desviacion_porcentual = abs(analysis['desviacion_porcentual'])
+        
+        # Stand problemático si desviación > 15%
+        if desviacion_porcentual > threshold_pct:
+            problematic.append({
+                'stand_id': stand_id,
+                'tiempo_estimado_promedio': analysis['tiempo_estimado_promedio'],
+                'tiempo_real_promedio': analysis['tiempo_real_promedio'],
+                'desviacion_promedio': analysis['desviacion_promedio'],
+                'desviacion_porcentual': analysis['desviacion_porcentual'],
+                'pedidos_analizados': analysis['count']
+            })
+    
+    # Ordenar por desviación descendente
+    problematic.sort(key=lambda x: abs(x['desviacion_porcentual']), reverse=True)
+    
+    return problematic
+
+def compute_route_report(orders_with_routes: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Etapa de cómputo del reporte de rutas: tiempos reales, desviaciones por stand y stands
+    con problema en una sola llamada (un solo viaje de ida y vuelta al pool).
+    
+    Returns:
+        (stands con problema, payload de tiempos reales para el gestor)
+    """
+    orders_with_real_times, real_times_payload = compute_real_times(orders_with_routes)
+    problematic = identify_problematic_stands(analyze_stand_deviations(orders_with_real_times))
+    return problematic, real_times_payload
+
+def build_order_detail(order: Dict, route_data: Optional[Dict], is_complete: bool) -> Dict:
+    """
+    Arma el detalle de un pedido con tiempos reales aleatorios y su ruta optimizada
+    (los items que ya traen tiempo_real_pick lo conservan).
+    Los items se completan en su lugar (el pedido viene recién parseado del gestor),
+    sin copiar cada dict.
+    """
+    items = order.get('items', [])
+    tiempo_total_estimado = 0
+    tiempo_total_real = 0
+    
+    for item in items:
+        if item.get('tiempo_real_pick') is None:
+            tiempo_estimado = item.get('tiempo_estimado_pick', 5.0)
+            # Generar tiempo real aleatorio (80% a 150% del estimado)
+            variacion = random.uniform(0.8, 1.5)
+            item['tiempo_real_pick'] = round(tiempo_estimado * variacion, 2)
+        
+        tiempo_total_estimado += item.get('tiempo_estimado_pick', 0)
+        tiempo_total_real += item['tiempo_real_pick']
+    
+    order_detail = {
+        'order_id': order.get('id'),
+        'erp_order_id': order.get('erp_order_id'),
+        'status': order.get('status'),
+        'created_at': order.get('created_at'),
+        'items': items,
+        'tiempo_total_estimado': tiempo_total_estimado,
+        'tiempo_total_real': round(tiempo_total_real, 2),
+        'ruta_completa': is_complete
+    }
+    
+    if route_data:
+        order_detail['ruta_optimizada'] = {
+            'ruta': route_data.get('ruta', []),
+            'distancia_m': route_data.get('distancia_m', 0),
+            'tiempo_caminar_seg': route_data.get('tiempo_caminar_seg', 0),
+            'tiempo_picking_seg': route_data.get('tiempo_picking_seg', 0),
+            'tiempo_total_seg': route_data.get('tiempo_total_seg', 0),
+            'tiempo_total_min': route_data.get('tiempo_total_min', 0),
+            'items_recogidos': route_data.get('items_recogidos', 0),
+            'velocidad_usada_m_s': route_data.get('velocidad_usada_m_s', 2.5)
+        }
+    else:
+        order_detail['ruta_optimizada'] = None
+    
+    return order_detail
+
+def build_order_details(orders: List[Dict], routes: List[Optional[Dict]], complete: List[bool]) -> List[Dict]:
+    """build_order_detail para todos los pedidos del reporte"""
+    return [
+        build_order_detail(order, route_data, is_complete)
+        for order, route_data, is_complete in zip(orders, routes, complete)
+    ]
+
+def _warm_up() -> bool:
+    return True
+
+def _ignore_sigint():
+    """
+    Initializer de los procesos del pool: Ctrl+C llega a todo el grupo de procesos, pero
+    quien apaga el pool es el orquestador (hook de shutdown), no cada proceso por su cuenta
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+class ReportComputePool:
+    """
+    Pool acotado de procesos para las etapas de cómputo de los reportes.
+    
+    El orquestador atiende registry, heartbeats y health checks en el mismo proceso: las
+    etapas pesadas se mandan a `workers` procesos para no competir por el GIL. Los
+    cálculos con menos de `min_items` items se hacen en línea (serializar la entrada
+    cuesta más que calcular) y con workers=0 el pool queda desactivado.
+    
+    Se usa el contexto 'spawn': el orquestador tiene hilos vivos (sweeper, pools de
+    búsqueda de rutas) y hacer fork de un proceso con hilos puede dejar locks tomados.
+    """
+    
+    def __init__(self, workers: int, min_items: int):
+        self.workers = workers
+        self.min_items = min_items
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._executor is None and self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_ignore_sigint
+                )
+            return self._executor
+    
+    def start(self):
+        """Levanta los procesos por adelantado para que el primer reporte no pague el arranque"""
+        executor = self._get_executor()
+        if executor is None:
+            return
+        for _ in range(self.workers):
+            executor.submit(_warm_up)
+        print(f"⚙️ Pool de cómputo de reportes: {self.workers} procesos (en línea con menos de {self.min_items} items)")
+    
+    def run(self, fn, *args, items: int):
+        """
+        Ejecuta fn(*args) en el pool si hay al menos min_items items; si no, en línea.
+        fn debe ser una función de nivel de módulo y sus argumentos serializables.
+        """
+        if self.workers <= 0 or items < self.min_items:
+            return fn(*args)
+        
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool as e:
+            # Un proceso murió (p. ej. OOM): se descarta el pool, el próximo reporte crea otro
+            print(f"⚠️ Pool de cómputo caído, se calcula en línea: {e}")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            return fn(*args)
+    
+    def shutdown(self):
+        """
+        Cancela lo pendiente y espera a que terminen los procesos: si no, quedan a cargo del
+        resource tracker de multiprocessing y avisa de semáforos sin liberar
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -2,25 +2,41 @@
 Servicio para generar reportes combinando datos de GestorPedidos y ruta_optima
 """
 import time
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 from calendar import monthrange
 from .service_client import ServiceClient
-import random
+from .deadline import Deadline
+from .metrics import submit_with_context
+from .read_model import OrderRouteReadModel, apply_real_times, normalize_timestamp
+from .stand_analytics import StandTimesAccumulator, analyze_stand_columns
+from .report_compute import (
+    ReportComputePool, build_order_detail, build_order_details, compute_route_report, count_items
+)
+from .config import Config
 
 class ReportService:
     """Servicio para generar reportes de rutas optimizadas"""
     
     def __init__(self):
         self.client = ServiceClient()
+        # Pool para buscar las rutas de los pedidos en paralelo
+        self._executor = ThreadPoolExecutor(max_workers=Config.ROUTE_LOOKUP_WORKERS)
+        # Read model local de pedidos con rutas (None si READ_MODEL_PATH está vacío)
+        self.read_model = OrderRouteReadModel(Config.READ_MODEL_PATH) if Config.READ_MODEL_PATH else None
+        # Procesos para las etapas de cómputo (tiempos reales y estadísticas por stand)
+        self.compute = ReportComputePool(Config.REPORT_PROCESS_WORKERS, Config.REPORT_PROCESS_MIN_ITEMS)
     
-    def generate_route_report(self, month: str) -> Dict:
+    def generate_route_report(self, month: str, deadline: Optional[Deadline] = None) -> Dict:
         """
         Genera reporte de rutas optimizadas para los últimos 10 pedidos del mes anterior.
         Identifica stands donde no se estima correctamente el tiempo de preparación.
         
         Args:
             month: Mes en formato YYYY-MM (ej: "2025-11")
+            deadline: Deadline de la petición. Si se agota, el reporte se arma con
+                las rutas que alcanzaron a llegar y se marca como parcial.
         
         Returns:
             Dict con el reporte completo
@@ -28,35 +44,34 @@ class ReportService:
         start_time = time.time()
         
         try:
-            # 1. Obtener últimos 10 pedidos del mes anterior desde GestorPedidos
-            orders = self._get_last_10_orders_from_previous_month(month)
+            # 1-2. Últimos 10 pedidos del mes anterior con su ruta (read model o join en vivo)
+            orders, routes, complete, source = self._load_orders_and_routes(month, deadline)
             
             if not orders or len(orders) == 0:
                 return {
                     'month': month,
                     'orders_count': 0,
                     'stands_con_problema': [],
+                    'partial': bool(deadline and deadline.expired()),
                     'processing_time_ms': round((time.time() - start_time) * 1000, 2)
                 }
             
-            # 2. Para cada pedido, obtener su ruta calculada desde ruta_optima
             orders_with_routes = []
-            for order in orders:
-                route_data = self._get_route_for_order(order.get('erp_order_id'))
+            for order, route_data in zip(orders, routes):
                 if route_data:
                     orders_with_routes.append({
                         'order': order,
                         'route': route_data
                     })
             
-            # 3. Calcular tiempos reales (aleatorios) y guardarlos en el pedido
-            orders_with_real_times = self._calculate_and_save_real_times(orders_with_routes)
-            
-            # 4. Comparar tiempos estimados vs reales por stand
-            stands_analysis = self._analyze_stand_deviations(orders_with_real_times)
+            # 3-5. Calcular tiempos reales (aleatorios), comparar estimados vs reales por stand
+            # e identificar stands con problemas (en el pool de procesos si el reporte es grande)
+            problematic_stands, real_times_payload = self.compute.run(
+                compute_route_report, orders_with_routes, items=count_items(orders)
+            )
             
-            # 5. Identificar stands con problemas
-            problematic_stands = self._identify_problematic_stands(stands_analysis)
+            # Guardar tiempos reales en el gestor (una sola petición)
+            self._save_real_times(real_times_payload, deadline)
             
             processing_time = (time.time() - start_time) * 1000
             
@@ -65,7 +80,13 @@ class ReportService:
                 'orders_count': len(orders_with_routes),
                 'stands_con_problema': problematic_stands,
                 'processing_time_ms': round(processing_time, 2),
-                'orders_analyzed': len(orders_with_routes)
+                'orders_analyzed': len(orders_with_routes),
+                'partial': not all(complete),
+                'data_source': source,
+                'orders_completeness': [
+                    {'erp_order_id': order.get('erp_order_id'), 'ruta_completa': is_complete}
+                    for order, is_complete in zip(orders, complete)
+                ]
             }
             
         except Exception as e:
@@ -78,13 +99,83 @@ class ReportService:
                 'processing_time_ms': round((time.time() - start_time) * 1000, 2)
             }
     
-    def get_orders_with_routes_detailed(self, month: str) -> Dict:
+    def generate_full_month_report(self, month: str) -> Dict:
+        """
+        Genera el reporte de stands usando TODOS los pedidos del mes anterior.
+        Los tiempos se leen del gestor por lotes en formato columnar y las estadísticas
+        (media, mediana, p90, desviación estándar e IC 95%) se calculan con NumPy.
+        Solo se usan los tiempos reales ya guardados; no se generan ni se reescriben tiempos.
+        
+        Args:
+            month: Mes en formato YYYY-MM (ej: "2025-11")
+        
+        Returns:
+            Dict con el reporte (misma forma que generate_route_report más estadísticas extra)
+        """
+        start_time = time.time()
+        
+        try:
+            accumulator = StandTimesAccumulator()
+            orders_count = 0
+            after_id = None
+            
+            while True:
+                endpoint = f'/orders/previous-month/item-times?month={month}&limit={Config.FULL_MONTH_BATCH_SIZE}'
+                if after_id:
+                    endpoint += f'&after_id={after_id}'
+                
+                batch = self.client.call_gestor_pedidos(
+                    endpoint,
+                    method='GET',
+                    timeout=Config.FULL_MONTH_REQUEST_TIMEOUT
+                )
+                if not batch or batch.get('status') != 'success':
+                    raise Exception("No se pudo obtener un lote de tiempos del gestor")
+                
+                orders_count += batch.get('orders_count', 0)
+                accumulator.add_batch(
+                    batch.get('stand_ids', []),
+                    batch.get('tiempos_estimados', []),
+                    batch.get('tiempos_reales', [])
+                )
+                
+                after_id = batch.get('next_after_id')
+                if not after_id:
+                    break
+            
+            codes, estimados, reales = accumulator.columns()
+            analysis = self.compute.run(
+                analyze_stand_columns, codes, estimados, reales, accumulator.stand_names(), items=codes.size
+            )
+            
+            return {
+                'month': month,
+                'mode': 'full-month',
+                'orders_count': orders_count,
+                **analysis,
+                'processing_time_ms': round((time.time() - start_time) * 1000, 2)
+            }
+            
+        except Exception as e:
+            print(f"Error generando reporte de mes completo: {e}")
+            return {
+                'month': month,
+                'mode': 'full-month',
+                'orders_count': 0,
+                'stands_con_problema': [],
+                'error': str(e),
+                'processing_time_ms': round((time.time() - start_time) * 1000, 2)
+            }
+    
+    def get_orders_with_routes_detailed(self, month: str, deadline: Optional[Deadline] = None) -> Dict:
         """
         Obtiene los últimos 10 pedidos del mes anterior con toda su información
         y las rutas optimizadas calculadas para cada uno.
         
         Args:
             month: Mes en formato YYYY-MM (ej: "2025-11")
+            deadline: Deadline de la petición. Los pedidos cuya ruta no alcanzó a
+                llegar se devuelven con ruta_completa=False.
         
         Returns:
             Dict con la información completa de pedidos y rutas
@@ -92,73 +183,21 @@ class ReportService:
         start_time = time.time()
         
         try:
-            # 1. Obtener últimos 10 pedidos del mes anterior
-            orders = self._get_last_10_orders_from_previous_month(month)
+            # 1-2. Últimos 10 pedidos del mes anterior con su ruta (read model o join en vivo)
+            orders, routes, complete, source = self._load_orders_and_routes(month, deadline)
             
             if not orders or len(orders) == 0:
                 return {
                     'month': month,
                     'orders_count': 0,
                     'orders': [],
+                    'partial': bool(deadline and deadline.expired()),
                     'processing_time_ms': round((time.time() - start_time) * 1000, 2)
                 }
             
-            # 2. Para cada pedido, obtener su ruta calculada
-            orders_with_routes = []
-            for order in orders:
-                erp_order_id = order.get('erp_order_id')
-                order_id = order.get('id')
-                print(f"🔍 Buscando ruta para pedido - erp_order_id: {erp_order_id}, id: {order_id}")
-                
-                # Intentar primero con erp_order_id
-                route_data = self._get_route_for_order(erp_order_id)
-                
-                # Si no se encuentra, intentar con el id de MongoDB
-                if not route_data and order_id:
-                    print(f"⚠️ No se encontró ruta con erp_order_id, intentando con id: {order_id}")
-                    route_data = self._get_route_for_order(order_id)
-                
-                # Calcular tiempos reales para este pedido
-                items_with_real_times = []
-                for item in order.get('items', []):
-                    tiempo_estimado = item.get('tiempo_estimado_pick', 5.0)
-                    # Generar tiempo real aleatorio (80% a 150% del estimado)
-                    variacion = random.uniform(0.8, 1.5)
-                    tiempo_real = round(tiempo_estimado * variacion, 2)
-                    
-                    items_with_real_times.append({
-                        **item,
-                        'tiempo_real_pick': tiempo_real
-                    })
-                
-                # Calcular tiempo total real
-                tiempo_total_real = round(sum(item.get('tiempo_real_pick', 0) for item in items_with_real_times), 2)
-                
-                order_detail = {
-                    'order_id': order.get('id'),
-                    'erp_order_id': order.get('erp_order_id'),
-                    'status': order.get('status'),
-                    'created_at': order.get('created_at'),
-                    'items': items_with_real_times,
-                    'tiempo_total_estimado': sum(item.get('tiempo_estimado_pick', 0) for item in items_with_real_times),
-                    'tiempo_total_real': tiempo_total_real
-                }
-                
-                if route_data:
-                    order_detail['ruta_optimizada'] = {
-                        'ruta': route_data.get('ruta', []),
-                        'distancia_m': route_data.get('distancia_m', 0),
-                        'tiempo_caminar_seg': route_data.get('tiempo_caminar_seg', 0),
-                        'tiempo_picking_seg': route_data.get('tiempo_picking_seg', 0),
-                        'tiempo_total_seg': route_data.get('tiempo_total_seg', 0),
-                        'tiempo_total_min': route_data.get('tiempo_total_min', 0),
-                        'items_recogidos': route_data.get('items_recogidos', 0),
-                        'velocidad_usada_m_s': route_data.get('velocidad_usada_m_s', 2.5)
-                    }
-                else:
-                    order_detail['ruta_optimizada'] = None
-                
-                orders_with_routes.append(order_detail)
+            orders_with_routes = self.compute.run(
+                build_order_details, orders, routes, complete, items=count_items(orders)
+            )
             
             processing_time = (time.time() - start_time) * 1000
             
@@ -166,6 +205,8 @@ class ReportService:
                 'month': month,
                 'orders_count': len(orders_with_routes),
                 'orders': orders_with_routes,
+                'partial': not all(complete),
+                'data_source': source,
                 'processing_time_ms': round(processing_time, 2)
             }
             
@@ -179,13 +220,154 @@ class ReportService:
                 'processing_time_ms': round((time.time() - start_time) * 1000, 2)
             }
     
-    def _get_last_10_orders_from_previous_month(self, month: str) -> List[Dict]:
+    def stream_orders_with_routes(self, month: str, deadline: Optional[Deadline] = None) -> Iterator[Dict]:
+        """
+        Variante en streaming de get_orders_with_routes_detailed.
+        Entrega cada pedido apenas termina la búsqueda de su ruta, sin armar la lista completa.
+        
+        Yields:
+            {'type': 'order', 'order': {...}} por cada pedido y al final
+            {'type': 'summary', ...} con el conteo, si fue parcial y el tiempo total
+        """
+        start_time = time.time()
+        orders_count = 0
+        partial = False
+        error = None
+        
+        try:
+            cached = self._orders_from_read_model(month, deadline)
+            if cached:
+                for order, route_data in zip(*cached):
+                    orders_count += 1
+                    yield {'type': 'order', 'order': build_order_detail(order, route_data, True)}
+            else:
+                orders = self._get_last_10_orders_from_previous_month(month, deadline)
+                partial = not orders and bool(deadline and deadline.expired())
+                # Se guardan antes de armar el detalle, que completa los items en su lugar
+                self._store_orders(month, orders)
+                
+                for idx, route_data, is_complete in self._iter_routes(orders, deadline):
+                    partial = partial or not is_complete
+                    orders_count += 1
+                    self._store_routes([orders[idx]], [route_data])
+                    yield {'type': 'order', 'order': build_order_detail(orders[idx], route_data, is_complete)}
+        except Exception as e:
+            print(f"Error en streaming de pedidos con rutas: {e}")
+            error = str(e)
+        
+        summary = {
+            'type': 'summary',
+            'month': month,
+            'orders_count': orders_count,
+            'partial': partial,
+            'processing_time_ms': round((time.time() - start_time) * 1000, 2)
+        }
+        if error:
+            summary['error'] = error
+        yield summary
+    
+    @staticmethod
+    def _newest_created_at(orders: List[Dict]) -> Optional[str]:
+        """Marca de agua de una lista de pedidos del gestor: su created_at más nuevo"""
+        timestamps = [normalize_timestamp(order['created_at']) for order in orders if order.get('created_at')]
+        return max(timestamps) if timestamps else None
+    
+    def _revalidate_read_model(self, month: str, watermark: Optional[str], deadline: Optional[Deadline] = None):
+        """
+        Compara el mes cargado con la lista actual del gestor (sin rutas, una sola llamada).
+        El feed del gateway es best-effort: pedidos creados por fuera de él o con el evento
+        perdido solo aparecen así. Los pedidos del gestor se guardan en el read model; los
+        nuevos llegan sin ruta, así que el reporte cae al join en vivo hasta completarlas.
+        Si el gestor no responde se sigue sirviendo lo guardado y se reintenta en la próxima.
+        """
+        orders = self._get_last_10_orders_from_previous_month(month, deadline)
+        if not orders:
+            return
+        newest = self._newest_created_at(orders)
+        if watermark is None or (newest and newest > watermark):
+            print(f"🔄 Read model atrasado para {month} (marca {watermark}, gestor {newest})")
+        self.read_model.upsert_orders(orders)
+        self.read_model.mark_synced(month, newest)
+    
+    def _orders_from_read_model(self, month: str, deadline: Optional[Deadline] = None
+                                ) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """
+        Pedidos y rutas del mes desde el read model (una consulta por rango), o None si
+        no puede responder solo: el mes aún no se cargó desde el gestor o falta alguna ruta.
+        Los pedidos traen los tiempos reales ya guardados, así no se vuelven a generar.
+        Una carga vale READ_MODEL_SYNC_TTL segundos; después se revalida contra el gestor.
+        """
+        if not self.read_model:
+            return None
+        try:
+            state = self.read_model.sync_state(month)
+            if state is None:
+                return None
+            synced_at, watermark = state
+            if time.time() - synced_at > Config.READ_MODEL_SYNC_TTL:
+                self._revalidate_read_model(month, watermark, deadline)
+            rows = self.read_model.last_orders(month, 10)
+        except Exception as e:
+            print(f"⚠️ Error leyendo el read model: {e}")
+            return None
+        
+        if not rows or any(row['route'] is None for row in rows):
+            return None
+        return [apply_real_times(row['order'], row['real_times']) for row in rows], [row['route'] for row in rows]
+    
+    def _store_orders(self, month: str, orders: List[Dict]):
+        """Guarda en el read model los pedidos leídos del gestor y marca el mes como cargado"""
+        if not self.read_model or not orders:
+            return
+        try:
+            self.read_model.upsert_orders(orders)
+            self.read_model.mark_synced(month, self._newest_created_at(orders))
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el read model: {e}")
+    
+    def _store_routes(self, orders: List[Dict], routes: List[Optional[Dict]]):
+        """Guarda en el read model las rutas obtenidas de ruta_optima"""
+        if not self.read_model:
+            return
+        try:
+            for order, route in zip(orders, routes):
+                if route:
+                    self.read_model.record_route(order.get('erp_order_id') or order.get('id'), route)
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar el read model: {e}")
+    
+    def _load_orders_and_routes(self, month: str, deadline: Optional[Deadline] = None
+                                ) -> Tuple[List[Dict], List[Optional[Dict]], List[bool], str]:
+        """
+        Últimos 10 pedidos del mes anterior con su ruta.
+        Si el read model tiene el mes completo se leen de ahí; si no, se hace el join en
+        vivo (gestor + ruta_optima en paralelo) y el resultado se guarda en el read model.
+        
+        Returns:
+            (pedidos, rutas, completos, origen: 'read-model' o 'live')
+        """
+        cached = self._orders_from_read_model(month, deadline)
+        if cached:
+            orders, routes = cached
+            return orders, routes, [True] * len(orders), 'read-model'
+        
+        orders = self._get_last_10_orders_from_previous_month(month, deadline)
+        if not orders:
+            return [], [], [], 'live'
+        
+        routes, complete = self._fetch_routes(orders, deadline)
+        self._store_orders(month, orders)
+        self._store_routes(orders, routes)
+        return orders, routes, complete, 'live'
+    
+    def _get_last_10_orders_from_previous_month(self, month: str, deadline: Optional[Deadline] = None) -> List[Dict]:
         """Obtiene los últimos 10 pedidos del mes anterior desde GestorPedidos"""
         try:
             # Llamar al nuevo endpoint del gestor
             response = self.client.call_gestor_pedidos(
                 f'/orders/last-10-previous-month?month={month}',
-                method='GET'
+                method='GET',
+                deadline=deadline
             )
             
             if response and response.get('status') == 'success':
@@ -197,13 +379,15 @@ class ReportService:
             print(f"Error obteniendo pedidos: {e}")
             return []
     
-    def _get_route_for_order(self, order_id: str) -> Optional[Dict]:
+    def _get_route_for_order(self, order_id: str, deadline: Optional[Deadline] = None) -> Optional[Dict]:
         """Obtiene la ruta calculada para un pedido desde ruta_optima"""
         try:
             # Llamar al endpoint de ruta_optima
             response = self.client.call_ruta_optima(
                 f'/ruta/{order_id}/',
-                method='GET'
+                method='GET',
+                deadline=deadline,
+                endpoint_label='/ruta/{order_id}/'
             )
             
             if response:
@@ -225,127 +409,94 @@ class ReportService:
             traceback.print_exc()
             return None
     
-    def _calculate_and_save_real_times(self, orders_with_routes: List[Dict]) -> List[Dict]:
-        """
-        Calcula tiempos reales aleatorios y los guarda en los pedidos del gestor.
-        Los tiempos reales se generan con una variación del 80% al 150% del tiempo estimado.
-        """
-        result = []
+    def _lookup_route(self, order: Dict, deadline: Optional[Deadline] = None) -> Optional[Dict]:
+        """Busca la ruta de un pedido por erp_order_id y, si no existe, por el id de MongoDB"""
+        erp_order_id = order.get('erp_order_id')
+        order_id = order.get('id')
+        print(f"🔍 Buscando ruta para pedido - erp_order_id: {erp_order_id}, id: {order_id}")
         
-        for item in orders_with_routes:
-            order = item['order']
-            route = item['route']
-            
-            # Generar tiempos reales para cada item del pedido
-            items_with_real_times = []
-            total_real_time = 0
-            
-            for order_item in order.get('items', []):
-                tiempo_estimado = order_item.get('tiempo_estimado_pick', 5.0)
-                
-                # Generar tiempo real aleatorio (80% a 150% del estimado)
-                variacion = random.uniform(0.8, 1.5)
-                tiempo_real = round(tiempo_estimado * variacion, 2)
-                
-                items_with_real_times.append({
-                    **order_item,
-                    'tiempo_real_pick': tiempo_real
-                })
-                
-                total_real_time += tiempo_real
-            
-            # Actualizar el pedido con tiempos reales
-            order['items'] = items_with_real_times
-            order['tiempo_total_real'] = round(total_real_time, 2)
-            order['tiempo_total_estimado'] = route.get('tiempo_picking_seg', 0)
-            
-            # Guardar tiempos reales en el gestor
-            try:
-                self.client.call_gestor_pedidos(
-                    f'/orders/{order.get("erp_order_id")}/real-times',
-                    method='PUT',
-                    json=items_with_real_times
-                )
-            except Exception as e:
-                print(f"Error guardando tiempos reales para pedido {order.get('erp_order_id')}: {e}")
-            
-            result.append({
-                'order': order,
-                'route': route
-            })
+        # Intentar primero con erp_order_id
+        route_data = self._get_route_for_order(erp_order_id, deadline)
+        
+        # Si no se encuentra, intentar con el id de MongoDB
+        if not route_data and order_id and not (deadline and deadline.expired()):
+            print(f"⚠️ No se encontró ruta con erp_order_id, intentando con id: {order_id}")
+            route_data = self._get_route_for_order(order_id, deadline)
         
-        return result
+        return route_data
     
-    def _analyze_stand_deviations(self, orders_with_real_times: List[Dict]) -> Dict[str, Dict]:
+    def _iter_routes(self, orders: List[Dict], deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Optional[Dict], bool]]:
         """
-        Analiza las desviaciones de tiempo por stand
+        Busca en paralelo las rutas de todos los pedidos y las entrega a medida que llegan.
+        Si el deadline se agota, no se espera más: el resto se entrega como incompleto.
         
-        Returns:
-            Dict con análisis por stand_id
+        Yields:
+            (índice del pedido en orders, ruta o None, ruta completa)
         """
-        stand_stats = {}
+        def lookup(order: Dict) -> Tuple[Optional[Dict], bool]:
+            route = self._lookup_route(order, deadline)
+            # Una búsqueda que termina con el deadline ya agotado fue cortada por él
+            return route, route is not None or not (deadline and deadline.expired())
         
-        for item in orders_with_real_times:
-            order = item['order']
-            
-            for order_item in order.get('items', []):
-                stand_id = order_item.get('stand_id_estimada', 'UNKNOWN')
-                tiempo_estimado = order_item.get('tiempo_estimado_pick', 0)
-                tiempo_real = order_item.get('tiempo_real_pick', tiempo_estimado)
-                
-                if stand_id not in stand_stats:
-                    stand_stats[stand_id] = {
-                        'tiempos_estimados': [],
-                        'tiempos_reales': [],
-                        'count': 0
-                    }
-                
-                stand_stats[stand_id]['tiempos_estimados'].append(tiempo_estimado)
-                stand_stats[stand_id]['tiempos_reales'].append(tiempo_real)
-                stand_stats[stand_id]['count'] += 1
+        futures = {submit_with_context(self._executor, lookup, order): idx for idx, order in enumerate(orders)}
+        pending = set(futures)
         
-        # Calcular promedios y desviaciones
-        analysis = {}
-        for stand_id, stats in stand_stats.items():
-            if len(stats['tiempos_estimados']) > 0:
-                tiempo_estimado_promedio = sum(stats['tiempos_estimados']) / len(stats['tiempos_estimados'])
-                tiempo_real_promedio = sum(stats['tiempos_reales']) / len(stats['tiempos_reales'])
-                desviacion_promedio = tiempo_real_promedio - tiempo_estimado_promedio
-                desviacion_porcentual = (desviacion_promedio / tiempo_estimado_promedio * 100) if tiempo_estimado_promedio > 0 else 0
-                
-                analysis[stand_id] = {
-                    'tiempo_estimado_promedio': round(tiempo_estimado_promedio, 2),
-                    'tiempo_real_promedio': round(tiempo_real_promedio, 2),
-                    'desviacion_promedio': round(desviacion_promedio, 2),
-                    'desviacion_porcentual': round(desviacion_porcentual, 2),
-                    'count': stats['count']
-                }
+        try:
+            for future in as_completed(futures, timeout=deadline.remaining() if deadline else None):
+                pending.discard(future)
+                if future.exception() is None:
+                    route, is_complete = future.result()
+                    yield futures[future], route, is_complete
+                else:
+                    yield futures[future], None, True
+        except FuturesTimeoutError:
+            pass
         
-        return analysis
+        for future in sorted(pending, key=futures.get):
+            yield futures[future], None, False
     
-    def _identify_problematic_stands(self, stands_analysis: Dict[str, Dict]) -> List[Dict]:
+    def _fetch_routes(self, orders: List[Dict], deadline: Optional[Deadline] = None) -> Tuple[List[Optional[Dict]], List[bool]]:
         """
-        Identifica stands con problemas significativos.
-        Un stand tiene problemas si la desviación porcentual es > 15%
+        Busca en paralelo las rutas de todos los pedidos.
+        Si el deadline se agota antes de que terminen todas las búsquedas, no se espera
+        más: se devuelven las rutas que alcanzaron a llegar y el resto queda incompleto.
+        
+        Returns:
+            (rutas, completos), ambas listas alineadas con orders
         """
-        problematic = []
+        routes: List[Optional[Dict]] = [None] * len(orders)
+        complete = [False] * len(orders)
+        for idx, route, is_complete in self._iter_routes(orders, deadline):
+            routes[idx] = route
+            complete[idx] = is_complete
         
-        for stand_id, analysis in stands_analysis.items():
-            desviacion_porcentual = abs(analysis['desviacion_porcentual'])
-            
-            # Stand problemático si desviación > 15%
-            if desviacion_porcentual > 15:
-                problematic.append({
-                    'stand_id': stand_id,
-                    'tiempo_estimado_promedio': analysis['tiempo_estimado_promedio'],
-                    'tiempo_real_promedio': analysis['tiempo_real_promedio'],
-                    'desviacion_promedio': analysis['desviacion_promedio'],
-                    'desviacion_porcentual': analysis['desviacion_porcentual'],
-                    'pedidos_analizados': analysis['count']
-                })
+        if not all(complete):
+            print(f"⏱️ Deadline agotado: {complete.count(False)} de {len(orders)} rutas no llegaron a tiempo")
         
-        # Ordenar por desviación descendente
-        problematic.sort(key=lambda x: abs(x['desviacion_porcentual']), reverse=True)
+        return routes, complete
+    
+    def _save_real_times(self, real_times_payload: List[Dict], deadline: Optional[Deadline] = None):
+        """Envía los tiempos reales de todos los pedidos al endpoint bulk del gestor"""
+        if not real_times_payload:
+            return
         
-        return problematic
-
+        try:
+            response = self.client.call_gestor_pedidos(
+                '/orders/real-times',
+                method='PUT',
+                deadline=deadline,
+                json={'orders': real_times_payload}
+            )
+            if not response:
+                print(f"⚠️ No se pudieron guardar tiempos reales de {len(real_times_payload)} pedidos")
+                return
+            
+            if self.read_model:
+                self.read_model.record_real_times(real_times_payload)
+            
+            for order_result in response.get('results', []):
+                if order_result.get('status') != 'UPDATED':
+                    print(f"⚠️ Tiempos reales no guardados para pedido {order_result.get('erp_order_id')}: "
+                          f"{order_result.get('status')} {order_result.get('error') or ''}")
+        except Exception as e:
+            print(f"Error guardando tiempos reales: {e}")
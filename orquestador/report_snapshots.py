@@ -0,0 +1,166 @@
+"""
+Precomputación programada de los reportes mensuales.
+Los reportes se generan en segundo plano apenas cierra el mes y se guardan en disco,
+así los endpoints los sirven sin depender de gestor-pedidos ni de ruta_optima.
+Un snapshot vence a los `ttl` segundos y se descarta si llegan pedidos tardíos de su mes,
+para que el scheduler lo regenere con los datos nuevos.
+"""
+import asyncio
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+# Reportes que se precomputan (nombre -> método de ReportService)
+SNAPSHOT_REPORTS = {
+    'rutas-optimizadas': 'generate_route_report',
+    'pedidos-con-rutas': 'get_orders_with_routes_detailed',
+}
+
+MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+
+def report_month_of(created_at: str) -> str:
+    """Mes (YYYY-MM) del reporte que cubre un pedido creado en created_at (el mes siguiente)"""
+    year, month_num = int(created_at[:4]), int(created_at[5:7])
+    year, month_num = (year + 1, 1) if month_num == 12 else (year, month_num + 1)
+    return f"{year:04d}-{month_num:02d}"
+
+
+class ReportSnapshotStore:
+    """
+    Guarda cada reporte como un archivo JSON: <directorio>/<mes>/<reporte>.json.
+    La escritura es atómica (archivo temporal + rename) para no dejar snapshots a medias.
+    Con ttl > 0 un snapshot más viejo que ttl segundos se trata como inexistente.
+    """
+
+    def __init__(self, directory: str, ttl: float = 0):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, month: str, report_name: str) -> str:
+        if not MONTH_PATTERN.match(month):
+            raise ValueError(f"Mes inválido: {month} (formato YYYY-MM)")
+        return os.path.join(self.directory, month, f"{report_name}.json")
+
+    def save(self, month: str, report_name: str, report: Dict) -> Dict:
+        """Guarda el snapshot y devuelve el documento guardado"""
+        snapshot = {
+            'generated_at': datetime.utcnow().isoformat() + 'Z',
+            'report': report
+        }
+        path = self._path(month, report_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return snapshot
+
+    def _expired(self, snapshot: Dict) -> bool:
+        if self.ttl <= 0:
+            return False
+        generated_at = datetime.fromisoformat(snapshot['generated_at'].rstrip('Z'))
+        return (datetime.utcnow() - generated_at).total_seconds() > self.ttl
+
+    def load(self, month: str, report_name: str) -> Optional[Dict]:
+        """Devuelve el snapshot guardado o None si no existe o ya venció"""
+        try:
+            with open(self._path(month, report_name), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            return None if self._expired(snapshot) else snapshot
+        except (FileNotFoundError, ValueError):
+            return None
+        except Exception as e:
+            print(f"⚠️ Snapshot ilegible {month}/{report_name}: {e}")
+            return None
+
+    def exists(self, month: str, report_name: str) -> bool:
+        """Hay un snapshot vigente (los vencidos o ilegibles cuentan como inexistentes)"""
+        try:
+            return self.load(month, report_name) is not None
+        except ValueError:
+            return False
+
+    def invalidate(self, months: Iterable[str]) -> int:
+        """Borra los snapshots de los meses dados; devuelve cuántos archivos se borraron"""
+        removed = 0
+        for month in months:
+            month_removed = 0
+            for report_name in SNAPSHOT_REPORTS:
+                try:
+                    os.remove(self._path(month, report_name))
+                    month_removed += 1
+                except (FileNotFoundError, ValueError):
+                    continue
+            if month_removed:
+                print(f"🗑️ Snapshots de {month} invalidados")
+            removed += month_removed
+        return removed
+
+
+class ReportScheduler:
+    """
+    Tarea en segundo plano que revisa periódicamente si ya cerró un mes
+    y, si faltan, genera y guarda sus reportes.
+
+    El parámetro `month` de los reportes analiza el mes ANTERIOR, así que cuando
+    cierra un mes se generan los reportes con month = mes en curso.
+    """
+
+    def __init__(self, report_service, store: ReportSnapshotStore, interval: int = 3600):
+        self.report_service = report_service
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current_report_month() -> str:
+        """Mes (YYYY-MM) cuyos reportes cubren el último mes cerrado"""
+        return datetime.utcnow().strftime('%Y-%m')
+
+    def build_month(self, month: str, force: bool = False) -> Dict[str, Dict]:
+        """
+        Genera y guarda los reportes de un mes (bloqueante).
+        Los reportes con error, parciales o sin pedidos (p. ej. gestor caído) no se
+        guardan, para reintentar en la próxima vuelta.
+        """
+        built = {}
+        for report_name, method_name in SNAPSHOT_REPORTS.items():
+            if not force and self.store.exists(month, report_name):
+                continue
+
+            report = getattr(self.report_service, method_name)(month)
+            if report.get('error') or report.get('partial') or not report.get('orders_count'):
+                print(f"⚠️ Reporte {report_name} de {month} no se guardó: {report.get('error', 'parcial o sin pedidos')}")
+                continue
+
+            built[report_name] = self.store.save(month, report_name, report)
+            print(f"🗂️ Snapshot generado: {report_name} {month}")
+        return built
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.build_month, self.current_report_month())
+            except Exception as e:
+                print(f"❌ Error precomputando reportes: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            print(f"🕒 Scheduler de reportes iniciado (cada {self.interval}s)")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,125 @@
+"""
+Mecanismos de resiliencia del ServiceClient: circuit breakers por instancia,
+presupuesto de reintentos (token bucket) y latencias recientes para hedging
+"""
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+class CircuitBreaker:
+    """
+    Circuit breaker de una instancia destino.
+    
+    - closed: deja pasar todo; `failure_threshold` fallos seguidos lo abren
+    - open: rechaza sin llamar durante `reset_timeout` segundos
+    - half-open: deja pasar hasta `half_open_max_calls` llamadas de prueba;
+      si una tiene éxito se cierra, si falla se vuelve a abrir
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 5.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+    
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+    
+    def available(self) -> bool:
+        """Indica si aceptaría una llamada ahora (no reserva nada)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                return False
+            if self._state == self.HALF_OPEN:
+                return self._half_open_calls < self.half_open_max_calls
+            return True
+    
+    def acquire(self) -> bool:
+        """Reserva una llamada; en half-open ocupa uno de los cupos de prueba"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                return False
+            if self._state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    return False
+                self._half_open_calls += 1
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                print("✅ Circuito cerrado tras llamada de prueba exitosa")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+class RetryBudget:
+    """
+    Presupuesto de reintentos (y peticiones hedged) de un servicio como token bucket:
+    se recargan `rate` tokens por segundo hasta `burst`; cada reintento gasta uno.
+    Evita que los reintentos multipliquen la carga sobre un backend degradado.
+    """
+    
+    def __init__(self, rate: float = 2.0, burst: float = 10.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+class LatencyWindow:
+    """Últimas latencias exitosas de un servicio, para derivar el retardo de hedging"""
+    
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._samples.append(latency_ms)
+    
+    def percentile(self, pct: float, min_samples: int = 20) -> Optional[float]:
+        """Percentil de las latencias recientes, o None si aún no hay suficientes muestras"""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
@@ -2,105 +2,339 @@
 Cliente para comunicarse con los microservicios usando service discovery
 """
 import requests
+import threading
 import time
-from typing import Optional, Dict, Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, Iterable, List, Tuple
 from .service_registry import registry
+from .load_balancer import LoadBalancer
+from .resilience import CircuitBreaker, LatencyWindow, RetryBudget
 from .config import Config
+from .deadline import Deadline, DeadlineExceeded
+from .metrics import current_trace, hop_metrics, submit_with_context
+
+# Solo estos métodos se reintentan o se duplican (hedging) en otra instancia
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
 
 class ServiceClient:
     """Cliente para llamar a los microservicios con service discovery"""
     
     def __init__(self):
         self.timeout = Config.REQUEST_TIMEOUT
+        self.balancer = LoadBalancer(Config.LOAD_BALANCING_STRATEGY)
+        # Las instancias que salen del registry se descartan también del balanceo local
+        registry.add_listener(lambda snapshot: self.balancer.retain(snapshot.services))
+        # Cache de descubrimiento: service_name -> (versión del snapshot, instancias)
+        self._endpoints: Dict[str, Tuple[int, Tuple]] = {}
+        # Resiliencia: circuit breaker por (servicio, instancia), presupuesto de
+        # reintentos y ventana de latencias por servicio
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._retry_budgets: Dict[str, RetryBudget] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._resilience_lock = threading.Lock()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=Config.HEDGE_WORKERS) if Config.HEDGING_ENABLED else None
+    
+    def _breaker(self, service_name: str, target: str) -> CircuitBreaker:
+        """Circuit breaker de una instancia (por instance_id, o por URL si es el fallback)"""
+        key = (service_name, target)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._resilience_lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(
+                    failure_threshold=Config.CIRCUIT_FAILURE_THRESHOLD,
+                    reset_timeout=Config.CIRCUIT_RESET_TIMEOUT,
+                    half_open_max_calls=Config.CIRCUIT_HALF_OPEN_MAX_CALLS
+                ))
+        return breaker
+    
+    def _retry_budget(self, service_name: str) -> RetryBudget:
+        budget = self._retry_budgets.get(service_name)
+        if budget is None:
+            with self._resilience_lock:
+                budget = self._retry_budgets.setdefault(
+                    service_name, RetryBudget(Config.RETRY_BUDGET_PER_SECOND, Config.RETRY_BUDGET_BURST)
+                )
+        return budget
     
-    def _get_service_url(self, service_name: str, fallback_url: Optional[str] = None) -> Optional[str]:
-        """Obtiene la URL del servicio desde el registry o usa fallback"""
-        url = registry.get_service_url(service_name)
-        if not url and fallback_url:
-            return fallback_url
-        return url
+    def _latency_window(self, service_name: str) -> LatencyWindow:
+        window = self._latencies.get(service_name)
+        if window is None:
+            with self._resilience_lock:
+                window = self._latencies.setdefault(service_name, LatencyWindow())
+        return window
     
-    def call_gestor_pedidos(self, endpoint: str, method: str = 'GET', **kwargs) -> Optional[Dict]:
+    def open_circuits(self) -> List[Dict[str, str]]:
+        """Instancias con el circuito abierto o en prueba (para /health)"""
+        return [
+            {'service': service_name, 'target': target, 'state': breaker.state}
+            for (service_name, target), breaker in list(self._breakers.items())
+            if breaker.state != CircuitBreaker.CLOSED
+        ]
+    
+    def _cached_instances(self, service_name: str) -> Tuple:
         """
-        Llama a un endpoint del gestor de pedidos
+        Instancias del servicio según la cache local.
+        Solo se vuelve a leer del snapshot del registry cuando cambia su versión,
+        así la consulta en el camino caliente no toma el lock del registry.
+        """
+        snapshot = registry.snapshot()
+        cached = self._endpoints.get(service_name)
+        if cached is None or cached[0] != snapshot.version:
+            cached = (snapshot.version, snapshot.instances(service_name))
+            self._endpoints[service_name] = cached
+        return cached[1]
+    
+    def _resolve_instance(self, service_name: str, fallback_url: Optional[str] = None,
+                          exclude: Iterable[str] = ()) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Elige una instancia del servicio (según la estrategia de balanceo) o usa el fallback.
+        Solo considera instancias cuyo circuit breaker acepta la llamada y que no estén en `exclude`.
         
-        Args:
-            endpoint: Ruta del endpoint (ej: '/health', '/orders')
-            method: Método HTTP ('GET', 'POST', etc.)
-            **kwargs: Argumentos adicionales para requests
+        Returns:
+            (instance_id o None si es el fallback, url), o (None, None) si ninguna está disponible
         """
-        url = self._get_service_url('gestor-pedidos', Config.GESTOR_PEDIDOS_URL)
-        if not url:
-            raise Exception("Servicio gestor-pedidos no disponible")
+        instances = self._cached_instances(service_name)
+        if instances:
+            candidates = [
+                i for i in instances
+                if i['instance_id'] not in exclude and self._breaker(service_name, i['instance_id']).available()
+            ]
+            # Otra llamada puede ganar el último cupo de un circuito en prueba entre available()
+            # y acquire(): en ese caso se elige entre las candidatas que quedan
+            while candidates:
+                instance = self.balancer.choose(service_name, candidates)
+                if self._breaker(service_name, instance['instance_id']).acquire():
+                    return instance['instance_id'], instance['url']
+                candidates = [i for i in candidates if i['instance_id'] != instance['instance_id']]
+            return None, None
         
+        if fallback_url and fallback_url not in exclude and self._breaker(service_name, fallback_url).acquire():
+            return None, fallback_url
+        return None, None
+    
+    def _resolve_timeout(self, timeout: Optional[float], deadline: Optional[Deadline]) -> float:
+        """
+        Timeout efectivo de una sub-llamada: el configurado, acotado por el
+        tiempo restante del deadline de la petición (si hay uno).
+        """
+        timeout = timeout or self.timeout
+        if deadline is not None:
+            return deadline.timeout(timeout)
+        return timeout
+    
+    def _hedge_delay(self, service_name: str) -> Optional[float]:
+        """Segundos a esperar antes de duplicar la petición: percentil de latencias recientes del servicio"""
+        latency_ms = self._latency_window(service_name).percentile(Config.HEDGE_PERCENTILE, Config.HEDGE_MIN_SAMPLES)
+        if latency_ms is None:
+            return None
+        return max(latency_ms, Config.HEDGE_MIN_DELAY_MS) / 1000
+    
+    def _attempt(self, service_name: str, instance_id: Optional[str], url: str, endpoint: str, method: str,
+                 timeout: float, label: str, **kwargs) -> Tuple[Optional[requests.Response], bool]:
+        """
+        Un intento contra una instancia. Registra en el balanceador las peticiones en curso
+        y la latencia, en el circuit breaker el resultado y en las métricas (y el trace de
+        la petición, si hay uno) el tiempo hasta los headers y el total.
+        
+        Returns:
+            (respuesta o None, True si la instancia falló: timeout, error de conexión o 5xx)
+        """
         full_url = f"{url}{endpoint}"
+        breaker = self._breaker(service_name, instance_id or url)
         
+        if instance_id:
+            self.balancer.acquire(service_name, instance_id)
+        start_time = time.perf_counter()
+        elapsed = None
+        ttfb_ms = None
+        outcome = 'error'
         try:
-            start_time = time.time()
-            response = requests.request(
-                method,
-                full_url,
-                timeout=self.timeout,
-                **kwargs
-            )
-            elapsed = time.time() - start_time
+            response = requests.request(method, full_url, timeout=timeout, **kwargs)
+            elapsed = time.perf_counter() - start_time
+            # requests mide desde el envío hasta terminar de leer los headers
+            ttfb_ms = response.elapsed.total_seconds() * 1000
             
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error llamando a {full_url}: {response.status_code}")
-                return None
+            if response.status_code not in (200, 404):
+                print(f"Error llamando a {full_url}: {response.status_code} - {response.text}")
+            if response.status_code >= 500:
+                outcome = 'server_error'
+                breaker.record_failure()
+                return response, True
+            outcome = 'ok'
+            breaker.record_success()
+            self._latency_window(service_name).record(elapsed * 1000)
+            return response, False
         except requests.exceptions.Timeout:
+            elapsed = time.perf_counter() - start_time
+            outcome = 'timeout'
             print(f"Timeout llamando a {full_url}")
-            return None
+            breaker.record_failure()
+            return None, True
         except Exception as e:
             print(f"Error llamando a {full_url}: {e}")
-            return None
+            breaker.record_failure()
+            return None, True
+        finally:
+            if instance_id:
+                self.balancer.release(service_name, instance_id, elapsed * 1000 if elapsed is not None else None)
+            
+            total_ms = (time.perf_counter() - start_time) * 1000
+            hop_metrics.record(service_name, label, outcome, {'ttfb': ttfb_ms, 'total': total_ms})
+            trace = current_trace.get()
+            if trace is not None:
+                trace.add(service_name, label, instance_id or url, outcome, start_time, ttfb_ms, total_ms)
+    
+    def _hedged_attempt(self, service_name: str, instance_id: Optional[str], url: str, endpoint: str, method: str,
+                        timeout: float, label: str, tried: set, **kwargs) -> Tuple[Optional[requests.Response], bool]:
+        """
+        Intento con hedging: si la instancia elegida no responde dentro del percentil de
+        latencia del servicio, envía la misma petición a otra instancia y se queda con la
+        primera respuesta correcta. La petición duplicada gasta del presupuesto de reintentos.
+        """
+        primary = submit_with_context(
+            self._hedge_executor, self._attempt, service_name, instance_id, url, endpoint, method, timeout, label, **kwargs
+        )
+        delay = self._hedge_delay(service_name)
+        if delay is None or delay >= timeout:
+            return primary.result()
+        
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._retry_budget(service_name).try_acquire():
+            return primary.result()
+        
+        hedge_id, hedge_url = self._resolve_instance(service_name, exclude=tried)
+        if not hedge_url:
+            return primary.result()
+        tried.add(hedge_id)
+        print(f"🪞 Hedging de {service_name}{endpoint}: {instance_id} tarda más de {delay * 1000:.0f}ms, duplicando en {hedge_id}")
+        hedge = submit_with_context(
+            self._hedge_executor, self._attempt, service_name, hedge_id, hedge_url, endpoint, method,
+            max(timeout - delay, 0.001), label, **kwargs
+        )
+        
+        result = (None, True)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not result[1]:
+                    return result
+        return result
+    
+    def _send(self, service_name: str, fallback_url: Optional[str], endpoint: str, method: str,
+              timeout: Optional[float], deadline: Optional[Deadline], endpoint_label: Optional[str] = None,
+              **kwargs) -> Optional[requests.Response]:
+        """
+        Envía la petición a una instancia del servicio.
+        
+        - Las instancias con el circuito abierto se saltan sin esperar su timeout
+        - Los métodos idempotentes que fallan se reintentan (en otra instancia si la hay)
+          hasta RETRY_MAX_ATTEMPTS, mientras quede presupuesto de reintentos y deadline
+        - Con HEDGING_ENABLED, los GET lentos se duplican en una segunda instancia
+        
+        Las métricas se etiquetan con endpoint_label (p. ej. '/ruta/{order_id}/') o,
+        si no se da, con el endpoint sin query string.
+        
+        Devuelve la última respuesta, o None si la llamada falla o no se hace.
+        """
+        label = endpoint_label or endpoint.split('?', 1)[0]
+        method_name = method.upper()
+        attempts = Config.RETRY_MAX_ATTEMPTS if method_name in IDEMPOTENT_METHODS else 1
+        hedge = self._hedge_executor is not None and method_name == 'GET'
+        tried = set()
+        response = None
+        
+        for attempt in range(max(attempts, 1)):
+            if attempt > 0 and not self._retry_budget(service_name).try_acquire():
+                print(f"Sin presupuesto de reintentos para {service_name}, no se reintenta {endpoint}")
+                break
+            
+            try:
+                request_timeout = self._resolve_timeout(timeout, deadline)
+            except DeadlineExceeded:
+                print(f"Deadline agotado, no se llama a {service_name}{endpoint}")
+                break
+            
+            # Se prefiere una instancia no intentada; si no hay otra se reintenta la misma
+            instance_id, url = self._resolve_instance(service_name, fallback_url, exclude=tried)
+            if not url and tried:
+                instance_id, url = self._resolve_instance(service_name, fallback_url)
+            if not url:
+                print(f"⚡ {service_name} no disponible: sin instancias o con el circuito abierto")
+                break
+            
+            if attempt > 0:
+                print(f"🔁 Reintentando {service_name}{endpoint} en {instance_id or url}")
+            tried.add(instance_id or url)
+            
+            if hedge:
+                response, failed = self._hedged_attempt(
+                    service_name, instance_id, url, endpoint, method, request_timeout, label, tried, **kwargs
+                )
+            else:
+                response, failed = self._attempt(
+                    service_name, instance_id, url, endpoint, method, request_timeout, label, **kwargs
+                )
+            if not failed:
+                return response
+        
+        return response
     
-    def call_ruta_optima(self, endpoint: str, method: str = 'GET', **kwargs) -> Optional[Dict]:
+    def call_gestor_pedidos(self, endpoint: str, method: str = 'GET', timeout: Optional[float] = None,
+                            deadline: Optional[Deadline] = None, endpoint_label: Optional[str] = None,
+                            **kwargs) -> Optional[Dict]:
+        """
+        Llama a un endpoint del gestor de pedidos
+        
+        Args:
+            endpoint: Ruta del endpoint (ej: '/health', '/orders')
+            method: Método HTTP ('GET', 'POST', etc.)
+            timeout: Timeout en segundos (por defecto Config.REQUEST_TIMEOUT)
+            deadline: Deadline de la petición; el timeout se acota al tiempo restante
+            endpoint_label: Endpoint para las métricas cuando la ruta lleva ids
+            **kwargs: Argumentos adicionales para requests
+        """
+        response = self._send('gestor-pedidos', Config.GESTOR_PEDIDOS_URL, endpoint, method, timeout, deadline,
+                              endpoint_label, **kwargs)
+        
+        if response is not None and response.status_code == 200:
+            try:
+                return response.json()
+            except ValueError:
+                print(f"Respuesta inválida de gestor-pedidos en {endpoint}")
+        return None
+    
+    def call_ruta_optima(self, endpoint: str, method: str = 'GET', timeout: Optional[float] = None,
+                         deadline: Optional[Deadline] = None, endpoint_label: Optional[str] = None,
+                         **kwargs) -> Optional[Dict]:
         """
         Llama a un endpoint de ruta_optima
         
         Args:
             endpoint: Ruta del endpoint (ej: '/calcular-ruta/')
             method: Método HTTP ('GET', 'POST', etc.)
+            timeout: Timeout en segundos (por defecto Config.REQUEST_TIMEOUT)
+            deadline: Deadline de la petición; el timeout se acota al tiempo restante
+            endpoint_label: Endpoint para las métricas cuando la ruta lleva ids
             **kwargs: Argumentos adicionales para requests
         """
-        url = self._get_service_url('ruta-optima', Config.RUTA_OPTIMA_URL)
-        if not url:
-            raise Exception("Servicio ruta-optima no disponible")
-        
-        full_url = f"{url}{endpoint}"
+        response = self._send('ruta-optima', Config.RUTA_OPTIMA_URL, endpoint, method, timeout, deadline,
+                              endpoint_label, **kwargs)
+        if response is None:
+            return None
         
-        try:
-            start_time = time.time()
-            response = requests.request(
-                method,
-                full_url,
-                timeout=self.timeout,
-                **kwargs
-            )
-            elapsed = time.time() - start_time
-            
-            # Manejar diferentes códigos de estado
-            if response.status_code == 200:
+        # Manejar diferentes códigos de estado
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 404:
+            # 404 puede ser válido (ruta no encontrada), devolver el JSON
+            try:
                 return response.json()
-            elif response.status_code == 404:
-                # 404 puede ser válido (ruta no encontrada), devolver el JSON
-                try:
-                    return response.json()
-                except:
-                    return {"status": "NOT_FOUND", "mensaje": "Recurso no encontrado"}
-            else:
-                print(f"Error llamando a {full_url}: {response.status_code} - {response.text}")
-                try:
-                    return response.json()
-                except:
-                    return None
-        except requests.exceptions.Timeout:
-            print(f"Timeout llamando a {full_url}")
-            return None
-        except Exception as e:
-            print(f"Error llamando a {full_url}: {e}")
-            return None
-
+            except:
+                return {"status": "NOT_FOUND", "mensaje": "Recurso no encontrado"}
+        else:
+            try:
+                return response.json()
+            except:
+                return None
@@ -1,127 +1,389 @@
 """
 Service Registry para descubrimiento de servicios
 """
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
 from datetime import datetime, timedelta
 import threading
 import time
+from .config import Config
+from .load_balancer import LoadBalancer
+
+# Campos internos del registry que no se publican en el snapshot (cambian en cada heartbeat
+# o sondeo y publicarlos despertaría a todos los consumidores sin cambios reales)
+UNPUBLISHED_FIELDS = ('last_heartbeat', 'status', 'last_probe_at', 'probe_failures')
+# Cambio relativo mínimo de la latencia de sondeo para guardarla (y publicar un snapshot nuevo)
+PROBE_LATENCY_CHANGE = 0.2
+
+def freeze(value):
+    """Copia de solo lectura (recursiva) de un valor JSON: dicts -> MappingProxyType, listas -> tuplas"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    """Inverso de freeze, para serializar una instancia publicada"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+class RegistrySnapshot:
+    """
+    Vista inmutable de las instancias sanas de cada servicio.
+    El registry la reemplaza completa (copy-on-write) en cada cambio de membresía,
+    así los lectores solo leen una referencia, sin lock.
+    """
+    
+    __slots__ = ('version', 'services')
+    
+    def __init__(self, version: int, services: Dict[str, Tuple[Mapping, ...]]):
+        self.version = version
+        self.services: Mapping[str, Tuple[Mapping, ...]] = MappingProxyType(services)
+    
+    def instances(self, service_name: str) -> Tuple[Mapping, ...]:
+        return self.services.get(service_name, ())
 
 class ServiceRegistry:
     """
     Registry simple para service discovery.
     Los servicios se registran automáticamente al iniciar.
+    Cada servicio puede tener varias instancias (identificadas por instance_id).
+    
+    El estado maestro se modifica bajo lock; los lectores usan snapshot(),
+    que se vuelve a publicar al registrar, desregistrar, revivir o expirar instancias.
     """
     
-    def __init__(self, ttl: int = 30):
-        self._services: Dict[str, Dict] = {}
+    def __init__(self, ttl: int = 30, strategy: str = 'round-robin', probe_failure_threshold: int = 3):
+        # service_name -> instance_id -> instancia
+        self._services: Dict[str, Dict[str, Dict]] = {}
         self._lock = threading.Lock()
         self._ttl = ttl  # Tiempo de vida en segundos
+        # Sondeos /health fallidos seguidos para sacar una instancia del balanceo
+        self._probe_failure_threshold = probe_failure_threshold
+        self._balancer = LoadBalancer(strategy)
+        self._snapshot = RegistrySnapshot(0, {})
+        # Funciones avisadas con cada snapshot publicado (watch de /registry/watch)
+        self._listeners: List[Callable[[RegistrySnapshot], None]] = []
+    
+    def add_listener(self, listener: Callable[[RegistrySnapshot], None]):
+        """
+        Registra una función que se llama con cada snapshot nuevo.
+        Se llama con el lock tomado, así que no debe bloquear.
+        """
+        self._listeners.append(listener)
+    
+    def snapshot(self) -> RegistrySnapshot:
+        """Snapshot vigente de las instancias sanas (lectura sin lock)"""
+        return self._snapshot
+    
+    def _is_alive(self, instance: Dict, now: datetime) -> bool:
+        return (now - instance['last_heartbeat']).total_seconds() <= self._ttl
+    
+    def _is_routable(self, instance: Dict, now: datetime) -> bool:
+        """Viva por heartbeat y sin demasiados sondeos /health fallidos seguidos"""
+        return self._is_alive(instance, now) and instance['probe_failures'] < self._probe_failure_threshold
+    
+    def _publish(self) -> bool:
+        """
+        Publica un nuevo snapshot con las instancias sanas (requiere tener el lock).
+        Si ni las instancias sanas ni sus campos publicados cambiaron no publica nada:
+        la versión no avanza, las caches de los consumidores siguen válidas y no se
+        despierta a los long-poll de /registry/watch.
         
-    def register(self, service_name: str, host: str, port: int, metadata: Optional[Dict] = None):
+        Returns:
+            True si se publicó un snapshot nuevo
+        """
+        now = datetime.utcnow()
+        services = {}
+        for service_name, instances in self._services.items():
+            healthy = []
+            for instance in instances.values():
+                if self._is_routable(instance, now):
+                    instance['status'] = 'healthy'
+                    # Copia profunda congelada: metadata no queda compartida con la entrada viva
+                    healthy.append(freeze({
+                        key: value for key, value in instance.items()
+                        if key not in UNPUBLISHED_FIELDS
+                    }))
+                else:
+                    instance['status'] = 'unhealthy'
+            if healthy:
+                services[service_name] = tuple(healthy)
+        if services == dict(self._snapshot.services):
+            return False
+        self._balancer.retain(services)
+        self._snapshot = RegistrySnapshot(self._snapshot.version + 1, services)
+        for listener in self._listeners:
+            listener(self._snapshot)
+        return True
+    
+    def register(self, service_name: str, host: str, port: int, metadata: Optional[Dict] = None,
+                 instance_id: Optional[str] = None, weight: int = 1) -> Dict:
         """
-        Registra un servicio en el registry
+        Registra una instancia de un servicio en el registry
         
         Args:
             service_name: Nombre del servicio (ej: 'gestor-pedidos', 'ruta-optima')
             host: IP o hostname del servicio
             port: Puerto del servicio
             metadata: Información adicional del servicio
+            instance_id: Identificador de la instancia (por defecto 'host:port')
+            weight: Peso relativo de la instancia para el balanceo
         """
+        instance_id = instance_id or f"{host}:{port}"
         with self._lock:
-            service_key = f"{service_name}"
-            self._services[service_key] = {
+            instances = self._services.setdefault(service_name, {})
+            instances[instance_id] = {
                 'name': service_name,
+                'instance_id': instance_id,
                 'host': host,
                 'port': port,
                 'url': f"http://{host}:{port}",
+                'weight': max(int(weight), 0),
                 'metadata': metadata or {},
                 'registered_at': datetime.utcnow(),
                 'last_heartbeat': datetime.utcnow(),
-                'status': 'healthy'
+                'status': 'healthy',
+                # Resultado del sondeo activo de /health (RegistrySweeper)
+                'probe_latency_ms': None,
+                'probe_failures': 0,
+                'last_probe_at': None
             }
-            print(f"✅ Servicio registrado: {service_name} en {host}:{port}")
+            self._publish()
+            print(f"✅ Servicio registrado: {service_name} [{instance_id}] en {host}:{port}")
+            return instances[instance_id].copy()
+    
+    def heartbeat(self, service_name: str, instance_id: Optional[str] = None):
+        """
+        Actualiza el heartbeat de una instancia.
+        Sin instance_id actualiza todas las instancias del servicio (compatibilidad).
+        """
+        with self._lock:
+            instances = self._services.get(service_name)
+            if not instances:
+                return False
+            
+            if instance_id is None:
+                targets = list(instances.values())
+            elif instance_id in instances:
+                targets = [instances[instance_id]]
+            else:
+                return False
+            
+            now = datetime.utcnow()
+            revived = False
+            for instance in targets:
+                revived = revived or not self._is_alive(instance, now)
+                instance['last_heartbeat'] = now
+            
+            # Solo cambia el snapshot si una instancia expirada vuelve a estar viva
+            # (una que sigue fallando sondeos sigue fuera del balanceo: _publish no publica)
+            if revived:
+                self._publish()
+            return True
     
-    def heartbeat(self, service_name: str):
-        """Actualiza el heartbeat de un servicio"""
+    def expire(self) -> bool:
+        """
+        Vuelve a publicar el snapshot si alguna instancia superó el TTL.
+        Se llama periódicamente desde el orquestador; así los lectores nunca
+        tienen que calcular la edad de los heartbeats.
+        """
         with self._lock:
-            service_key = f"{service_name}"
-            if service_key in self._services:
-                self._services[service_key]['last_heartbeat'] = datetime.utcnow()
-                self._services[service_key]['status'] = 'healthy'
-                return True
+            now = datetime.utcnow()
+            published = self._snapshot
+            for service_name, instances in self._services.items():
+                alive = {i['instance_id'] for i in instances.values() if self._is_routable(i, now)}
+                current = {i['instance_id'] for i in published.instances(service_name)}
+                if alive != current:
+                    return self._publish()
             return False
     
-    def get_service(self, service_name: str) -> Optional[Dict]:
+    def probe_targets(self) -> List[Tuple[str, str, str]]:
+        """
+        Instancias vivas por heartbeat a sondear: (service_name, instance_id, url de health).
+        Incluye las que fallaron sondeos, para que puedan volver al balanceo.
+        La ruta de health se toma de metadata['health_path'] (por defecto /health).
+        """
+        with self._lock:
+            now = datetime.utcnow()
+            return [
+                (service_name, instance_id, f"{instance['url']}{instance['metadata'].get('health_path', '/health')}")
+                for service_name, instances in self._services.items()
+                for instance_id, instance in instances.items()
+                if self._is_alive(instance, now)
+            ]
+    
+    def record_probes(self, results: List[Tuple[str, str, bool, Optional[float]]]):
         """
-        Obtiene la información de un servicio
+        Guarda el resultado de una ronda de sondeos (service_name, instance_id, ok, latencia_ms)
+        y publica un único snapshot nuevo si cambió el conjunto de instancias sanas o la latencia
+        de alguna se movió más de PROBE_LATENCY_CHANGE (las variaciones chicas no se publican).
+        """
+        with self._lock:
+            now = datetime.utcnow()
+            for service_name, instance_id, ok, latency_ms in results:
+                instance = self._services.get(service_name, {}).get(instance_id)
+                if not instance:
+                    continue
+                instance['last_probe_at'] = now
+                if ok:
+                    instance['probe_failures'] = 0
+                    previous = instance['probe_latency_ms']
+                    if previous is None or abs(latency_ms - previous) > PROBE_LATENCY_CHANGE * previous:
+                        instance['probe_latency_ms'] = round(latency_ms, 2)
+                else:
+                    instance['probe_failures'] += 1
+                    if instance['probe_failures'] == self._probe_failure_threshold:
+                        print(f"⚠️ {service_name} [{instance_id}] fuera del balanceo: {instance['probe_failures']} sondeos fallidos")
+            if results:
+                self._publish()
+    
+    def export_state(self) -> List[Dict]:
+        """Instancias vivas serializables a JSON, para el checkpoint en disco"""
+        with self._lock:
+            now = datetime.utcnow()
+            return [
+                {
+                    key: value.isoformat() if isinstance(value, datetime) else value
+                    for key, value in instance.items()
+                    if key != 'status'
+                }
+                for instances in self._services.values()
+                for instance in instances.values()
+                if self._is_alive(instance, now)
+            ]
+    
+    def restore_state(self, instances: List[Dict], grace: float) -> int:
+        """
+        Restaura instancias de un checkpoint (arranque en caliente).
+        Cada instancia queda viva `grace` segundos (sin pasar del TTL): si en ese tiempo
+        no manda heartbeat, expira como cualquier otra. No pisa instancias ya registradas.
         
         Returns:
-            Dict con información del servicio o None si no existe
+            Cantidad de instancias restauradas
         """
         with self._lock:
-            service_key = f"{service_name}"
-            service = self._services.get(service_key)
-            
-            if service:
-                # Verificar si el servicio sigue activo
-                time_since_heartbeat = (datetime.utcnow() - service['last_heartbeat']).total_seconds()
-                if time_since_heartbeat > self._ttl:
-                    service['status'] = 'unhealthy'
-                    return None
+            now = datetime.utcnow()
+            last_heartbeat = now - timedelta(seconds=self._ttl - min(grace, self._ttl))
+            restored = 0
+            for saved in instances:
+                service_instances = self._services.setdefault(saved['name'], {})
+                if saved['instance_id'] in service_instances:
+                    continue
                 
-                return service
-            return None
+                instance = dict(saved)
+                instance['registered_at'] = datetime.fromisoformat(saved['registered_at'])
+                instance['last_heartbeat'] = last_heartbeat
+                instance['last_probe_at'] = None
+                instance['probe_failures'] = 0
+                instance['status'] = 'healthy'
+                service_instances[saved['instance_id']] = instance
+                restored += 1
+            
+            if restored:
+                self._publish()
+            return restored
+    
+    def get_instances(self, service_name: str) -> List[Dict]:
+        """Lista las instancias sanas de un servicio"""
+        return [dict(instance) for instance in self._snapshot.instances(service_name)]
+    
+    def select_instance(self, service_name: str, strategy: Optional[str] = None) -> Optional[Dict]:
+        """
+        Elige una instancia sana del servicio según la estrategia de balanceo
+        
+        Returns:
+            Dict con información de la instancia o None si no hay instancias vivas
+        """
+        instance = self._balancer.choose(service_name, self._snapshot.instances(service_name), strategy)
+        return dict(instance) if instance else None
     
-    def get_service_url(self, service_name: str) -> Optional[str]:
-        """Obtiene la URL de un servicio"""
-        service = self.get_service(service_name)
+    def get_service(self, service_name: str) -> Optional[Dict]:
+        """
+        Obtiene la información de un servicio (una de sus instancias, según el balanceo)
+        
+        Returns:
+            Dict con información del servicio o None si no existe
+        """
+        return self.select_instance(service_name)
+    
+    def get_service_url(self, service_name: str, strategy: Optional[str] = None) -> Optional[str]:
+        """Obtiene la URL de una instancia del servicio"""
+        service = self.select_instance(service_name, strategy)
         if service:
             return service['url']
         return None
     
     def list_services(self) -> List[Dict]:
-        """Lista todos los servicios registrados"""
+        """Lista todas las instancias activas de todos los servicios"""
         with self._lock:
-            # Filtrar servicios expirados
             now = datetime.utcnow()
-            active_services = []
-            
-            for service_key, service in self._services.items():
-                time_since_heartbeat = (now - service['last_heartbeat']).total_seconds()
-                if time_since_heartbeat <= self._ttl:
-                    active_services.append(service.copy())
-                else:
-                    service['status'] = 'unhealthy'
-            
-            return active_services
+            return [
+                instance.copy()
+                for instances in self._services.values()
+                for instance in instances.values()
+                if self._is_alive(instance, now)
+            ]
     
-    def unregister(self, service_name: str):
-        """Elimina un servicio del registry"""
+    def unregister(self, service_name: str, instance_id: Optional[str] = None):
+        """Elimina una instancia (o todas las instancias) de un servicio del registry"""
         with self._lock:
-            service_key = f"{service_name}"
-            if service_key in self._services:
-                del self._services[service_key]
-                print(f"❌ Servicio desregistrado: {service_name}")
-                return True
-            return False
+            instances = self._services.get(service_name)
+            if not instances:
+                return False
+            
+            if instance_id is None:
+                removed = list(instances)
+            elif instance_id in instances:
+                removed = [instance_id]
+            else:
+                return False
+            
+            for key in removed:
+                del instances[key]
+            if not instances:
+                del self._services[service_name]
+            self._publish()
+            print(f"❌ Servicio desregistrado: {service_name} {removed}")
+            return True
     
-    def cleanup_expired(self):
-        """Limpia servicios expirados"""
+    def cleanup_expired(self, grace: float = 0):
+        """
+        Limpia instancias expiradas
+        
+        Args:
+            grace: Segundos extra después del TTL antes de eliminar la instancia
+                (mientras tanto queda como 'unhealthy' y puede revivir con un heartbeat)
+        """
         with self._lock:
             now = datetime.utcnow()
-            expired = []
+            removed = False
             
-            for service_key, service in self._services.items():
-                time_since_heartbeat = (now - service['last_heartbeat']).total_seconds()
-                if time_since_heartbeat > self._ttl:
-                    expired.append(service_key)
+            for service_name in list(self._services):
+                instances = self._services[service_name]
+                expired = [
+                    instance_id for instance_id, instance in instances.items()
+                    if (now - instance['last_heartbeat']).total_seconds() > self._ttl + grace
+                ]
+                
+                for instance_id in expired:
+                    del instances[instance_id]
+                    removed = True
+                    print(f"🧹 Servicio expirado eliminado: {service_name} [{instance_id}]")
+                
+                if not instances:
+                    del self._services[service_name]
             
-            for key in expired:
-                del self._services[key]
-                print(f"🧹 Servicio expirado eliminado: {key}")
-
-# Instancia global del registry
-# Se inicializará con TTL desde Config en main.py
-# Por defecto usa 30 segundos
-registry = ServiceRegistry(ttl=30)
+            if removed:
+                self._publish()
 
+# Instancia global del registry, compartida por main.py y ServiceClient
+registry = ServiceRegistry(
+    ttl=Config.SERVICE_TTL,
+    strategy=Config.LOAD_BALANCING_STRATEGY,
+    probe_failure_threshold=Config.REGISTRY_PROBE_FAILURE_THRESHOLD
+)
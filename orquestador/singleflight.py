@@ -0,0 +1,42 @@
+"""
+Single-flight para los reportes: peticiones idénticas concurrentes comparten una sola generación
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    """
+    La primera petición con una clave genera el reporte; las que llegan mientras está en curso
+    esperan ese mismo resultado en vez de repetir el fan-out a gestor-pedidos y ruta_optima
+    (y de volver a generar y guardar los tiempos reales). La generación corre en su propia
+    tarea: si el cliente que la inició se desconecta, sigue para los demás.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.shared = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Devuelve (resultado, compartido): compartido=True si lo generó otra petición"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+        
+        task = asyncio.create_task(fn())
+        self._calls[key] = task
+        self.leaders += 1
+        
+        def done(finished: asyncio.Task):
+            if self._calls.get(key) is finished:
+                del self._calls[key]
+            # Si todos los que esperaban se fueron, la excepción no queda sin recuperar
+            if not finished.cancelled():
+                finished.exception()
+        
+        task.add_done_callback(done)
+        return await asyncio.shield(task), False
+    
+    def stats(self):
+        return {'in_flight': len(self._calls), 'leaders': self.leaders, 'shared': self.shared}
@@ -0,0 +1,157 @@
+"""
+Análisis vectorizado de desviaciones por stand sobre todos los pedidos de un mes
+"""
+from typing import Dict, List
+import numpy as np
+
+# z para un intervalo de confianza del 95%
+Z_95 = 1.96
+
+
+class StandTimesAccumulator:
+    """
+    Acumula lotes de tiempos (estimado, real) por stand en arreglos columnares.
+    Los stands se codifican como enteros para que el agrupamiento sea vectorizado.
+    """
+
+    def __init__(self):
+        self._stand_codes: Dict[str, int] = {}
+        self._codes: List[np.ndarray] = []
+        self._estimados: List[np.ndarray] = []
+        self._reales: List[np.ndarray] = []
+        self.items_count = 0
+
+    def add_batch(self, stand_ids: List[str], estimados: List[float], reales: List[float]):
+        """Agrega un lote columnar (listas del mismo largo) al acumulador"""
+        if not stand_ids:
+            return
+
+        uniques, inverse = np.unique(np.asarray(stand_ids, dtype=object), return_inverse=True)
+        batch_codes = np.fromiter(
+            (self._stand_codes.setdefault(s, len(self._stand_codes)) for s in uniques),
+            dtype=np.int32,
+            count=len(uniques)
+        )
+
+        self._codes.append(batch_codes[inverse])
+        self._estimados.append(np.asarray(estimados, dtype=np.float32))
+        self._reales.append(np.asarray(reales, dtype=np.float32))
+        self.items_count += len(stand_ids)
+
+    def stand_names(self) -> np.ndarray:
+        """Nombres de stand indexados por código"""
+        names = np.empty(len(self._stand_codes), dtype=object)
+        for name, code in self._stand_codes.items():
+            names[code] = name
+        return names
+
+    def columns(self):
+        """Concatena los lotes en tres columnas (códigos, estimados, reales)"""
+        if not self._codes:
+            empty = np.empty(0, dtype=np.float32)
+            return np.empty(0, dtype=np.int32), empty, empty
+
+        codes = np.concatenate(self._codes)
+        estimados = np.concatenate(self._estimados)
+        reales = np.concatenate(self._reales)
+        # Liberar los lotes: a partir de aquí solo viven las columnas
+        self._codes, self._estimados, self._reales = [codes], [estimados], [reales]
+        return codes, estimados, reales
+
+
+def _group_quantile(sorted_values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """
+    Percentil q (interpolación lineal) de cada grupo.
+    sorted_values debe estar ordenado por grupo y, dentro del grupo, por valor.
+    """
+    pos = starts + q * (counts - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    frac = pos - lo
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * frac
+
+
+def analyze_stand_times(accumulator: StandTimesAccumulator, threshold_pct: float = 15.0) -> Dict:
+    """
+    Calcula por stand media, mediana, p90, desviación estándar e intervalo de confianza (95%)
+    de la desviación real - estimado. Devuelve el análisis completo y los stands con problema
+    con la misma forma que el reporte de los últimos 10 pedidos más las estadísticas extra.
+    """
+    codes, estimados, reales = accumulator.columns()
+    return analyze_stand_columns(codes, estimados, reales, accumulator.stand_names(), threshold_pct)
+
+
+def analyze_stand_columns(codes: np.ndarray, estimados: np.ndarray, reales: np.ndarray,
+                          names: np.ndarray, threshold_pct: float = 15.0) -> Dict:
+    """
+    analyze_stand_times sobre las columnas ya concatenadas. Solo recibe arreglos, así que
+    se puede ejecutar en otro proceso (ver report_compute).
+    """
+    if codes.size == 0:
+        return {'stands_con_problema': [], 'stands_analizados': 0, 'items_analizados': 0}
+
+    n_stands = len(names)
+    estimados64 = estimados.astype(np.float64)
+    reales64 = reales.astype(np.float64)
+    desviaciones = reales64 - estimados64
+
+    counts = np.bincount(codes, minlength=n_stands)
+    present = counts > 0
+    safe_counts = np.maximum(counts, 1)
+
+    est_mean = np.bincount(codes, weights=estimados64, minlength=n_stands) / safe_counts
+    real_mean = np.bincount(codes, weights=reales64, minlength=n_stands) / safe_counts
+    # Varianzas en dos pasadas (sobre los valores centrados en la media de su stand): E[x²] - E[x]²
+    # pierde precisión cuando la varianza es chica frente a la media
+    real_var = np.bincount(codes, weights=(reales64 - real_mean[codes]) ** 2, minlength=n_stands) / safe_counts
+    real_std = np.sqrt(real_var)
+
+    desv_mean = real_mean - est_mean
+    desv_var = np.bincount(codes, weights=(desviaciones - desv_mean[codes]) ** 2, minlength=n_stands) / safe_counts
+    # Desviación estándar muestral de la desviación para el intervalo de confianza
+    desv_std = np.sqrt(desv_var * safe_counts / np.maximum(safe_counts - 1, 1))
+    margin = Z_95 * desv_std / np.sqrt(safe_counts)
+
+    desv_pct = np.divide(desv_mean * 100, est_mean, out=np.zeros(n_stands), where=est_mean > 0)
+
+    # Ordenar por (stand, tiempo real) para medianas y percentiles por grupo
+    order = np.lexsort((reales, codes))
+    sorted_reales = reales64[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    real_median = _group_quantile(sorted_reales, starts, safe_counts, 0.5)
+    real_p90 = _group_quantile(sorted_reales, starts, safe_counts, 0.9)
+
+    problematic_mask = present & (np.abs(desv_pct) > threshold_pct)
+    problematic_codes = np.flatnonzero(problematic_mask)
+    problematic_codes = problematic_codes[np.argsort(-np.abs(desv_pct[problematic_codes]), kind='stable')]
+
+    def r(values: np.ndarray) -> List[float]:
+        return np.round(values[problematic_codes], 2).tolist()
+
+    columns = zip(
+        problematic_codes.tolist(), r(est_mean), r(real_mean), r(desv_mean), r(desv_pct),
+        r(real_median), r(real_p90), r(real_std), r(desv_mean - margin), r(desv_mean + margin)
+    )
+
+    problematic = []
+    for code, est, real, desv, pct, median, p90, std, ic_low, ic_high in columns:
+        problematic.append({
+            'stand_id': names[code],
+            'tiempo_estimado_promedio': est,
+            'tiempo_real_promedio': real,
+            'desviacion_promedio': desv,
+            'desviacion_porcentual': pct,
+            'pedidos_analizados': int(counts[code]),
+            'tiempo_real_mediana': median,
+            'tiempo_real_p90': p90,
+            'tiempo_real_desviacion_estandar': std,
+            'desviacion_ic95': [ic_low, ic_high],
+            # La desviación es significativa si el intervalo no contiene el 0
+            'desviacion_significativa': ic_low > 0 or ic_high < 0
+        })
+
+    return {
+        'stands_con_problema': problematic,
+        'stands_analizados': int(present.sum()),
+        'items_analizados': int(codes.size)
+    }
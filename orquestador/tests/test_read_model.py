@@ -0,0 +1,48 @@
+from orquestador.read_model import OrderRouteReadModel, apply_real_times
+from orquestador.report_compute import build_order_detail, compute_real_times
+
+
+def _read_model(tmp_path):
+    read_model = OrderRouteReadModel(str(tmp_path / 'read_model.sqlite3'))
+    read_model.upsert_orders([{
+        'erp_order_id': 'ERP-1',
+        'created_at': '2026-09-15T10:00:00Z',
+        'items': [
+            {'sku': 'SKU-A', 'stand_id_estimada': 'STAND-1', 'tiempo_estimado_pick': 4.0},
+            {'sku': 'SKU-B', 'stand_id_estimada': 'STAND-2', 'tiempo_estimado_pick': 6.0},
+        ],
+    }])
+    read_model.record_route('ERP-1', {'tiempo_picking_seg': 10})
+    return read_model
+
+
+def test_los_reportes_reutilizan_los_tiempos_reales_guardados(tmp_path):
+    read_model = _read_model(tmp_path)
+    _, primer_payload = compute_real_times([
+        {'order': row['order'], 'route': row['route']} for row in read_model.last_orders('2026-10')
+    ])
+    read_model.record_real_times(primer_payload)
+
+    row = read_model.last_orders('2026-10')[0]
+    order = apply_real_times(row['order'], row['real_times'])
+    result, payload = compute_real_times([{'order': order, 'route': row['route']}])
+
+    guardados = {item['sku']: item['tiempo_real_pick'] for item in primer_payload[0]['items']}
+    assert {i['sku']: i['tiempo_real_pick'] for i in result[0]['order']['items']} == guardados
+    # Nada nuevo que guardar en el gestor
+    assert payload == []
+
+    row = read_model.last_orders('2026-10')[0]
+    detail = build_order_detail(apply_real_times(row['order'], row['real_times']), row['route'], True)
+    assert {i['sku']: i['tiempo_real_pick'] for i in detail['items']} == guardados
+
+
+def test_sin_tiempos_guardados_se_generan(tmp_path):
+    row = _read_model(tmp_path).last_orders('2026-10')[0]
+    assert row['real_times'] is None
+
+    result, payload = compute_real_times([{'order': apply_real_times(row['order'], None), 'route': row['route']}])
+
+    assert [entry['erp_order_id'] for entry in payload] == ['ERP-1']
+    for item in result[0]['order']['items']:
+        assert 0.8 * item['tiempo_estimado_pick'] - 0.01 <= item['tiempo_real_pick'] <= 1.5 * item['tiempo_estimado_pick'] + 0.01
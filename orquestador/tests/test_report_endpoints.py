@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from orquestador import main
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # Sin snapshots: los reportes se generan con el ReportService falso de cada test
+    monkeypatch.setattr(main.snapshot_store, 'directory', str(tmp_path))
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize('report, status', [
+    ({'orders_count': 3, 'partial': True}, 'partial'),
+    ({'orders_count': 10, 'partial': False, 'processing_time_ms': 1500}, 'warning'),
+    ({'orders_count': 0, 'stands_con_problema': [], 'error': 'gestor caído'}, 'error'),
+])
+def test_reportes_incompletos_van_con_no_store(monkeypatch, client, report, status):
+    def generate_route_report(month, deadline=None):
+        return {'month': month, **report}
+    monkeypatch.setattr(main.report_service, 'generate_route_report', generate_route_report)
+
+    resp = client.get('/reports/rutas-optimizadas', params={'month': '2026-10'})
+
+    assert resp.status_code == 200
+    assert resp.json()['status'] == status
+    assert resp.headers['cache-control'] == 'no-store'
+
+
+def test_reporte_completo_se_puede_cachear(monkeypatch, client):
+    def get_orders_with_routes_detailed(month, deadline=None):
+        return {'month': month, 'orders_count': 10, 'partial': False, 'orders': []}
+    monkeypatch.setattr(main.report_service, 'get_orders_with_routes_detailed', get_orders_with_routes_detailed)
+
+    resp = client.get('/reports/pedidos-con-rutas', params={'month': '2026-10'})
+
+    assert resp.json()['status'] == 'success'
+    assert 'cache-control' not in resp.headers
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+from orquestador.report_snapshots import ReportSnapshotStore, report_month_of
+
+
+def test_snapshot_vencido_cuenta_como_inexistente(tmp_path):
+    store = ReportSnapshotStore(str(tmp_path), ttl=60)
+    store.save('2026-10', 'rutas-optimizadas', {'orders_count': 1})
+    assert store.exists('2026-10', 'rutas-optimizadas')
+    assert store.load('2026-10', 'rutas-optimizadas')['report'] == {'orders_count': 1}
+
+    # Reescribir generated_at como si se hubiera generado hace dos minutos
+    path = tmp_path / '2026-10' / 'rutas-optimizadas.json'
+    viejo = (datetime.utcnow() - timedelta(seconds=120)).isoformat() + 'Z'
+    path.write_text(path.read_text().replace(store.load('2026-10', 'rutas-optimizadas')['generated_at'], viejo))
+
+    assert store.load('2026-10', 'rutas-optimizadas') is None
+    assert not store.exists('2026-10', 'rutas-optimizadas')
+
+
+def test_invalidar_borra_los_snapshots_del_mes(tmp_path):
+    store = ReportSnapshotStore(str(tmp_path))
+    store.save('2026-10', 'rutas-optimizadas', {'orders_count': 1})
+    store.save('2026-10', 'pedidos-con-rutas', {'orders_count': 1})
+    store.save('2026-11', 'rutas-optimizadas', {'orders_count': 1})
+
+    assert store.invalidate(['2026-10']) == 2
+    assert not store.exists('2026-10', 'rutas-optimizadas')
+    assert not store.exists('2026-10', 'pedidos-con-rutas')
+    assert store.exists('2026-11', 'rutas-optimizadas')
+
+
+def test_mes_del_reporte_es_el_siguiente_al_del_pedido():
+    assert report_month_of('2026-09-30T23:59:59.000000') == '2026-10'
+    assert report_month_of('2026-12-01T00:00:00.000000') == '2027-01'
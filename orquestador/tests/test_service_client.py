@@ -0,0 +1,165 @@
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from orquestador import resilience, service_client
+from orquestador.config import Config
+from orquestador.resilience import CircuitBreaker, RetryBudget
+from orquestador.service_registry import ServiceRegistry
+
+SERVICE = 'gestor-pedidos'
+
+
+class FakeResponse:
+    def __init__(self, status_code, delay=0.0):
+        self.status_code = status_code
+        self.text = ''
+        self.elapsed = timedelta(seconds=delay)
+
+    def json(self):
+        return {'status_code': self.status_code}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """requests falso: responde según `calls.responses[url]` y guarda (método, url) de cada llamada"""
+    recorded = SimpleNamespace(log=[], responses={})
+
+    def request(method, url, timeout=None, **kwargs):
+        recorded.log.append((method, url))
+        status_code, delay = recorded.responses.get(url.split('/orders')[0], (200, 0.0))
+        time.sleep(delay)
+        return FakeResponse(status_code, delay)
+
+    monkeypatch.setattr(service_client, 'requests', SimpleNamespace(request=request, exceptions=requests.exceptions))
+    return recorded
+
+
+def _client(monkeypatch, instances=('a', 'b'), **config):
+    """ServiceClient contra un registry propio con las instancias dadas (host = instance_id)"""
+    settings = {'RETRY_MAX_ATTEMPTS': 2, 'RETRY_BUDGET_PER_SECOND': 0.0, 'RETRY_BUDGET_BURST': 10.0,
+                'HEDGING_ENABLED': False, 'CIRCUIT_FAILURE_THRESHOLD': 5}
+    settings.update(config)
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value)
+
+    registry = ServiceRegistry()
+    monkeypatch.setattr(service_client, 'registry', registry)
+    for instance_id in instances:
+        registry.register(SERVICE, instance_id, 8000, instance_id=instance_id)
+    client = service_client.ServiceClient()
+    # Orden determinista: siempre la primera candidata
+    monkeypatch.setattr(client.balancer, 'choose', lambda service_name, candidates: candidates[0])
+    return client
+
+
+def test_breaker_abre_pasa_a_half_open_y_cierra(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5.0, half_open_max_calls=1)
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.acquire()
+
+    clock[0] += 5.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.acquire()
+    # Un solo cupo de prueba
+    assert not breaker.available()
+    assert not breaker.acquire()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.acquire()
+
+
+def test_breaker_half_open_que_falla_vuelve_a_abrir(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5.0)
+
+    breaker.record_failure()
+    clock[0] += 5.0
+    assert breaker.acquire()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock[0] += 4.9
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_retry_budget_se_agota_y_se_recarga(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience, 'time', SimpleNamespace(monotonic=lambda: clock[0]))
+    budget = RetryBudget(rate=1.0, burst=2.0)
+
+    assert budget.try_acquire()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+    clock[0] += 1.0
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+
+def test_sin_presupuesto_no_se_reintenta(monkeypatch, calls):
+    client = _client(monkeypatch, RETRY_MAX_ATTEMPTS=3, RETRY_BUDGET_BURST=1.0)
+    calls.responses = {'http://a:8000': (503, 0.0), 'http://b:8000': (503, 0.0)}
+
+    assert client.call_gestor_pedidos('/orders') is None
+    # Primer intento + el único reintento del presupuesto (en otra instancia)
+    assert calls.log == [('GET', 'http://a:8000/orders'), ('GET', 'http://b:8000/orders')]
+
+    calls.log.clear()
+    assert client.call_gestor_pedidos('/orders') is None
+    assert calls.log == [('GET', 'http://a:8000/orders')]
+
+
+def test_get_que_falla_se_reintenta_en_otra_instancia(monkeypatch, calls):
+    client = _client(monkeypatch)
+    calls.responses = {'http://a:8000': (503, 0.0)}
+
+    assert client.call_gestor_pedidos('/orders') == {'status_code': 200}
+    assert calls.log == [('GET', 'http://a:8000/orders'), ('GET', 'http://b:8000/orders')]
+
+
+def test_post_que_falla_no_se_reintenta(monkeypatch, calls):
+    client = _client(monkeypatch, RETRY_MAX_ATTEMPTS=3)
+    calls.responses = {'http://a:8000': (503, 0.0)}
+
+    assert client.call_gestor_pedidos('/orders', method='POST', json={}) is None
+    assert calls.log == [('POST', 'http://a:8000/orders')]
+
+
+def test_post_lento_no_se_duplica(monkeypatch, calls):
+    client = _client(monkeypatch, HEDGING_ENABLED=True, HEDGE_MIN_SAMPLES=1, HEDGE_MIN_DELAY_MS=1)
+    # Con latencias de 1 ms un GET de 100 ms ya se duplicaría
+    for _ in range(20):
+        client._latency_window(SERVICE).record(1.0)
+    calls.responses = {'http://a:8000': (200, 0.1)}
+
+    assert client.call_gestor_pedidos('/orders', method='POST', json={}) == {'status_code': 200}
+    assert calls.log == [('POST', 'http://a:8000/orders')]
+
+    calls.log.clear()
+    client.call_gestor_pedidos('/orders')
+    assert ('GET', 'http://b:8000/orders') in calls.log
+
+
+def test_carrera_por_el_cupo_half_open_elige_otra_instancia(monkeypatch, calls):
+    client = _client(monkeypatch)
+    # 'a' parece disponible en available() pero otra llamada gana su cupo antes de acquire()
+    lost = client._breaker(SERVICE, 'a')
+    monkeypatch.setattr(lost, 'available', lambda: True)
+    monkeypatch.setattr(lost, 'acquire', lambda: False)
+
+    assert client._resolve_instance(SERVICE) == ('b', 'http://b:8000')
+
+    assert client.call_gestor_pedidos('/orders') == {'status_code': 200}
+    assert calls.log == [('GET', 'http://b:8000/orders')]
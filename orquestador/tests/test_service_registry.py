@@ -0,0 +1,27 @@
+import pytest
+
+from orquestador.service_registry import ServiceRegistry
+
+
+def test_snapshot_no_comparte_metadata_con_la_entrada_viva():
+    registry = ServiceRegistry()
+    metadata = {'health_path': '/health', 'tags': ['a']}
+    registry.register('svc', 'localhost', 8000, metadata=metadata)
+    publicada = registry.snapshot().services['svc'][0]
+
+    metadata['health_path'] = '/otro'
+    metadata['tags'].append('b')
+
+    assert publicada['metadata'] == {'health_path': '/health', 'tags': ('a',)}
+    with pytest.raises(TypeError):
+        publicada['metadata']['health_path'] = '/otro'
+
+
+def test_republicar_sin_cambios_no_avanza_la_version():
+    registry = ServiceRegistry()
+    registry.register('svc', 'localhost', 8000, metadata={'tags': ['a']})
+    version = registry.snapshot().version
+
+    registry.heartbeat('svc', 'localhost:8000')
+
+    assert registry.snapshot().version == version
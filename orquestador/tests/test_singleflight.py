@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from orquestador.singleflight import SingleFlight
+
+
+def test_llamadas_concurrentes_comparten_una_ejecucion():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def generate():
+            calls.append(1)
+            await release.wait()
+            return {'orders_count': 10}
+
+        waiters = [asyncio.create_task(flights.do('rutas', generate)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.stats()['in_flight'] == 1
+        release.set()
+        return flights, calls, await asyncio.gather(*waiters)
+
+    flights, calls, results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    # Todos reciben el mismo objeto
+    assert all(report is results[0][0] for report, _ in results)
+    assert flights.stats() == {'in_flight': 0, 'leaders': 1, 'shared': 4}
+
+
+def test_la_excepcion_llega_a_todos_los_que_esperan():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def generate():
+            calls.append(1)
+            await release.wait()
+            raise RuntimeError('gestor caído')
+
+        waiters = [asyncio.create_task(flights.do('rutas', generate)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        return flights, calls, await asyncio.gather(*waiters, return_exceptions=True)
+
+    flights, calls, results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert len(results) == 3
+    assert all(isinstance(error, RuntimeError) and str(error) == 'gestor caído' for error in results)
+    assert flights.stats()['in_flight'] == 0
+
+
+def test_al_terminar_la_clave_se_libera():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            return len(calls)
+
+        first = await flights.do('rutas', generate)
+        second = await flights.do('rutas', generate)
+        other = await flights.do('pedidos', generate)
+        return first, second, other
+
+    assert asyncio.run(scenario()) == ((1, False), (2, False), (3, False))
+
+
+def test_si_el_primero_se_cancela_la_generacion_sigue_para_los_demas():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def generate():
+            await release.wait()
+            return 'reporte'
+
+        leader = asyncio.create_task(flights.do('rutas', generate))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do('rutas', generate))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == ('reporte', True)
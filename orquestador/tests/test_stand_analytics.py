@@ -0,0 +1,65 @@
+import numpy as np
+
+from orquestador.stand_analytics import StandTimesAccumulator, Z_95, analyze_stand_times
+
+
+def _acumular(rng, n_stands=5, n_lotes=4, lote=2000):
+    """Lotes aleatorios con un sesgo distinto por stand; devuelve el acumulador y las columnas planas"""
+    acc = StandTimesAccumulator()
+    stands, estimados, reales = [], [], []
+    for _ in range(n_lotes):
+        s = [f"STAND-{i}" for i in rng.integers(0, n_stands, lote)]
+        e = rng.uniform(2, 10, lote).astype(np.float32)
+        sesgo = np.array([1 + 0.1 * int(x.split("-")[1]) for x in s])
+        r = (e * sesgo + rng.normal(0, 0.5, lote)).astype(np.float32)
+        acc.add_batch(s, e.tolist(), r.tolist())
+        stands.extend(s)
+        estimados.extend(e.tolist())
+        reales.extend(r.tolist())
+    return acc, np.array(stands), np.array(estimados, dtype=np.float32), np.array(reales, dtype=np.float32)
+
+
+def test_estadisticas_por_stand_coinciden_con_numpy():
+    rng = np.random.default_rng(7)
+    acc, stands, estimados, reales = _acumular(rng)
+
+    result = analyze_stand_times(acc, threshold_pct=0.0)
+
+    assert result['items_analizados'] == len(stands)
+    assert result['stands_analizados'] == 5
+    por_stand = {s['stand_id']: s for s in result['stands_con_problema']}
+    # STAND-0 no tiene sesgo: puede quedar bajo el umbral por redondeo, el resto seguro está
+    assert set(por_stand) >= {f"STAND-{i}" for i in range(1, 5)}
+
+    for stand_id, stats in por_stand.items():
+        mask = stands == stand_id
+        r = reales[mask].astype(np.float64)
+        desv = r - estimados[mask].astype(np.float64)
+        margin = Z_95 * np.std(desv, ddof=1) / np.sqrt(mask.sum())
+
+        assert stats['pedidos_analizados'] == mask.sum()
+        np.testing.assert_allclose(stats['tiempo_real_promedio'], r.mean(), atol=0.006)
+        np.testing.assert_allclose(stats['desviacion_promedio'], desv.mean(), atol=0.006)
+        np.testing.assert_allclose(stats['tiempo_real_mediana'], np.median(r), atol=0.006)
+        np.testing.assert_allclose(stats['tiempo_real_p90'], np.percentile(r, 90), atol=0.006)
+        np.testing.assert_allclose(stats['tiempo_real_desviacion_estandar'], np.std(r), atol=0.006)
+        np.testing.assert_allclose(
+            stats['desviacion_ic95'], [desv.mean() - margin, desv.mean() + margin], atol=0.006
+        )
+
+
+def test_desviacion_estandar_estable_con_media_grande():
+    # Varianza chica frente a la media: con E[x²] - E[x]² la cancelación domina el resultado
+    rng = np.random.default_rng(3)
+    acc = StandTimesAccumulator()
+    reales = (1e7 + rng.normal(0, 3, 50000)).astype(np.float32)
+    acc.add_batch(["STAND-A"] * len(reales), [1.0] * len(reales), reales.tolist())
+
+    stats = analyze_stand_times(acc, threshold_pct=0.0)['stands_con_problema'][0]
+
+    np.testing.assert_allclose(stats['tiempo_real_desviacion_estandar'], np.std(reales.astype(np.float64)), atol=0.006)
+
+
+def test_acumulador_vacio():
+    result = analyze_stand_times(StandTimesAccumulator())
+    assert result == {'stands_con_problema': [], 'stands_analizados': 0, 'items_analizados': 0}
@@ -1,12 +1,43 @@
 from django.http import JsonResponse
 from django.shortcuts import render
 import json
+import os
 import random
+import threading
 import time
+import urllib.request
 from datetime import datetime
 
 from core.mongo import rutas_collection
 
+# Orquestador al que se avisa cada ruta calculada (read model de pedidos con rutas).
+# Vacío = no se avisa.
+ORQUESTADOR_URL = os.getenv("ORQUESTADOR_URL", "")
+
+
+def notificar_ruta_calculada(pedido_id, doc):
+    """
+    Envía la ruta calculada al read model del orquestador en un hilo aparte,
+    para no demorar la respuesta. Si falla solo se registra en consola.
+    """
+    if not ORQUESTADOR_URL:
+        return
+
+    def enviar():
+        payload = json.dumps({"order_id": pedido_id, "route": doc}, default=str).encode("utf-8")
+        req = urllib.request.Request(
+            f"{ORQUESTADOR_URL}/read-model/routes",
+            data=payload,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            urllib.request.urlopen(req, timeout=2).close()
+        except Exception as e:
+            print(f"⚠️ No se pudo avisar la ruta del pedido {pedido_id} al orquestador: {e}")
+
+    threading.Thread(target=enviar, daemon=True).start()
+
 
 def home(request):
     return render(request, "index.html")
@@ -52,6 +83,8 @@ def generar_ruta(locaciones, pedido_id):
     result = rutas_collection.insert_one(doc)
     doc["_id"] = str(result.inserted_id)
 
+    notificar_ruta_calculada(pedido_id, doc)
+
     # Esto es lo que se devuelve al cliente
     return doc
 